@@ -1,4 +1,8 @@
+from multiprocessing import freeze_support
+
 from nrcm_viewer.application import main
 
 if __name__ == '__main__':
+    # parsing workers are spawned from the frozen executable
+    freeze_support()
     main()
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the nRCM Viewer. Run the individual modules as
+`python -m benchmarks.<name>` from the repository root.
+"""
@@ -0,0 +1,81 @@
+"""
+Compares the single-pass indexing of archive members with the previous
+implementation, which scanned all members once per directory with a CSV
+file.
+
+    python -m benchmarks.bench_index --dirs 100 --frames 10000
+    python -m benchmarks.bench_index --dirs 100 --frames 10000 --archive
+
+With --archive, a zip file with empty members is written to a temporary
+directory, and opening it with ZipReader is timed as well.
+"""
+import os
+import tempfile
+import time
+import zipfile
+from argparse import ArgumentParser
+from os import path
+
+from nrcm_viewer.data import CSV_NAME, IMG_APPENDIX, ZipReader, \
+    index_members
+from .synthetic import make_member_names
+
+
+def _legacy_index(names):
+    csv_files = [o for o in names if o.endswith(CSV_NAME)]
+    dirs_with_csv = [path.split(o)[0] for o in csv_files]
+
+    dir_to_file = {
+        dir_: {
+            '_'.join(path.split(o)[-1].split('_')[:3]): o
+            for o in names if
+            o.startswith(dir_) and o.endswith(IMG_APPENDIX)}
+        for dir_ in dirs_with_csv}
+
+    return csv_files, dirs_with_csv, dir_to_file
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--dirs', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=10000,
+                        help='Images per directory.')
+    parser.add_argument('--archive', action='store_true',
+                        help='Also time opening a zip file.')
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    names = make_member_names(args.dirs, args.frames)
+    print(f'{len(names)} members in {args.dirs} directories')
+
+    index, t_new = _time(index_members, names)
+    print(f'single pass   {t_new:8.3f}s')
+
+    if not args.skip_legacy:
+        # directory names are zero padded, as the legacy implementation
+        # also assigns images of run_10 to run_1
+        legacy, t_legacy = _time(_legacy_index, names)
+        assert legacy == index
+        print(f'legacy        {t_legacy:8.3f}s  '
+              f'({t_legacy / t_new:.1f}x slower)')
+
+    if args.archive:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zip_path = os.path.join(tmp_dir, 'archive.zip')
+            with zipfile.ZipFile(zip_path, 'w') as f:
+                for name in names:
+                    f.writestr(name, b'')
+
+            reader, t_open = _time(ZipReader, zip_path, False)
+            assert reader._dir_to_file == index[2]
+            print(f'ZipReader     {t_open:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the vectorized construction of the SampleStore in `Reader.samples`
+against the previous row-by-row implementation building Sample objects.
+
+    python -m benchmarks.bench_ingest --frames 100000 --detections 3
+"""
+import time
+from argparse import ArgumentParser
+
+import pandas as pd
+
+from nrcm_viewer.data import Sample, _build_store, _preprocess_df
+from .synthetic import make_results_frame
+
+
+def _legacy_preprocess_df(df: pd.DataFrame):
+    df['FAULT_X0'] *= df['IMG_W']
+    df['FAULT_X1'] *= df['IMG_W']
+    df['FAULT_Y0'] *= df['IMG_H']
+    df['FAULT_Y1'] *= df['IMG_H']
+
+    df['FAULT_Y0'] -= df['RH_Y0']
+    df['FAULT_Y1'] -= df['RH_Y0']
+
+    for key in ('FAULT_X0', 'FAULT_X1', 'FAULT_Y0', 'FAULT_Y1',
+                'FAULT_X0_RH', 'FAULT_X1_RH', 'FAULT_Y0_RH', 'FAULT_Y1_RH'):
+        df[key] = df[key].apply(lambda x: int(float(x)))
+
+    df['TIMESTAMP'] = df['FILENAME'] \
+        .apply(lambda x: '_'.join(x.split('_')[:3]))
+
+    return df
+
+
+def _legacy_build_samples(df: pd.DataFrame, files):
+    samples = {}
+    for row in df.itertuples():
+        if row.TIMESTAMP in samples:
+            samples[row.TIMESTAMP].append_bbox(row)
+        else:
+            samples[row.TIMESTAMP] = \
+                Sample.from_dataframe(row, files[row.TIMESTAMP])
+
+    return samples
+
+
+def _as_tuple(sample: Sample):
+    return (sample.timestamp, sample.filepath, sample.channel_id,
+            sample.line_id, sample.line_name, sample.line_offset,
+            sample.num_detections, sample.bbox)
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--frames', type=int, default=100000)
+    parser.add_argument('--detections', type=int, default=3,
+                        help='Detections per frame.')
+    args = parser.parse_args()
+
+    raw, files = make_results_frame(args.frames, args.detections)
+
+    legacy_df, t_legacy_pre = _time(_legacy_preprocess_df, raw.copy())
+    legacy, t_legacy_build = _time(_legacy_build_samples, legacy_df, files)
+
+    df, t_pre = _time(_preprocess_df, raw.copy())
+    samples, t_build = _time(_build_store, df, files)
+
+    assert len(legacy) == len(samples)
+    assert all(_as_tuple(a) == _as_tuple(samples.sample(i))
+               for i, a in enumerate(legacy.values()))
+
+    print(f'{len(raw)} detections in {len(samples)} frames')
+    print(f'{"":14s}{"legacy":>10s}{"vectorized":>12s}{"speedup":>10s}')
+    for name, old, new in (('preprocess', t_legacy_pre, t_pre),
+                           ('build', t_legacy_build, t_build),
+                           ('total', t_legacy_pre + t_legacy_build,
+                            t_pre + t_build)):
+        print(f'{name:14s}{old:9.3f}s{new:11.3f}s{old / new:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the cold start of the viewer in fresh interpreters: the time until
+the main window is shown, and until the warmup has imported the data and
+plot machinery. For comparison, the window is also shown after importing
+everything up front, as before the imports were deferred.
+
+    python -m benchmarks.bench_startup --repeat 10
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+# run in a fresh interpreter, prints the timings as JSON
+_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+if {eager}:
+    import nrcm_viewer.ui.main_widget
+from PyQt5.QtWidgets import QApplication
+from nrcm_viewer import startup
+from nrcm_viewer.ui.main_window import MainWindow
+imported = time.perf_counter()
+
+application = QApplication([])
+window = MainWindow()
+window.show()
+application.processEvents()
+shown = time.perf_counter()
+
+warmup = startup.Warmup()
+warmup.start()
+while not startup.is_finished():
+    application.processEvents()
+    time.sleep(0.001)
+warm = time.perf_counter()
+
+print(json.dumps({{
+    'import': imported - start,
+    'shown': shown - start,
+    'warm': warm - start,
+}}))
+'''
+
+HEAVY_MODULES = ('numpy', 'pandas', 'PIL', 'pyqtgraph')
+
+
+def run(eager: bool) -> dict:
+    script = _SCRIPT.format(eager=eager)
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', script], env=env,
+                            capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    # including the start of the interpreter
+    result['process'] = total
+    return result
+
+
+def loaded_before_show() -> str:
+    code = ('import sys; from nrcm_viewer.ui.main_window import MainWindow; '
+            f'print([o for o in {HEAVY_MODULES!r} if o in sys.modules])')
+    output = subprocess.run([sys.executable, '-c', code],
+                            capture_output=True, text=True, check=True)
+    return output.stdout.strip()
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'Heavy modules imported with the main window: '
+          f'{loaded_before_show()}')
+    print(f'{"":8s}{"import":>10s}{"shown":>10s}{"warm":>10s}'
+          f'{"process":>10s}')
+    for name, eager in (('eager', True), ('lazy', False)):
+        results = [run(eager) for _ in range(args.repeat)]
+        medians = [statistics.median(o[key] for o in results)
+                   for key in ('import', 'shown', 'warm', 'process')]
+        print(f'{name:8s}' + ''.join(f'{o:9.3f}s' for o in medians))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of concurrent member reads of a ZipReader.
+
+Reads all members of a synthetic archive from many threads at once, in a
+random order. The throughput is compared with reading through a single
+shared zipfile.ZipFile, and with reading from the memory-mapped archive.
+The bytes read are checked in tests/test_archive.py.
+
+    python -m benchmarks.bench_zip_concurrency --members 2000 --threads 8
+"""
+import os
+import random
+import tempfile
+import time
+import zipfile
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+from nrcm_viewer.archive import ZipMemberReader
+
+
+def make_archive(file_path: str, num_members: int, member_size: int):
+    rng = random.Random(0)
+    with zipfile.ZipFile(file_path, 'w') as f:
+        for i in range(num_members):
+            # half random (incompressible), half repetitive data
+            if i % 2 == 0:
+                data = rng.getrandbits(8 * member_size).to_bytes(
+                    member_size, 'little')
+                method = zipfile.ZIP_STORED
+            else:
+                data = bytes(rng.choices(b'abc', k=member_size))
+                method = zipfile.ZIP_DEFLATED
+            f.writestr(f'dir_{i % 10}/member_{i}.bin', data,
+                       compress_type=method)
+
+
+def read_all(read, names, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        num_bytes = sum(executor.map(lambda name: len(read(name)), names))
+    duration = time.perf_counter() - start
+
+    return num_bytes / duration / 2 ** 20
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--members', type=int, default=2000)
+    parser.add_argument('--member-size', type=int, default=256 * 1024)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'archive.zip')
+        make_archive(file_path, args.members, args.member_size)
+
+        zip_file = zipfile.ZipFile(file_path)
+        infos = zip_file.NameToInfo
+        members = ZipMemberReader(file_path, zip_file)
+        mapped = ZipMemberReader(file_path, zip_file, use_mmap=True)
+        names = list(infos)
+
+        for i in range(args.rounds):
+            random.Random(i).shuffle(names)
+            shared = read_all(zip_file.read, names, args.threads)
+            positional = read_all(members.read, names, args.threads)
+            zero_copy = read_all(mapped.read_buffer, names, args.threads)
+            print(f'round {i}: {len(names)} members on {args.threads} '
+                  f'threads. zipfile: {shared:.0f} MB/s, '
+                  f'positional: {positional:.0f} MB/s, '
+                  f'mmap: {zero_copy:.0f} MB/s')
+
+        members.close()
+        mapped.close()
+        zip_file.close()
+
+
+if __name__ == '__main__':
+    main()
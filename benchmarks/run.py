@@ -0,0 +1,299 @@
+"""
+Benchmark suite of the readers, the table model and the plot widget, run on
+a synthetic archive and workspace. Qt runs offscreen, so the suite works
+without a display.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --output new.json --compare results.json
+    python -m benchmarks.run --only parse_zip reader_samples
+
+Results are saved as JSON with the timings of every benchmark, the dataset
+parameters and the environment, and can be compared against an earlier run
+with --compare.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+from argparse import ArgumentParser
+from os import path
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from nrcm_viewer.data import SampleStore, WorkspaceReader, ZipReader, \
+    _build_store, _preprocess_df  # noqa: E402
+from .synthetic import make_results_frame, write_dataset  # noqa: E402
+
+
+class Dataset:
+    """ The synthetic data shared by the benchmarks. """
+    def __init__(self, directory: str, num_dirs: int, frames_per_dir: int,
+                 detections_per_frame: int, image_size: t.Tuple[int, int],
+                 boxes_per_frame: int):
+        self.zip_path = write_dataset(
+            path.join(directory, 'synthetic.zip'), num_dirs,
+            frames_per_dir, detections_per_frame, image_size)
+        self.workspace_path = write_dataset(
+            path.join(directory, 'workspace'), num_dirs, frames_per_dir,
+            detections_per_frame, image_size)
+
+        self.raw, self.files = make_results_frame(
+            frames_per_dir * num_dirs, detections_per_frame,
+            image_size=image_size)
+        self.samples = _build_store(_preprocess_df(self.raw.copy()),
+                                    self.files)
+
+        # few frames crowded with boxes, for drawing
+        raw, files = make_results_frame(10, boxes_per_frame,
+                                        image_size=image_size)
+        self.crowded = _build_store(_preprocess_df(raw), files)
+
+
+def bench_parse_zip(data: Dataset) -> t.Callable[[], t.Any]:
+    reader = ZipReader(data.zip_path, use_cache=False)
+    return reader._parse_zip
+
+
+def bench_parse_workspace(data: Dataset) -> t.Callable[[], t.Any]:
+    reader = WorkspaceReader(data.workspace_path, use_cache=False)
+    return reader._parse_workspace
+
+
+def bench_reader_samples(data: Dataset) -> t.Callable[[], t.Any]:
+    # a new reader every time, the samples are parsed only once per reader
+    return lambda: ZipReader(data.zip_path, use_cache=False).samples
+
+
+def bench_preprocess_df(data: Dataset) -> t.Callable[[], t.Any]:
+    # _preprocess_df works in place, the copy is part of the timing
+    return lambda: _preprocess_df(data.raw.copy())
+
+
+def bench_table_model_data(data: Dataset) -> t.Callable[[], t.Any]:
+    from PyQt5.QtCore import Qt
+    from nrcm_viewer.ui.table_model import TableModel
+
+    model = TableModel(data.samples)
+    # the cells of a few screens worth of rows, spread over the table
+    rows = np.linspace(0, model.rowCount() - 1, 2000).astype(int)
+    indices = [model.index(int(row), column) for row in rows
+               for column in range(model.columnCount())]
+
+    def run():
+        for index in indices:
+            model.data(index, Qt.ItemDataRole.DisplayRole)
+
+    run.operations = len(indices)
+    return run
+
+
+def bench_build_positions(data: Dataset) -> t.Callable[[], t.Any]:
+    from nrcm_viewer.filtering import PositionIndex, StoreColumns
+
+    def run():
+        PositionIndex(StoreColumns(data.samples))
+
+    return run
+
+
+def bench_position_queries(data: Dataset) -> t.Callable[[], t.Any]:
+    from nrcm_viewer.filtering import StoreColumns
+
+    index = StoreColumns(data.samples).positions()
+    lines = np.unique(data.samples.column('line_name')).tolist()
+    offsets = data.samples.column('line_offset').astype(np.float64)
+    rng = np.random.default_rng(0)
+    queries = [(lines[rng.integers(len(lines))],
+                rng.uniform(offsets.min(), offsets.max()))
+               for _ in range(1000)]
+
+    def run():
+        for line, offset in queries:
+            index.locate(line, offset)
+            index.query(line, offset, offset + 50, ['crack'])
+
+    run.operations = len(queries)
+    return run
+
+
+def bench_session_merge(data: Dataset) -> t.Callable[[], t.Any]:
+    from nrcm_viewer.filtering import StoreColumns
+    from nrcm_viewer.session import merge, merge_chunks
+
+    # the samples split into archives, sharing the data of the store
+    bounds = np.linspace(0, len(data.samples), 5).astype(int)
+    members = [StoreColumns(data.samples.slice(a, b))
+               for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def run():
+        for _ in merge_chunks(merge(members, 'timestamp'), 10000):
+            pass
+
+    run.operations = len(data.samples)
+    return run
+
+
+def bench_draw_boxes(data: Dataset) -> t.Callable[[], t.Any]:
+    from PyQt5.QtWidgets import QApplication
+    from nrcm_viewer.ui.plot_widget import PlotWidget
+
+    app = QApplication.instance()
+    widget = PlotWidget()
+    widget.resize(800, 800)
+    widget.show()
+    widget.vb.setRange(xRange=(0, data.crowded.boxes(0)[:, 1].max()),
+                       yRange=(0, data.crowded.boxes(0)[:, 3].max()))
+    app.processEvents()
+
+    def run():
+        # including the repaint of the scene
+        for row in range(len(data.crowded)):
+            widget.draw_boxes(data.crowded, row)
+            widget.repaint()
+        app.processEvents()
+
+    run.operations = len(data.crowded)
+    run.widget = widget
+    return run
+
+
+BENCHMARKS: t.Dict[str, t.Callable[[Dataset], t.Callable[[], t.Any]]] = {
+    'parse_zip': bench_parse_zip,
+    'parse_workspace': bench_parse_workspace,
+    'reader_samples': bench_reader_samples,
+    'preprocess_df': bench_preprocess_df,
+    'table_model_data': bench_table_model_data,
+    'draw_boxes': bench_draw_boxes,
+    'build_positions': bench_build_positions,
+    'position_queries': bench_position_queries,
+    'session_merge': bench_session_merge,
+}
+
+
+def measure(run: t.Callable[[], t.Any], repeat: int) -> t.Dict[str, t.Any]:
+    """ Times repeated calls of run, after one warmup call. """
+    run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    result = {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'repeat': repeat,
+    }
+    operations = getattr(run, 'operations', None)
+    if operations is not None:
+        result['operations'] = operations
+        result['per_operation'] = result['median'] / operations
+
+    return result
+
+
+def environment() -> t.Dict[str, t.Any]:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=path.dirname(path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def compare(results: t.Dict[str, t.Any], baseline: t.Dict[str, t.Any]):
+    print(f'\n{"":18s}{"baseline":>11s}{"current":>11s}{"change":>9s}')
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = result['median'] / old['median']
+        print(f'{name:18s}{old["median"]:10.4f}s{result["median"]:10.4f}s'
+              f'{(ratio - 1) * 100:+8.1f}%')
+
+    if baseline.get('dataset') != results['dataset']:
+        print('Warning: the baseline was run on a different dataset.')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dirs', type=int, default=20)
+    parser.add_argument('--frames', type=int, default=2000,
+                        help='Frames per directory.')
+    parser.add_argument('--detections', type=int, default=3,
+                        help='Detections per frame.')
+    parser.add_argument('--image-size', type=int, nargs=2,
+                        default=(256, 1024), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--boxes', type=int, default=1000,
+                        help='Detections per frame when drawing boxes.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+                        help='Run only these benchmarks.')
+    parser.add_argument('--output', help='Save the results to this file.')
+    parser.add_argument('--compare', help='Results of an earlier run.')
+    args = parser.parse_args()
+
+    # the plot widget and the table model need an application
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])  # noqa
+
+    results = {
+        'environment': environment(),
+        'dataset': {
+            'dirs': args.dirs,
+            'frames': args.frames,
+            'detections': args.detections,
+            'image_size': list(args.image_size),
+            'boxes': args.boxes,
+        },
+        'results': dict(),
+    }
+
+    with tempfile.TemporaryDirectory(prefix='nrcm_bench_') as directory:
+        print(f'Writing {args.dirs} x {args.frames} frames...')
+        data = Dataset(directory, args.dirs, args.frames, args.detections,
+                       tuple(args.image_size), args.boxes)
+
+        for name in args.only or BENCHMARKS:
+            result = measure(BENCHMARKS[name](data), args.repeat)
+            results['results'][name] = result
+
+            line = f'{name:18s}{result["median"]:10.4f}s (min ' \
+                   f'{result["min"]:.4f}s)'
+            if 'per_operation' in result:
+                line += f', {result["per_operation"] * 1e6:.2f}us per ' \
+                        f'operation'
+            print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved results to {args.output}.')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Generation of synthetic fault detector output, mimicking the layout of
+`fault_detector_results.csv`, and of whole archives and workspaces.
+
+    python -m benchmarks.synthetic /tmp/synthetic.zip --dirs 10 --frames 1000
+    python -m benchmarks.synthetic /tmp/workspace --dirs 10 --frames 1000
+"""
+import io
+import os
+import typing as t
+import zipfile
+from argparse import ArgumentParser
+from os import path
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from nrcm_viewer.data import CSV_NAME, IMG_APPENDIX
+
+CLASSES = ('crack', 'squat', 'spalling', 'weld', 'joint')
+
+
+def make_timestamps(num_frames: int, channel: int = 0) -> t.List[str]:
+    return [f'20220101_{channel:02d}{i // 60 % 60:02d}{i % 60:02d}_{i:06d}'
+            for i in range(num_frames)]
+
+
+def make_results_frame(num_frames: int, detections_per_frame: int = 3,
+                       channel: int = 0, seed: int = 0,
+                       image_size: t.Tuple[int, int] = (1024, 4096)) \
+        -> t.Tuple[pd.DataFrame, t.Dict[str, str]]:
+    """
+    Creates a raw (not yet preprocessed) results dataframe together with
+    the timestamp to image path mapping of its directory. Image sizes are
+    (width, height).
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = make_timestamps(num_frames, channel)
+    n = num_frames * detections_per_frame
+
+    frame = np.repeat(np.arange(num_frames), detections_per_frame)
+    x0 = rng.uniform(0, 0.9, n)
+    y0 = rng.uniform(0, 0.9, n)
+
+    df = pd.DataFrame({
+        'FILENAME': [f'{timestamps[i]}_cam{channel}{IMG_APPENDIX}'
+                     for i in frame],
+        'CHANNEL_ID': channel,
+        'LINE_ID': 100 + frame // 1000,
+        'LINE_NAME': [f'Line {i // 1000}' for i in frame],
+        'LINE_OFFSET': frame * 0.5,
+        'FAULT_UUID': [f'{channel:04x}-{i:012x}' for i in range(n)],
+        'FAULT_X0': x0,
+        'FAULT_X1': x0 + rng.uniform(0.01, 0.1, n),
+        'FAULT_Y0': y0,
+        'FAULT_Y1': y0 + rng.uniform(0.01, 0.1, n),
+        'FAULT_X0_RH': rng.uniform(0, 1, n),
+        'FAULT_X1_RH': rng.uniform(0, 1, n),
+        'FAULT_Y0_RH': rng.uniform(0, 1, n),
+        'FAULT_Y1_RH': rng.uniform(0, 1, n),
+        'IMG_W': image_size[0],
+        'IMG_H': image_size[1],
+        'RH_Y0': rng.integers(0, 100, n),
+        'CLASS': rng.choice(CLASSES, n),
+        'DEFECT_SCORE': rng.uniform(0, 1, n),
+    })
+
+    files = {ts: f'run_{channel}/{ts}_cam{channel}{IMG_APPENDIX}'
+             for ts in timestamps}
+
+    return df, files
+
+
+def make_member_names(num_dirs: int, frames_per_dir: int) -> t.List[str]:
+    """
+    Creates the member names of an archive with a results CSV file and
+    images in every directory, in the order they are written by the fault
+    detector.
+    """
+    names = []
+    for channel in range(num_dirs):
+        dir_ = f'root/run_{channel:04d}'
+        names.append(f'{dir_}/{CSV_NAME}')
+        names.extend(f'{dir_}/{ts}_cam{channel}{IMG_APPENDIX}'
+                     for ts in make_timestamps(frames_per_dir, channel))
+
+    return names
+
+
+def make_image(image_size: t.Tuple[int, int], seed: int = 0) -> bytes:
+    """ Returns a PNG encoded grayscale noise image of (width, height). """
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (image_size[1], image_size[0]),
+                          dtype=np.uint8)
+
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def write_dataset(target: str, num_dirs: int, frames_per_dir: int,
+                  detections_per_frame: int = 3,
+                  image_size: t.Tuple[int, int] = (256, 1024),
+                  seed: int = 0) -> str:
+    """
+    Writes a synthetic archive, if target ends with .zip, or workspace
+    directory with a results CSV file and images in every run directory.
+    All images share the same content. Returns the target.
+    """
+    image = make_image(image_size, seed)
+
+    if target.endswith('.zip'):
+        archive = zipfile.ZipFile(target, 'w')
+
+        def write(name: str, data: bytes):
+            archive.writestr(name, data)
+    else:
+        archive = None
+
+        def write(name: str, data: bytes):
+            file_path = path.join(target, name)
+            os.makedirs(path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(data)
+
+    try:
+        for channel in range(num_dirs):
+            dir_ = f'root/run_{channel:04d}'
+            df, files = make_results_frame(frames_per_dir,
+                                           detections_per_frame, channel,
+                                           seed + channel, image_size)
+
+            # the first line of the results is not part of the table
+            csv = f'fault detector results of {dir_}\n' + \
+                df.to_csv(index=False)
+            write(f'{dir_}/{CSV_NAME}', csv.encode())
+            for file_path in files.values():
+                write(f'{dir_}/{path.basename(file_path)}', image)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    return target
+
+
+def main():
+    parser = ArgumentParser(description='Writes a synthetic archive or '
+                                        'workspace.')
+    parser.add_argument('target',
+                        help='Archive (*.zip) or workspace directory.')
+    parser.add_argument('--dirs', type=int, default=10)
+    parser.add_argument('--frames', type=int, default=1000,
+                        help='Frames per directory.')
+    parser.add_argument('--detections', type=int, default=3,
+                        help='Detections per frame.')
+    parser.add_argument('--image-size', type=int, nargs=2,
+                        default=(256, 1024), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_dataset(args.target, args.dirs, args.frames, args.detections,
+                  tuple(args.image_size), args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,11 @@
 Main entrypoint of the application. Launch the application as
 `python -m nrcm_viewer`.
 """
+import cProfile
 import os.path as path
 from argparse import ArgumentParser
 
-import pyqt5ac
-
-from . import flags
-from .application import main
+from . import flags, profiling
 
 
 if __name__ == '__main__':
@@ -19,12 +17,24 @@ if __name__ == '__main__':
                         action='store_true',
                         help='Enable debug mode. Debug level log messages will '
                              'be shown in logging output.')
+    parser.add_argument('--profile', metavar='TRACE',
+                        help='Record timings of loading and showing frames, '
+                             'and write them to this Chrome trace file on '
+                             'exit.')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='With --profile, also profile the main thread '
+                             'with cProfile, written next to the trace as '
+                             '.prof file.')
 
     args = parser.parse_args()
     flags.DEBUG = args.debug
+    if args.cprofile and args.profile is None:
+        parser.error('--cprofile requires --profile.')
 
     # if in debug mode, generate pyqt views from ui xml files
     if flags.DEBUG:
+        import pyqt5ac
+
         try:
             # compile pyqt files
             HERE = path.split(path.abspath(__file__))[0]
@@ -40,4 +50,21 @@ if __name__ == '__main__':
         except PermissionError:
             pass
 
-    main()
+    profiler = None
+    if args.profile is not None:
+        profiling.enable()
+        if args.cprofile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+    # imported after parsing the arguments, --help does not need Qt
+    from .application import main
+
+    try:
+        main()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(path.splitext(args.profile)[0] + '.prof')
+        if args.profile is not None:
+            profiling.write_trace(args.profile)
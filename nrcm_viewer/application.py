@@ -6,9 +6,11 @@ arguments.
 import logging
 import sys
 
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
 
 from . import flags
+from .startup import Warmup
 from .ui.main_window import MainWindow
 from .settings import app
 from . import __version__
@@ -46,5 +48,9 @@ def main():
     app.init()
     main_window.show()
 
+    # import the data and plot machinery once the window is up
+    warmup = Warmup(main_window)
+    QTimer.singleShot(0, warmup.start)
+
     exit_code = application.exec_()
     sys.exit(exit_code)
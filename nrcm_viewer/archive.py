@@ -0,0 +1,309 @@
+"""
+Thread-safe access to the members of a zip archive.
+
+`zipfile.ZipFile` serializes all reads of an archive on one shared file
+handle. The ZipMemberReader instead reads members with positional reads
+using the offsets of the central directory, so that any number of threads
+can read and decompress different members at the same time. Optionally the
+archive is memory-mapped, and stored members are handed out as zero-copy
+views of the mapping. Large members, e.g. CSV files, can be streamed
+instead of being read at once.
+"""
+import io
+import mmap
+import os
+import struct
+import threading
+import typing as t
+import zipfile
+import zlib
+
+# signature, version, flags, method, time, date, crc, sizes, name and extra
+# lengths
+_LOCAL_HEADER = struct.Struct('<4s5HL2L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+# compressed bytes read at once when streaming a member
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class PositionalFile:
+    """
+    A read-only file supporting concurrent reads at arbitrary offsets.
+
+    Uses os.pread where available, which does not touch a shared file
+    position, and otherwise one file handle per thread.
+    """
+    def __init__(self, file_path: str):
+        self._path = file_path
+        self._local = threading.local()
+
+        if hasattr(os, 'pread'):
+            self._fd = os.open(file_path, os.O_RDONLY)
+        else:
+            self._fd = None
+
+    def pread(self, size: int, offset: int) -> bytes:
+        if self._fd is not None:
+            chunks = []
+            while size > 0:
+                chunk = os.pread(self._fd, size, offset)
+                if len(chunk) == 0:
+                    break
+                chunks.append(chunk)
+                size -= len(chunk)
+                offset += len(chunk)
+
+            return b''.join(chunks)
+
+        f = getattr(self._local, 'file', None)
+        if f is None:
+            f = self._local.file = open(self._path, 'rb')
+        f.seek(offset)
+
+        return f.read(size)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class MemberView(io.RawIOBase):
+    """
+    A read-only, seekable file over a memoryview. Only the bytes that are
+    actually read are copied.
+    """
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def getbuffer(self) -> memoryview:
+        return self._view
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else \
+            min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(end, self._pos)
+
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, b) -> int:
+        n = max(min(len(b), len(self._view) - self._pos), 0)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f'Invalid whence {whence}')
+
+        if pos < 0:
+            raise ValueError(f'Negative seek position {pos}')
+        self._pos = pos
+
+        return pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class MemberStream(io.RawIOBase):
+    """
+    A read-only stream of a stored or deflated member, read and decompressed
+    a chunk at a time with positional reads. The CRC is checked once the end
+    of the member is reached.
+    """
+    def __init__(self, file: PositionalFile, info: zipfile.ZipInfo,
+                 offset: int, chunk_size: int = STREAM_CHUNK_SIZE):
+        super().__init__()
+        self._file = file
+        self._info = info
+        self._offset = offset
+        self._remaining = info.compress_size
+        self._chunk_size = chunk_size
+
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS) \
+            if info.compress_type == zipfile.ZIP_DEFLATED else None
+        self._crc = 0
+        self._buffer = bytearray()
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while len(self._buffer) == 0 and not self._eof:
+            self._read_chunk()
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+
+        return n
+
+    def _read_chunk(self):
+        name = self._info.filename
+        size = min(self._chunk_size, self._remaining)
+        data = self._file.pread(size, self._offset)
+        if len(data) != size:
+            raise zipfile.BadZipFile(f'Truncated data of {name}')
+        self._offset += size
+        self._remaining -= size
+
+        if self._decompressor is not None:
+            data = self._decompressor.decompress(data)
+            if self._remaining == 0:
+                data += self._decompressor.flush()
+
+        self._crc = zlib.crc32(data, self._crc)
+        self._buffer += data
+
+        if self._remaining == 0:
+            self._eof = True
+            if self._crc != self._info.CRC:
+                raise zipfile.BadZipFile(f'Bad CRC-32 for file {name!r}')
+
+
+class ZipMemberReader:
+    """
+    Reads members of a zip archive from any number of threads.
+
+    Stored and deflated members are read with positional reads and
+    decompressed with zlib, the CRC of every member is checked. Members
+    using other compression methods, or encryption, are read through a
+    per-thread zipfile.ZipFile instead.
+
+    If use_mmap is set, the archive is memory-mapped and stored members are
+    returned as memoryviews of the mapping instead of being copied.
+    """
+    def __init__(self, zip_path: str, zip_file: zipfile.ZipFile,
+                 use_mmap: bool = False):
+        self._path = zip_path
+        self._infos = zip_file.NameToInfo
+        self._file = PositionalFile(zip_path)
+
+        self._mmap: t.Optional[mmap.mmap] = None
+        if use_mmap and os.path.getsize(zip_path) > 0:
+            with open(zip_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._data_offsets: t.Dict[str, int] = dict()
+        self._local = threading.local()
+
+    def getinfo(self, name: str) -> zipfile.ZipInfo:
+        try:
+            return self._infos[name]
+        except KeyError:
+            raise KeyError(f'There is no item named {name!r} in the '
+                           f'archive')
+
+    def data_offset(self, name: str) -> int:
+        """
+        Returns the offset of the member's data in the archive, which is
+        only known after reading its local header.
+        """
+        offset = self._data_offsets.get(name)
+        if offset is None:
+            info = self.getinfo(name)
+            header = self._file.pread(_LOCAL_HEADER.size, info.header_offset)
+            if len(header) != _LOCAL_HEADER.size:
+                raise zipfile.BadZipFile(f'Truncated header of {name}')
+
+            fields = _LOCAL_HEADER.unpack(header)
+            if fields[0] != _LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f'Bad magic number for {name}')
+
+            offset = info.header_offset + _LOCAL_HEADER.size + fields[-2] + \
+                fields[-1]
+            self._data_offsets[name] = offset
+
+        return offset
+
+    def read(self, name: str) -> bytes:
+        data = self.read_buffer(name)
+        if isinstance(data, memoryview):
+            return data.tobytes()
+
+        return data
+
+    def read_buffer(self, name: str) -> t.Union[bytes, memoryview]:
+        """
+        Returns the contents of a member, as a memoryview of the mapped
+        archive for stored members in mmap mode and as bytes otherwise.
+        """
+        info = self.getinfo(name)
+        if info.flag_bits & 0x1 or info.compress_type not in (
+                zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return self._zip_file().read(name)
+
+        offset = self.data_offset(name)
+        if self._mmap is not None:
+            data = memoryview(self._mmap)[offset:offset + info.compress_size]
+        else:
+            data = self._file.pread(info.compress_size, offset)
+        if len(data) != info.compress_size:
+            raise zipfile.BadZipFile(f'Truncated data of {name}')
+
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS, info.file_size)
+
+        if zlib.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile(f'Bad CRC-32 for file {name!r}')
+
+        return data
+
+    def open(self, name: str) -> t.Union[io.BytesIO, MemberView]:
+        data = self.read_buffer(name)
+        if isinstance(data, memoryview):
+            return MemberView(data)
+
+        return io.BytesIO(data)
+
+    def stream(self, name: str) -> t.BinaryIO:
+        """
+        Opens a member for sequential reading without reading all of it at
+        once, e.g. to parse a large CSV file.
+        """
+        info = self.getinfo(name)
+        if info.flag_bits & 0x1 or info.compress_type not in (
+                zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return self._zip_file().open(name)
+
+        return io.BufferedReader(
+            MemberStream(self._file, info, self.data_offset(name)))
+
+    def close(self):
+        self._file.close()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # views of the mapping are still in use, the mapping is
+                # closed once they are garbage collected
+                pass
+            self._mmap = None
+
+    def _zip_file(self) -> zipfile.ZipFile:
+        f = getattr(self._local, 'zip_file', None)
+        if f is None:
+            f = self._local.zip_file = zipfile.ZipFile(self._path)
+
+        return f
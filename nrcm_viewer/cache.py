@@ -0,0 +1,337 @@
+"""
+This module contains the caches of the application. The parsed index of an
+archive or workspace is cached on disk as a columnar NumPy archive, so that
+reopening a dataset does not have to parse every CSV file again. Decoded
+images are kept in memory in a least recently used cache, and thumbnails of
+images are cached on disk.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import typing as t
+from collections import OrderedDict
+from os import path
+
+import numpy as np
+import pandas as pd
+from PIL import Image, PngImagePlugin
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 6
+CACHE_DIR = os.environ.get(
+    'NRCM_VIEWER_CACHE',
+    path.join(path.expanduser('~'), '.cache', 'nrcm_viewer'))
+
+_KEY = '__key__'
+_INDEX = '__index__'
+_CODES = '.codes'
+_VALUES = '.values'
+_TYPES = '.types'
+
+# types of the values of columns of mixed types, stored as strings along
+# with the index of their type
+_MIXED_TYPES = (bool, int, float, str)
+
+
+class IndexCache:
+    """
+    Persists the index of a reader (paths of CSV files and images) together
+    with the columns of its parsed samples.
+
+    There is one cache file per source path. The file stores the key it was
+    created with and is considered stale, and eventually overwritten, as
+    soon as the key of the source changes, e.g. when the archive is
+    modified.
+    """
+    def __init__(self, source: str, key: t.Dict[str, t.Any],
+                 cache_dir: t.Optional[str] = None):
+        self._key = json.dumps(dict(key, version=CACHE_VERSION),
+                               sort_keys=True)
+
+        name = hashlib.sha1(path.abspath(source).encode()).hexdigest()
+        self._path = path.join(cache_dir or CACHE_DIR, 'index',
+                               f'{name}.npz')
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def load(self) -> t.Optional[t.Tuple[t.Dict[str, t.Any],
+                                         t.Dict[str, np.ndarray]]]:
+        """
+        Returns the cached index and columns, or None if there is no valid
+        cache entry.
+        """
+        if not path.isfile(self._path):
+            return None
+
+        try:
+            with np.load(self._path, allow_pickle=False) as npz:
+                if str(npz[_KEY]) != self._key:
+                    log.debug(f'Cache entry {self._path} is stale.')
+                    return None
+
+                index = json.loads(str(npz[_INDEX]))
+                columns = _decode_columns({k: npz[k] for k in npz.files
+                                           if not k.startswith('__')})
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f'Could not read cache entry {self._path}: {e}')
+            return None
+
+        log.debug(f'Loaded cache entry {self._path}.')
+        return index, columns
+
+    def save(self, index: t.Dict[str, t.Any],
+             columns: t.Dict[str, np.ndarray]):
+        try:
+            arrays = _encode_columns(columns)
+        except ValueError as e:
+            log.warning(f'Could not cache the index of {self._path}: {e}')
+            return
+        os.makedirs(path.dirname(self._path), exist_ok=True)
+
+        arrays[_KEY] = np.array(self._key)
+        arrays[_INDEX] = np.array(json.dumps(index))
+
+        # write to a temporary file first so that readers never see a
+        # partially written entry
+        tmp_path = f'{self._path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            log.warning(f'Could not write cache entry {self._path}: {e}')
+            if path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        log.debug(f'Saved cache entry {self._path}.')
+
+
+class ImageCache:
+    """
+    Thread-safe least recently used cache of decoded images, bounded by the
+    total number of bytes of the cached arrays.
+
+    Cached arrays are made read-only, as they are shared between all users
+    of the cache.
+    """
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._images: t.OrderedDict[t.Hashable, np.ndarray] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes: int):
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def __contains__(self, key: t.Hashable) -> bool:
+        return key in self._images
+
+    def get(self, key: t.Hashable) -> t.Optional[np.ndarray]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+
+            self._images.move_to_end(key)
+            self.hits += 1
+
+            return image
+
+    def put(self, key: t.Hashable, image: np.ndarray):
+        image.flags.writeable = False
+
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+
+            # images larger than the whole cache are not cached at all
+            if image.nbytes > self._max_bytes:
+                return
+
+            self._images[key] = image
+            self._nbytes += image.nbytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._nbytes = 0
+
+    def stats(self) -> t.Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'images': len(self._images), 'bytes': self._nbytes}
+
+    def _evict(self):
+        while self._nbytes > self._max_bytes:
+            _, image = self._images.popitem(last=False)
+            self._nbytes -= image.nbytes
+
+
+class ThumbnailCache:
+    """
+    On-disk cache of thumbnails, one PNG file per image, keyed by the source
+    of the reader and the path of the image in the source. Images in a
+    source are assumed to never change.
+
+    The size of the image a thumbnail was made from is stored with the
+    thumbnail, so that coordinates in the image can be mapped onto it.
+    """
+    def __init__(self, size: int, cache_dir: t.Optional[str] = None):
+        self._size = size
+        self._dir = path.join(cache_dir or CACHE_DIR, 'thumbnails',
+                              str(size))
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def path(self, source: str, filepath: str) -> str:
+        name = hashlib.sha1(
+            f'{path.abspath(source)}\0{filepath}'.encode()).hexdigest()
+        return path.join(self._dir, name[:2], f'{name[2:]}.png')
+
+    def load(self, source: str, filepath: str) \
+            -> t.Optional[t.Tuple[np.ndarray, t.Tuple[int, int]]]:
+        """
+        Returns the cached thumbnail and the (height, width) of the original
+        image, or None if the thumbnail is not cached.
+        """
+        pth = self.path(source, filepath)
+        if not path.isfile(pth):
+            return None
+
+        try:
+            with Image.open(pth) as img:
+                img.load()
+                shape = (int(img.text['height']), int(img.text['width']))
+                return np.asarray(img), shape
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f'Could not read thumbnail {pth}: {e}')
+            return None
+
+    def save(self, source: str, filepath: str, thumbnail: np.ndarray,
+             shape: t.Tuple[int, int]):
+        pth = self.path(source, filepath)
+        os.makedirs(path.dirname(pth), exist_ok=True)
+
+        info = PngImagePlugin.PngInfo()
+        info.add_text('height', str(shape[0]))
+        info.add_text('width', str(shape[1]))
+
+        tmp_path = f'{pth}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            Image.fromarray(thumbnail).save(tmp_path, format='PNG',
+                                            pnginfo=info)
+            os.replace(tmp_path, pth)
+        except OSError as e:
+            log.warning(f'Could not write thumbnail {pth}: {e}')
+            if path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _encode_columns(columns: t.Dict[str, np.ndarray]) \
+        -> t.Dict[str, np.ndarray]:
+    """
+    Numeric columns are stored as is, all other columns are dictionary
+    encoded as integer codes into an array of their unique values, missing
+    values having code -1. The unique values are stored as numbers if they
+    all are, as strings if they all are, and otherwise as strings along
+    with their types.
+
+    Raises a ValueError if a column has values of other types.
+    """
+    arrays = {}
+    for key, column in columns.items():
+        if column.dtype.kind in 'iuf':
+            arrays[key] = column
+            continue
+
+        codes, values = pd.factorize(column)
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+        if kind == 'integer':
+            values = np.asarray(values, dtype=np.int64)
+        elif kind in ('floating', 'mixed-integer-float'):
+            values = np.asarray(values, dtype=np.float64)
+        elif kind in ('string', 'empty'):
+            values = np.asarray(values).astype(str)
+        else:
+            # factorized again along with the types, as equal values of
+            # different types, like 1 and True, are distinct
+            codes, values = pd.factorize(np.array(
+                [_typed(key, value) for value in column], dtype=object))
+            arrays[key + _TYPES] = np.array(
+                [type_ for type_, _ in values], dtype=np.int8)
+            values = np.array([repr(value) if isinstance(value, float)
+                               else str(value) for _, value in values])
+        arrays[key + _CODES] = codes.astype(np.int32)
+        arrays[key + _VALUES] = values
+
+    return arrays
+
+
+def _decode_columns(arrays: t.Dict[str, np.ndarray]) \
+        -> t.Dict[str, np.ndarray]:
+    columns = {}
+    for key, array in arrays.items():
+        if key.endswith(_VALUES) or key.endswith(_TYPES):
+            continue
+        elif key.endswith(_CODES):
+            name = key[:-len(_CODES)]
+            values = arrays[name + _VALUES].astype(object)
+            if name + _TYPES in arrays:
+                for i, type_ in enumerate(arrays[name + _TYPES].tolist()):
+                    values[i] = _parse_mixed(_MIXED_TYPES[type_], values[i])
+            # code -1, of missing values, picks the appended NaN
+            values = np.append(values, np.nan)
+            columns[name] = values[array]
+        else:
+            columns[key] = array
+
+    return columns
+
+
+def _typed(key: str, value: t.Any) -> t.Optional[t.Tuple[int, t.Any]]:
+    """ Pairs a value with the index of its type, None if it is missing. """
+    if pd.isna(value):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    for i, type_ in enumerate(_MIXED_TYPES):
+        # bools are ints, so they are checked first
+        if isinstance(value, type_):
+            return i, value
+
+    raise ValueError(f'Cannot cache values of type {type(value).__name__} '
+                     f'in column {key}.')
+
+
+def _parse_mixed(type_: type, value: str) -> t.Any:
+    if type_ is bool:
+        return value == 'True'
+
+    return type_(value)
@@ -0,0 +1,200 @@
+"""
+Export of the detected defects as cropped patches into a zip archive, e.g.
+as training data, without Qt.
+
+    python -m nrcm_viewer.crops archive.zip crops.zip --padding 16
+    python -m nrcm_viewer.crops workspace/ crops.zip --classes crack \\
+        --min-score 0.8 -j 16
+
+Every frame is decoded once, by a pool of worker processes, and all its
+detections passing the filter are cropped from it, padded on every side
+and clipped to the frame. The crops are written as `<class>/<fault
+uuid>.png` into the archive as they arrive, together with a `manifest.csv`
+with the fault UUID, class, score, line, offset and the cropped region of
+every crop. Frames are read one CSV file at a time and the manifest is
+spooled to a temporary file, so memory use does not depend on the number
+of crops.
+"""
+import csv
+import io
+import logging
+import os
+import tempfile
+import typing as t
+import zipfile
+from argparse import ArgumentParser
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+from .data import Reader, open_reader
+from .frames import Frame, batched, iter_frames, map_batches
+from .images import decode_image
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_COLUMNS = ('FILE', 'FAULT_UUID', 'CLASS', 'DEFECT_SCORE',
+                    'TIMESTAMP', 'CHANNEL_ID', 'LINE_ID', 'LINE_NAME',
+                    'LINE_OFFSET', 'SOURCE_FILE', 'CROP_X0', 'CROP_X1',
+                    'CROP_Y0', 'CROP_Y1')
+# of the frames, the values of the sample shared by all crops and the fault
+# ids, boxes (x0, x1, y0, y1), classes and scores
+SAMPLE_ATTRS = ('timestamp', 'channel_id', 'line_id', 'line_name',
+                'line_offset')
+DETECTION_ATTRS = ('fault_id', 'boxes', 'cls', 'score')
+# name in the archive, encoded crop and manifest row
+Crop = t.Tuple[str, bytes, t.List[t.Any]]
+
+
+def crop_region(box: t.Sequence[int], shape: t.Tuple[int, ...],
+                padding: int) -> t.Optional[t.Tuple[int, int, int, int]]:
+    """
+    Returns the padded region (x0, x1, y0, y1), x1 and y1 exclusive, of a
+    box (x0, x1, y0, y1) within an image of the given shape, or None if it
+    is empty.
+    """
+    height, width = shape[:2]
+    x0, x1 = sorted(box[:2])
+    y0, y1 = sorted(box[2:])
+
+    x0, y0 = max(x0 - padding, 0), max(y0 - padding, 0)
+    x1, y1 = min(x1 + 1 + padding, width), min(y1 + 1 + padding, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+
+    return x0, x1, y0, y1
+
+
+def crop_frame(image: np.ndarray, frame: Frame, padding: int) \
+        -> t.List[Crop]:
+    """
+    Crops and encodes all detections of a decoded frame, skipping those
+    outside of the frame.
+    """
+    filepath, values, (fault_ids, boxes, classes, scores) = frame
+
+    crops = list()
+    for fault_id, box, cls, score in zip(fault_ids.tolist(), boxes.tolist(),
+                                         classes.tolist(), scores.tolist()):
+        region = crop_region(box, image.shape, padding)
+        if region is None:
+            log.debug(f'Box of {fault_id} is outside of {filepath}.')
+            continue
+
+        x0, x1, y0, y1 = region
+        buf = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(image[y0:y1, x0:x1])) \
+            .save(buf, format='PNG')
+
+        name = f'{cls}/{fault_id}.png'
+        crops.append((name, buf.getvalue(),
+                      [name, fault_id, cls, score, *values, filepath,
+                       *region]))
+
+    return crops
+
+
+# reader of a cropping worker process, set by the initializer
+_worker_reader: t.Optional[Reader] = None
+
+
+def _init_worker(source: str):
+    global _worker_reader
+    _worker_reader = open_reader(source, use_cache=False)
+
+
+def _crop_batch(frames: t.List[Frame], padding: int) \
+        -> t.Tuple[t.List[Crop], int]:
+    """ Returns the crops and the number of detections skipped. """
+    crops = list()
+    skipped = 0
+    for frame in frames:
+        num_detections = len(frame[2][0])
+        try:
+            image = decode_image(_worker_reader, frame[0])
+        except (OSError, KeyError) as e:
+            log.error(f'Error in loading image from {frame[0]}: {e}')
+            skipped += num_detections
+            continue
+
+        frame_crops = crop_frame(image, frame, padding)
+        skipped += num_detections - len(frame_crops)
+        crops.extend(frame_crops)
+
+    return crops, skipped
+
+
+def export_crops(source: str, zip_path: str, padding: int = 0,
+                 classes: t.Optional[t.Collection[str]] = None,
+                 min_score: t.Optional[float] = None, workers: int = 1,
+                 progress: t.Optional[t.Callable[[int], None]] = None) -> int:
+    """
+    Writes the crops of the detections of a source passing the filter, and
+    their manifest, to a new zip archive. Returns the number of crops.
+    Progress is called with the number of crops written so far.
+    """
+    reader = open_reader(source, use_cache=False)
+    batches = batched(iter_frames(reader, classes, min_score,
+                                  DETECTION_ATTRS, SAMPLE_ATTRS))
+    results = map_batches(partial(_crop_batch, padding=padding), batches,
+                          workers, _init_worker, (source,))
+
+    written = skipped = 0
+    # crops are PNG encoded already, and are stored without compression
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as archive, \
+            tempfile.TemporaryFile('w+', newline='') as manifest:
+        writer = csv.writer(manifest, lineterminator='\n')
+        writer.writerow(MANIFEST_COLUMNS)
+
+        for crops, batch_skipped in results:
+            for name, data, row in crops:
+                archive.writestr(name, data)
+                writer.writerow(row)
+            written += len(crops)
+            skipped += batch_skipped
+            if progress is not None:
+                progress(written)
+
+        manifest.seek(0)
+        with archive.open(MANIFEST_NAME, 'w') as f:
+            for line in manifest:
+                f.write(line.encode())
+
+    if skipped > 0:
+        log.warning(f'Skipped {skipped} detections outside of their frame '
+                    f'or of frames that could not be loaded.')
+    log.info(f'Wrote {written} crops to {zip_path}.')
+    return written
+
+
+def main():
+    parser = ArgumentParser(description='Exports the detections as cropped '
+                                        'patches into a zip archive.')
+    parser.add_argument('source', help='Archive (*.zip) or workspace.')
+    parser.add_argument('output', help='Zip archive to write.')
+    parser.add_argument('--padding', type=int, default=0,
+                        help='Pixels added on every side of the boxes.')
+    parser.add_argument('--classes', nargs='+',
+                        help='Only crop detections of these classes.')
+    parser.add_argument('--min-score', type=float,
+                        help='Only crop detections with at least this '
+                             'score.')
+    parser.add_argument('-j', '--workers', type=int,
+                        default=os.cpu_count() or 1,
+                        help='Number of worker processes.')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - [%(levelname)s] - %(name)s - %(message)s')
+
+    written = export_crops(args.source, args.output, args.padding,
+                           args.classes, args.min_score, args.workers)
+    print(f'Wrote {written} crops to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
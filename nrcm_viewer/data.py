@@ -1,18 +1,51 @@
+import csv
+import hashlib
+import io
+import json
 import logging
+import multiprocessing
 import os
+import time
 import zipfile
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from itertools import islice
 from os import path
-from typing import List, Dict
+from typing import Any, List, Dict, Iterable, Iterator, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+from .archive import ZipMemberReader
+from .cache import IndexCache
+from .profiling import span, timed
+
 log = logging.getLogger(__name__)
 
 CSV_NAME = 'fault_detector_results.csv'
 IMG_APPENDIX = '_original.png'
 
+COORD_KEYS = ('FAULT_X0', 'FAULT_X1', 'FAULT_Y0', 'FAULT_Y1',
+              'FAULT_X0_RH', 'FAULT_X1_RH', 'FAULT_Y0_RH', 'FAULT_Y1_RH')
+# first three underscore separated fields of a file name
+TIMESTAMP_PATTERN = r'^((?:[^_]*_){0,2}[^_]*)'
+
+SAMPLE_KEYS = ('CHANNEL_ID', 'LINE_ID', 'LINE_NAME', 'LINE_OFFSET')
+
+# total size of the CSV files below which they are parsed in this process,
+# as starting worker processes takes longer than parsing them
+PARALLEL_PARSE_BYTES = 16 * 2 ** 20
+
+# CSV files modified less than this before being indexed may still be being
+# written, so the rows of their last frame are left to `refresh`
+SETTLE_SECONDS = 10
+# directory listings are only reused if taken this long after the last
+# change of the directory, as entries added within the resolution of the
+# modification time would not change it
+LISTING_SETTLE_NS = 2 * 10 ** 9
+
 
 @dataclass
 class DetectionBox:
@@ -73,123 +106,871 @@ class Sample:
         self.num_detections += 1
 
 
+class SampleStore:
+    """
+    Columnar storage of samples and their detections.
+
+    Every sample attribute is kept in one array with an element per sample.
+    The detections of all samples are stored back to back in flat arrays,
+    the detections of sample i being the ones in the range
+    offsets[i]:offsets[i + 1]. Boxes are stored in Pascal VOC order, i.e.
+    (x0, x1, y0, y1), in pixels of the image, and so are the rail head
+    boxes (the *_RH coordinates of the results) as written by the detector.
+
+    A store can be grown in place with `extend`, the underlying arrays are
+    then over-allocated so that repeated appends take amortized linear time.
+    """
+    SAMPLE_ATTRS = ('timestamp', 'filepath', 'channel_id', 'line_id',
+                    'line_name', 'line_offset')
+    DETECTION_ATTRS = ('fault_id', 'boxes', 'boxes_rh', 'cls', 'score')
+
+    def __init__(self, samples: Optional[Dict[str, np.ndarray]] = None,
+                 detections: Optional[Dict[str, np.ndarray]] = None,
+                 offsets: Optional[np.ndarray] = None):
+        if samples is None:
+            samples = {attr: np.empty(0, dtype=object)
+                       for attr in self.SAMPLE_ATTRS}
+        if detections is None:
+            detections = {
+                'fault_id': np.empty(0, dtype=object),
+                'boxes': np.empty((0, 4), dtype=np.int64),
+                'boxes_rh': np.empty((0, 4), dtype=np.int64),
+                'cls': np.empty(0, dtype=object),
+                'score': np.empty(0, dtype=np.float64),
+            }
+        if offsets is None:
+            offsets = np.zeros(1, dtype=np.int64)
+
+        self._samples = samples
+        self._detections = detections
+        self._offsets = offsets
+        self._length = len(offsets) - 1
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets[:self._length + 1]
+
+    @property
+    def num_detections(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def column(self, attr: str) -> np.ndarray:
+        """ Returns the array of a sample attribute. """
+        return self._samples[attr][:self._length]
+
+    def detection_column(self, attr: str) -> np.ndarray:
+        """ Returns the flat array of a detection attribute. """
+        return self._detections[attr][:self._offsets[self._length]]
+
+    def value(self, row: int, attr: str) -> Any:
+        """ Returns a sample attribute as a native Python object. """
+        value = self._samples[attr][row]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    def detections(self, row: int) -> slice:
+        return slice(self._offsets[row], self._offsets[row + 1])
+
+    def boxes(self, row: int) -> np.ndarray:
+        """ Returns the (n, 4) array of boxes of a sample. """
+        return self._detections['boxes'][self.detections(row)]
+
+    def classes(self, row: int) -> np.ndarray:
+        return self._detections['cls'][self.detections(row)]
+
+    def scores(self, row: int) -> np.ndarray:
+        return self._detections['score'][self.detections(row)]
+
+    def sample(self, row: int) -> Sample:
+        """ Materializes a single row as a Sample object. """
+        sample = Sample()
+        for attr in self.SAMPLE_ATTRS:
+            setattr(sample, attr, self.value(row, attr))
+        sample.platform_id = 'UNKNOWN'
+
+        slice_ = self.detections(row)
+        sample.bbox = [
+            DetectionBox(fault_id, *box, cls, score) for
+            fault_id, box, cls, score in zip(
+                self._detections['fault_id'][slice_].tolist(),
+                self._detections['boxes'][slice_].tolist(),
+                self._detections['cls'][slice_].tolist(),
+                self._detections['score'][slice_].tolist())]
+        sample.num_detections = len(sample.bbox)
+
+        return sample
+
+    def slice(self, start: int, stop: int) -> 'SampleStore':
+        """ Returns the rows start:stop as a store sharing this one's data. """
+        stop = min(stop, self._length)
+        det_slice = slice(self._offsets[start], self._offsets[stop])
+
+        return SampleStore(
+            {attr: self._samples[attr][start:stop]
+             for attr in self.SAMPLE_ATTRS},
+            {attr: self._detections[attr][det_slice]
+             for attr in self.DETECTION_ATTRS},
+            self._offsets[start:stop + 1] - self._offsets[start])
+
+    def extend(self, other: 'SampleStore'):
+        """ Appends the rows of another store to this one, in place. """
+        if len(other) == 0:
+            return
+
+        n, m = self._length, self._offsets[self._length]
+        n_new, m_new = n + len(other), m + other.offsets[-1]
+
+        for attr in self.SAMPLE_ATTRS:
+            buf = self._reserve(self._samples[attr], n, n_new,
+                                other.column(attr))
+            buf[n:n_new] = other.column(attr)
+            self._samples[attr] = buf
+        for attr in self.DETECTION_ATTRS:
+            buf = self._reserve(self._detections[attr], m, m_new,
+                                other.detection_column(attr))
+            buf[m:m_new] = other.detection_column(attr)
+            self._detections[attr] = buf
+
+        buf = self._reserve(self._offsets, n + 1, n_new + 1, other.offsets)
+        buf[n + 1:n_new + 1] = other.offsets[1:] + m
+        self._offsets = buf
+
+        self._length = n_new
+
+    @staticmethod
+    def _reserve(buf: np.ndarray, length: int, required: int,
+                 new: np.ndarray) -> np.ndarray:
+        """
+        Returns a buffer holding the first `length` elements of `buf`, with
+        room for `required` elements of the common type of `buf` and `new`.
+        """
+        if length == 0:
+            dtype = new.dtype
+        elif buf.dtype == new.dtype:
+            dtype = buf.dtype
+        else:
+            try:
+                dtype = np.promote_types(buf.dtype, new.dtype)
+            except TypeError:
+                dtype = np.dtype(object)
+
+        if required <= len(buf) and dtype == buf.dtype:
+            return buf
+
+        capacity = max(required, 2 * len(buf))
+        new_buf = np.empty((capacity,) + buf.shape[1:], dtype=dtype)
+        new_buf[:length] = buf[:length]
+
+        return new_buf
+
+    @staticmethod
+    def concat(stores: List['SampleStore']) -> 'SampleStore':
+        stores = [o for o in stores if len(o) > 0]
+        if len(stores) == 0:
+            return SampleStore()
+        elif len(stores) == 1:
+            return stores[0]
+
+        # shift the offsets of each store by the detections before it
+        num_detections = np.cumsum([0] + [o.offsets[-1] for o in stores])
+        offsets = np.concatenate(
+            [[0]] + [o.offsets[1:] + n
+                     for o, n in zip(stores, num_detections[:-1])])
+
+        return SampleStore(
+            {attr: np.concatenate([o.column(attr) for o in stores])
+             for attr in SampleStore.SAMPLE_ATTRS},
+            {attr: np.concatenate([o.detection_column(attr) for o in stores])
+             for attr in SampleStore.DETECTION_ATTRS},
+            offsets.astype(np.int64))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {'offsets': self.offsets}
+        arrays.update({f'sample.{attr}': self.column(attr)
+                       for attr in self.SAMPLE_ATTRS})
+        arrays.update({f'detection.{attr}': self.detection_column(attr)
+                       for attr in self.DETECTION_ATTRS})
+
+        return arrays
+
+    @staticmethod
+    def from_arrays(arrays: Dict[str, np.ndarray]) -> 'SampleStore':
+        return SampleStore(
+            {attr: arrays[f'sample.{attr}']
+             for attr in SampleStore.SAMPLE_ATTRS},
+            {attr: arrays[f'detection.{attr}']
+             for attr in SampleStore.DETECTION_ATTRS},
+            arrays['offsets'])
+
+
 class Reader:
     _csv_files: List[str]
     _dirs_with_csv: List[str]
     _dir_to_file: Dict[str, Dict[str, str]]
 
+    _cache: Optional[IndexCache] = None
+    _cached_arrays: Optional[Dict[str, np.ndarray]] = None
+    _samples: Optional[SampleStore] = None
+
+    @property
+    def source(self) -> str:
+        """ Absolute path of the archive or workspace. """
+        raise NotImplementedError
+
     @property
-    def samples(self) -> List[Sample]:
-        all_samples = list()
+    def csv_files(self) -> List[str]:
+        return self._csv_files
 
+    @property
+    def samples(self) -> SampleStore:
+        if self._samples is None:
+            if self._cached_arrays is not None:
+                self._samples = SampleStore.from_arrays(self._cached_arrays)
+                self._cached_arrays = None
+            else:
+                self._samples = SampleStore.concat(
+                    list(self._iter_csv_samples()))
+                if self._cache is not None:
+                    with span('save_cache', 'load'):
+                        self._cache.save(self._index,
+                                         self._samples.to_arrays())
+
+        return self._samples
+
+    def iter_samples(self, chunk_size: Optional[int] = None,
+                     workers: int = 1) -> Iterator[SampleStore]:
+        """
+        Yields the samples one CSV file at a time, so that the first samples
+        are available before all CSV files are parsed. If chunk_size is given,
+        every yielded store holds at most chunk_size samples.
+
+        With more than one worker, and at least PARALLEL_PARSE_BYTES of CSV
+        files, the CSV files are parsed in a pool of worker processes, the
+        samples are still yielded in the order of the CSV files.
+
+        Once all CSV files have been parsed, the samples are memoized and
+        the cache is updated.
+        """
+        parse = self._samples is None and self._cached_arrays is None
+        if not parse:
+            stores = [self.samples]
+        elif workers > 1 and len(self._csv_files) > 1 and \
+                self._csv_size() >= PARALLEL_PARSE_BYTES:
+            stores = self._iter_csv_samples_parallel(workers)
+        else:
+            stores = self._iter_csv_samples()
+
+        parsed = list()
+        for store in stores:
+            if chunk_size is None:
+                yield store
+            else:
+                for start in range(0, len(store), chunk_size):
+                    yield store.slice(start, start + chunk_size)
+
+            if parse:
+                parsed.append(store)
+
+        if parse:
+            self._samples = SampleStore.concat(parsed)
+            if self._cache is not None:
+                with span('save_cache', 'load'):
+                    self._cache.save(self._index, self._samples.to_arrays())
+
+    def _iter_csv_samples(self) -> Iterator[SampleStore]:
         for i, csv_file in enumerate(self._csv_files):
-            samples = {}
-            dir_ = self._dirs_with_csv[i]
-            files = self._dir_to_file[dir_]
+            files = self._dir_to_file[self._dirs_with_csv[i]]
+            samples = self._read_csv(csv_file, files)
+            self._log_samples(i, samples)
 
-            df = pd.read_csv(self.open(csv_file), header=1)
+            yield samples
+
+    def _iter_csv_samples_parallel(self, workers: int) \
+            -> Iterator[SampleStore]:
+        """
+        Parses the CSV files in a process pool. Every worker process gets its
+        own copy of the reader, and thereby its own archive handle.
+        """
+        # workers are spawned rather than forked, as this is typically called
+        # from a thread of the GUI, and forked workers would share the open
+        # archive and its file position with this process
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(self,))
+        # keep a bounded number of parsed files in flight
+        jobs = iter(enumerate(self._csv_files))
+        pending = deque()
+
+        def submit(n: int):
+            for i, csv_file in islice(jobs, n):
+                files = self._dir_to_file[self._dirs_with_csv[i]]
+                pending.append(
+                    executor.submit(_read_csv_in_worker, csv_file, files))
+
+        try:
+            submit(2 * workers)
+            i = 0
+            while len(pending) > 0:
+                with span('wait_csv', 'load'):
+                    samples = pending.popleft().result()
+                submit(1)
+                self._log_samples(i, samples)
+                i += 1
+
+                yield samples
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _read_csv(self, csv_file: str, files: Dict[str, str]) \
+            -> SampleStore:
+        with span('read_csv', 'load', file=csv_file):
+            df = pd.read_csv(self._open_csv(csv_file), header=1)
+        with span('preprocess', 'load'):
             df = _preprocess_df(df)
 
-            # create samples with multiple bboxes
-            for row in df.itertuples():
-                if row.TIMESTAMP in samples:
-                    samples[row.TIMESTAMP].append_bbox(row)
-                else:
-                    samples[row.TIMESTAMP] = \
-                        Sample.from_dataframe(row, files[row.TIMESTAMP])
+        # create samples with multiple bboxes
+        with span('build_store', 'load'):
+            return _build_store(df, files)
 
-            samples_wo_bbox = list(set(files.keys()) - set(samples.keys()))
-            log.info(f'Found {len(samples_wo_bbox)} without faults.')
+    def _log_samples(self, i: int, samples: SampleStore):
+        dir_ = self._dirs_with_csv[i]
+        files = self._dir_to_file[dir_]
 
-            log.info(f'Processed {len(samples)} samples for '
-                     f'{path.split(dir_)[-1]}.')
+        samples_wo_bbox = set(files.keys()) - \
+            set(samples.column('timestamp'))
+        log.info(f'Found {len(samples_wo_bbox)} without faults.')
+
+        log.info(f'Processed {len(samples)} samples for '
+                 f'{path.split(dir_)[-1]}.')
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # only what is needed to open files is sent to worker processes
+        state = self.__dict__.copy()
+        for key in ('_dir_to_file', '_cache', '_cached_arrays', '_samples'):
+            state.pop(key, None)
+
+        return state
+
+    @property
+    def _index(self) -> Dict[str, Any]:
+        return {
+            'csv_files': self._csv_files,
+            'dirs_with_csv': self._dirs_with_csv,
+            'dir_to_file': self._dir_to_file,
+        }
 
-            all_samples += list(samples.values())
+    def _init_cache(self, source: str, key: Dict[str, Any]) \
+            -> Optional[Dict[str, Any]]:
+        """
+        Looks up the cache entry of the source, and returns the cached index
+        if there is a valid entry.
+        """
+        self._cache = IndexCache(source, key)
+        with span('load_cache', 'load'):
+            entry = self._cache.load()
+        if entry is None:
+            return None
 
-        return all_samples
+        index, self._cached_arrays = entry
+        log.info(f'Using cached index of {source}.')
+
+        return index
 
     def open(self, file_path: str):
         raise NotImplementedError
 
+    def _csv_size(self) -> int:
+        """ Total size of the CSV files in bytes. """
+        raise NotImplementedError
+
+    def _open_csv(self, csv_file: str):
+        return self.open(csv_file)
+
+    def close(self):
+        """ Closes the files the reader keeps open, if any. """
+
 
 class ZipReader(Reader):
-    def __init__(self, zip_path: str):
+    def __init__(self, zip_path: str, use_cache: bool = True,
+                 use_mmap: bool = False):
         self._zip_path = zip_path
+        self._use_mmap = use_mmap
         try:
             self._file = zipfile.ZipFile(zip_path)
         except zipfile.BadZipfile as e:
             raise RuntimeError(e)
+        self._members = ZipMemberReader(zip_path, self._file, use_mmap)
 
         self._dirs_with_csv = list()
         self._csv_files = list()
         self._dir_to_file = dict()
 
-        self._parse_zip()
+        index = None
+        if use_cache:
+            index = self._init_cache(zip_path, self._cache_key())
 
-    def _parse_zip(self):
-        self._csv_files = [o.filename for o in self._file.filelist
-                           if o.filename.endswith(CSV_NAME)]
+        if index is None:
+            self._parse_zip()
+        else:
+            self._csv_files = index['csv_files']
+            self._dirs_with_csv = index['dirs_with_csv']
+            self._dir_to_file = index['dir_to_file']
+
+    @property
+    def source(self) -> str:
+        return path.abspath(self._zip_path)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        del state['_file']
+        del state['_members']
+
+        return state
 
-        self._dirs_with_csv = [path.split(o)[0] for o in self._csv_files]
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._file = zipfile.ZipFile(self._zip_path)
+        self._members = ZipMemberReader(self._zip_path, self._file,
+                                        self._use_mmap)
 
-        self._dir_to_file = {
-            dir_: {
-                '_'.join(path.split(o.filename)[-1].split('_')[:3]): o.filename
-                for o in self._file.filelist if
-                o.filename.startswith(dir_) and o.filename.endswith(
-                    IMG_APPENDIX)} for dir_ in self._dirs_with_csv}
+    def _cache_key(self) -> Dict[str, Any]:
+        stat = os.stat(self._zip_path)
+        return {
+            'path': path.abspath(self._zip_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'csv_crc': [[o.filename, o.CRC] for o in self._file.filelist
+                        if o.filename.endswith(CSV_NAME)],
+        }
+
+    @timed('index_zip', 'load')
+    def _parse_zip(self):
+        self._csv_files, self._dirs_with_csv, self._dir_to_file = \
+            index_members(o.filename for o in self._file.filelist)
 
     @property
     def dataframe(self) -> pd.DataFrame:
         dfs = []
 
         for csv_file in self._csv_files:
-            dfs.append(pd.read_csv(self._file.open(csv_file),
+            dfs.append(pd.read_csv(self.open(csv_file),
                                    header=1))
 
         return pd.concat(dfs)
 
     def open(self, file_path: str):
-        return self._file.open(file_path)
+        # safe to call from several threads at once. Images are read at
+        # once, other members, e.g. CSV files, are streamed
+        if file_path.endswith(IMG_APPENDIX):
+            return self._members.open(file_path)
+        return self._members.stream(file_path)
+
+    def _csv_size(self) -> int:
+        return sum(self._members.getinfo(csv_file).file_size
+                   for csv_file in self._csv_files)
+
+    def close(self):
+        self._members.close()
+        self._file.close()
 
 
 class WorkspaceReader(Reader):
-    def __init__(self, workspace_path: str):
+    """
+    Reader of a workspace directory, in which the fault detector may still
+    be writing results. Once `watch` has been called, `refresh` returns the
+    samples added to the workspace since.
+
+    The rows of the last frame of a CSV file that was modified shortly
+    before being indexed are not parsed with the other samples, as more of
+    them may follow, but are returned by `refresh`.
+    """
+    def __init__(self, workspace_path: str, use_cache: bool = True):
         self._workspace_path = workspace_path
 
+        # size and modification time of every CSV file when indexed, the
+        # samples are parsed from the complete lines within that size, and
+        # whether the file had settled by then
+        self._csv_stats: Dict[str, os.stat_result] = dict()
+        self._csv_settled: Dict[str, bool] = dict()
+        # directory listings reused when indexing the workspace again
+        self._listings: Dict[str, Tuple[int, Any]] = dict()
+        # bytes of every CSV file that have been parsed when watching, the
+        # size of the files at the last refresh, and their column names
+        self._is_watching = False
+        self._csv_offsets: Dict[str, int] = dict()
+        self._csv_sizes: Dict[str, int] = dict()
+        self._csv_columns: Dict[str, List[str]] = dict()
+        # parsed detections whose image has not been written yet, or which
+        # belong to a frame that may not be complete yet
+        self._pending: Dict[str, pd.DataFrame] = dict()
+
         self._parse_workspace()
 
+        if use_cache:
+            self._init_cache(workspace_path, self._cache_key())
+
+    @property
+    def source(self) -> str:
+        return path.abspath(self._workspace_path)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        for key in ('_listings', '_pending'):
+            state.pop(key, None)
+
+        return state
+
+    def _cache_key(self) -> Dict[str, Any]:
+        csv_stats = []
+        for csv_file in self._csv_files:
+            stat = self._csv_stats[csv_file]
+            csv_stats.append([csv_file, stat.st_size, stat.st_mtime_ns,
+                              self._csv_settled[csv_file]])
+
+        return {
+            'path': path.abspath(self._workspace_path),
+            'csv_stat': csv_stats,
+            'index': hashlib.sha1(json.dumps(
+                self._dir_to_file, sort_keys=True).encode()).hexdigest(),
+        }
+
+    @timed('index_workspace', 'load')
     def _parse_workspace(self):
-        root_path = self._workspace_path
-        while not any([o == CSV_NAME for o in os.listdir(root_path)]):
-            dir_ = [o for o in os.listdir(root_path)
-                    if path.isdir(path.join(root_path, o))][0]
-            root_path = path.join(root_path, dir_)
+        self._csv_files, self._dirs_with_csv, self._dir_to_file = \
+            index_workspace(self._workspace_path, self._listings)
+        self._csv_stats = {csv_file: os.stat(csv_file)
+                           for csv_file in self._csv_files}
+        now = time.time()
+        self._csv_settled = {
+            csv_file: now - stat.st_mtime >= SETTLE_SECONDS
+            for csv_file, stat in self._csv_stats.items()}
 
-        root_path = path.split(path.abspath(root_path))[0]
+    @property
+    def is_watching(self) -> bool:
+        return self._is_watching
 
-        self._csv_files = list()
-        self._dirs_with_csv = list()
-        self._dir_to_file = dict()
+    def watch(self):
+        """
+        Starts tracking changes of the workspace, so that rows appended to
+        the CSV files after their samples were read are returned by the
+        first `refresh`.
+
+        Reads the end and the header of every CSV file, so better called
+        off the GUI thread.
+        """
+        for csv_file in self._csv_files:
+            self._csv_offsets[csv_file] = self._parsed_offset(csv_file)
+            self._csv_sizes[csv_file] = self._csv_stats[csv_file].st_size
+            self._csv_columns[csv_file] = list(
+                pd.read_csv(csv_file, header=1, nrows=0).columns)
+        self._is_watching = True
+
+    def refresh(self) -> SampleStore:
+        """
+        Returns the samples of the rows appended to the CSV files, and of
+        the CSV files created, since the last refresh. Only the new bytes of
+        every CSV file, and only the directories changed since the last
+        refresh, are read.
 
-        for dir_ in os.listdir(root_path):
-            subdir = path.join(root_path, dir_)
-            files = os.listdir(subdir)
-            if CSV_NAME not in os.listdir(subdir):
+        Detections of images that do not exist yet are held back until the
+        image appears. The detections of the last frame of a file are held
+        back until the rows of a later frame follow them, or until a refresh
+        finds the file unchanged.
+        """
+        if not self.is_watching:
+            raise RuntimeError('Call watch before refreshing the workspace.')
+
+        with span('index_workspace'):
+            csv_files, dirs_with_csv, self._dir_to_file = \
+                index_workspace(self._workspace_path, self._listings)
+
+        stores = list()
+        for csv_file, dir_ in zip(csv_files, dirs_with_csv):
+            if csv_file not in self._csv_offsets:
+                log.info(f'Found new results in {dir_}.')
+                self._csv_files.append(csv_file)
+                self._dirs_with_csv.append(dir_)
+                self._csv_offsets[csv_file] = 0
+                self._csv_sizes[csv_file] = 0
+
+            df, is_stable = self._read_csv_tail(csv_file)
+            pending = self._pending.pop(csv_file, None)
+            if pending is not None:
+                df = pending if df is None else pd.concat(
+                    [pending, df], ignore_index=True)
+            if df is None or len(df) == 0:
                 continue
 
-            self._csv_files.append(path.join(subdir, CSV_NAME))
-            self._dirs_with_csv.append(subdir)
+            files = self._dir_to_file[dir_]
+            ready = df['TIMESTAMP'].isin(files.keys())
+            if not is_stable:
+                # more rows of the last frame may still be written
+                ready &= df['TIMESTAMP'] != df['TIMESTAMP'].iloc[-1]
+            ready = ready.to_numpy()
 
-            self._dir_to_file[subdir] = {
-                '_'.join(path.split(o)[-1].split('_')[:3]): path.join(subdir,
-                                                                      o)
-                for o in files if o.endswith(IMG_APPENDIX)
-            }
+            if not ready.all():
+                self._pending[csv_file] = df[~ready]
+            if ready.any():
+                stores.append(_build_store(df[ready], files))
+
+        return SampleStore.concat(stores)
+
+    def _read_csv_tail(self, csv_file: str) \
+            -> Tuple[Optional[pd.DataFrame], bool]:
+        """
+        Parses the complete lines of a CSV file after the parsed offset, and
+        advances the offset past them. Also returns whether the file is
+        unchanged since the last refresh and ends with a complete line.
+        """
+        offset = self._csv_offsets[csv_file]
+        with open(csv_file, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+
+        size = offset + len(data)
+        is_stable = size == self._csv_sizes[csv_file]
+        self._csv_sizes[csv_file] = size
+
+        # the last line may still be being written
+        end = data.rfind(b'\n') + 1
+        is_stable &= end == len(data)
+        if offset == 0 and data.count(b'\n', 0, end) < 2:
+            # the header is not complete yet
+            return None, is_stable
+        if end == 0:
+            return None, is_stable
+
+        if offset == 0:
+            df = pd.read_csv(io.BytesIO(data[:end]), header=1)
+            self._csv_columns[csv_file] = list(df.columns)
+        else:
+            df = pd.read_csv(io.BytesIO(data[:end]), header=None,
+                             names=self._csv_columns[csv_file])
+        self._csv_offsets[csv_file] = offset + end
+
+        return _preprocess_df(df), is_stable
 
     def open(self, file_path: str):
         return open(file_path, 'rb')
 
+    def _csv_size(self) -> int:
+        return sum(self._csv_stats[csv_file].st_size
+                   for csv_file in self._csv_files)
+
+    def _open_csv(self, csv_file: str):
+        # only the complete lines of the size the file had when indexed, as
+        # in the cache key and where watching resumes
+        with open(csv_file, 'rb') as f:
+            data = f.read(self._parsed_offset(csv_file))
+
+        return io.BytesIO(data)
+
+    def _parsed_offset(self, csv_file: str) -> int:
+        offset = _parsed_offset(csv_file, self._csv_stats[csv_file].st_size)
+        if not self._csv_settled[csv_file]:
+            offset = _last_frame_offset(csv_file, offset)
+
+        return offset
+
+
+def _parsed_offset(file_path: str, size: int) -> int:
+    """
+    Returns the offset just after the last complete line within the first
+    size bytes of a file, up to which its samples are parsed.
+    """
+    with open(file_path, 'rb') as f:
+        # lines are far shorter than this
+        start = max(0, size - 65536)
+        f.seek(start)
+        data = f.read(size - start)
+
+    end = data.rfind(b'\n') + 1
+    if end == 0 and start > 0:
+        return _parsed_offset(file_path, start)
+
+    return start + end
+
+
+def _last_frame_offset(file_path: str, end: int) -> int:
+    """
+    Returns the offset of the first line of the rows of the last frame
+    among the complete lines before end of a CSV file, or end if there are
+    no rows.
+    """
+    with open(file_path, 'rb') as f:
+        header = f.readline() + f.readline()
+        column = next(csv.reader([header.decode().splitlines()[-1]])) \
+            .index('FILENAME')
+        if end <= len(header):
+            return end
+
+        # the rows of a frame are far shorter than this
+        start = max(len(header), end - 65536)
+        f.seek(start)
+        lines = f.read(end - start).splitlines(keepends=True)
+    if start > len(header):
+        # the first line may be incomplete
+        start += len(lines.pop(0))
+
+    offset = end
+    last = None
+    for line in reversed(lines):
+        timestamp = _timestamp(
+            next(csv.reader([line.decode()]))[column])
+        if last is not None and timestamp != last:
+            break
+        last = timestamp
+        offset -= len(line)
+
+    return max(offset, start)
+
+
+def _timestamp(filename: str) -> str:
+    return '_'.join(filename.split('_', 3)[:3])
+
+
+def _assign_images(dirs_with_csv: List[str],
+                   images: Dict[str, Dict[str, str]], sep: str = '/') \
+        -> Dict[str, Dict[str, str]]:
+    """
+    Assigns the images of every directory to the closest directory at or
+    above it that has a CSV file, looking up the tree once per directory
+    instead of once per image.
+    """
+    dir_to_file = {dir_: dict() for dir_ in dirs_with_csv}
+
+    for dir_, files in images.items():
+        owner = dir_
+        while owner and owner not in dir_to_file:
+            owner = owner.rpartition(sep)[0]
+        if owner in dir_to_file:
+            dir_to_file[owner].update(files)
+
+    return dir_to_file
+
+
+def index_members(names: Iterable[str]) \
+        -> Tuple[List[str], List[str], Dict[str, Dict[str, str]]]:
+    """
+    Indexes the member names of an archive in a single pass.
+
+    Returns the CSV files, their directories and, for every one of these
+    directories, the mapping of timestamp to image.
+    """
+    csv_files = list()
+    images: Dict[str, Dict[str, str]] = dict()
+
+    for name in names:
+        if name.endswith(IMG_APPENDIX):
+            dir_, _, filename = name.rpartition('/')
+            files = images.get(dir_)
+            if files is None:
+                files = images[dir_] = dict()
+            files[_timestamp(filename)] = name
+        elif name.endswith(CSV_NAME):
+            csv_files.append(name)
+
+    dirs_with_csv = [o.rpartition('/')[0] for o in csv_files]
+
+    return csv_files, dirs_with_csv, _assign_images(dirs_with_csv, images)
+
+
+def index_workspace(workspace_path: str,
+                    listings: Optional[Dict[str, Tuple[int, Any]]] = None) \
+        -> Tuple[List[str], List[str], Dict[str, Dict[str, str]]]:
+    """
+    Indexes a workspace like `index_members`, listing every directory below
+    the workspace exactly once with os.scandir. Directories are visited in
+    sorted order.
+
+    If listings are given, a directory is not listed again if its
+    modification time is the one of its listing in there, which are
+    updated with the new listings.
+    """
+    csv_files = list()
+    dirs_with_csv = list()
+    images: Dict[str, Dict[str, str]] = dict()
+
+    stack = [path.abspath(workspace_path)]
+    while stack:
+        dir_ = stack.pop()
+        try:
+            subdirs, files, has_csv = _list_dir(dir_, listings)
+        except OSError as e:
+            log.warning(f'Could not list {dir_}: {e}')
+            continue
+
+        if has_csv:
+            csv_files.append(path.join(dir_, CSV_NAME))
+            dirs_with_csv.append(dir_)
+        if files:
+            images[dir_] = files
+        stack.extend(reversed(subdirs))
+
+    return csv_files, dirs_with_csv, \
+        _assign_images(dirs_with_csv, images, os.sep)
+
+
+def _list_dir(dir_: str, listings: Optional[Dict[str, Tuple[int, Any]]]) \
+        -> Tuple[List[str], Dict[str, str], bool]:
+    """
+    Returns the sorted subdirectories of a directory, the mapping of
+    timestamp to image of its images, and whether it has a CSV file.
+    """
+    if listings is not None:
+        mtime = os.stat(dir_).st_mtime_ns
+        entry = listings.get(dir_)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+    subdirs = list()
+    files = dict()
+    has_csv = False
+    with os.scandir(dir_) as entries:
+        for entry in entries:
+            if entry.name.endswith(IMG_APPENDIX):
+                files[_timestamp(entry.name)] = entry.path
+            elif entry.name == CSV_NAME:
+                has_csv = True
+            elif entry.is_dir():
+                subdirs.append(entry.path)
+    listing = sorted(subdirs), files, has_csv
+
+    if listings is not None:
+        if time.time_ns() - mtime > LISTING_SETTLE_NS:
+            listings[dir_] = mtime, listing
+        else:
+            listings.pop(dir_, None)
+
+    return listing
+
+
+def open_reader(source: str, use_cache: bool = True) -> Reader:
+    """ Opens a workspace directory or an archive. """
+    if path.isdir(source):
+        return WorkspaceReader(source, use_cache=use_cache)
+    return ZipReader(source, use_cache=use_cache)
+
+
+# reader of a parsing worker process, set by the pool initializer
+_worker_reader: Optional[Reader] = None
+
+
+def _init_worker(reader: Reader):
+    global _worker_reader
+    _worker_reader = reader
+
+
+def _read_csv_in_worker(csv_file: str, files: Dict[str, str]) \
+        -> SampleStore:
+    return _worker_reader._read_csv(csv_file, files)
+
 
 def _preprocess_df(df: pd.DataFrame):
     df['FAULT_X0'] *= df['IMG_W']
@@ -200,16 +981,61 @@ def _preprocess_df(df: pd.DataFrame):
     df['FAULT_Y0'] -= df['RH_Y0']
     df['FAULT_Y1'] -= df['RH_Y0']
 
-    for key in ('FAULT_X0', 'FAULT_X1', 'FAULT_Y0', 'FAULT_Y1',
-                'FAULT_X0_RH', 'FAULT_X1_RH', 'FAULT_Y0_RH', 'FAULT_Y1_RH'):
-        df[key] = df[key].apply(lambda x: int(float(x)))
+    # detections without coordinates would get arbitrary ones when cast
+    coords = np.stack([df[key].to_numpy(dtype=np.float64)
+                       for key in COORD_KEYS], axis=1)
+    valid = np.isfinite(coords).all(axis=1)
+    if not valid.all():
+        log.warning(f'Dropped {len(valid) - np.count_nonzero(valid)} '
+                    f'detections with missing coordinates.')
+        df = df[valid].reset_index(drop=True)
+        coords = coords[valid]
+
+    # truncate towards zero, like int(float(x))
+    for i, key in enumerate(COORD_KEYS):
+        df[key] = coords[:, i].astype(np.int64)
 
-    df['TIMESTAMP'] = df['FILENAME'] \
-        .apply(lambda x: '_'.join(x.split('_')[:3]))
+    # detections of a frame share the file name, so only the unique names
+    # need to be split
+    codes, filenames = pd.factorize(df['FILENAME'])
+    timestamps = pd.Index(filenames).str.extract(TIMESTAMP_PATTERN,
+                                                 expand=False)
+    df['TIMESTAMP'] = np.asarray(timestamps, dtype=object)[codes]
 
     return df
 
 
+def _build_store(df: pd.DataFrame, files: Dict[str, str]) -> SampleStore:
+    """
+    Groups the detections of a preprocessed dataframe by timestamp, creating
+    one sample per timestamp in order of first appearance.
+    """
+    codes, timestamps = pd.factorize(df['TIMESTAMP'])
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(timestamps) + 1))
+    first = order[bounds[:-1]]
+
+    timestamps = np.asarray(timestamps, dtype=object)
+    samples = {
+        'timestamp': timestamps,
+        'filepath': np.array([files[o] for o in timestamps], dtype=object),
+    }
+    for attr, key in zip(SampleStore.SAMPLE_ATTRS[2:], SAMPLE_KEYS):
+        samples[attr] = df[key].to_numpy()[first]
+
+    boxes = np.stack([df[key].to_numpy(dtype=np.int64)
+                      for key in COORD_KEYS], axis=1)
+    detections = {
+        'fault_id': df['FAULT_UUID'].to_numpy(dtype=object)[order],
+        'boxes': boxes[order, :4],
+        'boxes_rh': boxes[order, 4:],
+        'cls': df['CLASS'].to_numpy(dtype=object)[order],
+        'score': df['DEFECT_SCORE'].to_numpy(dtype=np.float64)[order],
+    }
+
+    return SampleStore(samples, detections, bounds.astype(np.int64))
+
+
 if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('zip_file', help='Path to .zip file')
@@ -0,0 +1,228 @@
+"""
+Export of samples and their detections to CSV, TSV and Parquet files.
+
+Files are written in chunks of samples, so that memory use does not depend
+on the number of exported samples. Parquet export requires pyarrow.
+"""
+import logging
+import typing as t
+from os import path
+
+import numpy as np
+import pandas as pd
+
+from .data import SampleStore
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 100000
+
+SEPARATORS = {'csv': ',', 'tsv': '\t'}
+FORMATS = ('csv', 'tsv', 'parquet')
+
+# columns of an exported detection, in the naming of the results CSV files
+SAMPLE_COLUMNS = {
+    'timestamp': 'TIMESTAMP',
+    'filepath': 'FILEPATH',
+    'channel_id': 'CHANNEL_ID',
+    'line_id': 'LINE_ID',
+    'line_name': 'LINE_NAME',
+    'line_offset': 'LINE_OFFSET',
+}
+BOX_COLUMNS = ('FAULT_X0', 'FAULT_X1', 'FAULT_Y0', 'FAULT_Y1')
+RH_BOX_COLUMNS = ('FAULT_X0_RH', 'FAULT_X1_RH', 'FAULT_Y0_RH', 'FAULT_Y1_RH')
+
+
+def format_of(file_path: str) -> str:
+    """ Returns the export format matching the extension of a file. """
+    fmt = path.splitext(file_path)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown export format "{fmt}", expected one of '
+                         f'{", ".join(FORMATS)}.')
+
+    return fmt
+
+
+def detection_indices(store: SampleStore, rows: np.ndarray) \
+        -> t.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns, for every detection of the given rows, the index of its row in
+    `rows` and its index in the detection arrays of the store.
+    """
+    offsets = store.offsets
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+
+    owner = np.repeat(np.arange(len(rows)), counts)
+    # position of every detection within its sample
+    first = np.cumsum(counts) - counts
+    within = np.arange(counts.sum()) - np.repeat(first, counts)
+
+    return owner, np.repeat(starts, counts) + within
+
+
+def store_columns(store: SampleStore) \
+        -> t.Tuple[t.Dict[str, np.ndarray], t.Dict[str, np.ndarray]]:
+    """
+    Returns the sample columns and the detection columns of a store, by
+    their exported name, in the exported order.
+    """
+    samples = {name: store.column(attr)
+               for attr, name in SAMPLE_COLUMNS.items()}
+
+    detections = {'FAULT_UUID': store.detection_column('fault_id')}
+    for attr, names in (('boxes', BOX_COLUMNS), ('boxes_rh', RH_BOX_COLUMNS)):
+        boxes = store.detection_column(attr)
+        detections.update({name: boxes[:, i]
+                           for i, name in enumerate(names)})
+    detections['CLASS'] = store.detection_column('cls')
+    detections['DEFECT_SCORE'] = store.detection_column('score')
+
+    return samples, detections
+
+
+def detection_frame(store: SampleStore, rows: np.ndarray) -> pd.DataFrame:
+    """ Returns a dataframe with one line per detection of the rows. """
+    owner, detections = detection_indices(store, rows)
+    sample_rows = rows[owner]
+
+    sample_columns, detection_columns = store_columns(store)
+    columns = {name: column[sample_rows]
+               for name, column in sample_columns.items()}
+    columns.update({name: column[detections]
+                    for name, column in detection_columns.items()})
+
+    return pd.DataFrame(columns)
+
+
+def sample_frame(store: SampleStore, rows: np.ndarray,
+                 attrs: t.Sequence[str]) -> pd.DataFrame:
+    """ Returns a dataframe with the given attributes of the rows. """
+    return pd.DataFrame({attr: store.column(attr)[rows] for attr in attrs})
+
+
+def to_text(frame: pd.DataFrame, sep: str = '\t',
+            header: bool = False) -> str:
+    """
+    Serializes a dataframe as delimiter separated text, in linear time.
+    """
+    return frame.to_csv(sep=sep, header=header, index=False,
+                        lineterminator='\n')
+
+
+def export_samples(store: SampleStore, rows: np.ndarray, file_path: str,
+                   fmt: t.Optional[str] = None,
+                   chunk_size: int = CHUNK_SIZE,
+                   progress: t.Optional[t.Callable[[int, int], bool]] = None):
+    """
+    Writes the detections of the given rows of a store to a file, one line
+    per detection, `chunk_size` samples at a time.
+
+    If given, progress is called with the number of samples written and the
+    total after every chunk, and the export is aborted if it returns False.
+    The format is derived from the file extension if not given.
+    """
+    fmt = fmt or format_of(file_path)
+    rows = np.asarray(rows, dtype=np.int64)
+
+    # an empty export still writes the header
+    chunks = (detection_frame(store, rows[start:start + chunk_size])
+              for start in range(0, max(len(rows), 1), chunk_size))
+
+    if fmt == 'parquet':
+        writer = _ParquetWriter(file_path, store)
+    else:
+        writer = _TextWriter(file_path, SEPARATORS[fmt])
+
+    with writer:
+        written = 0
+        for frame in chunks:
+            writer.write(frame)
+            written = min(written + chunk_size, len(rows))
+            if progress is not None and progress(written, len(rows)) is False:
+                log.info(f'Export to {file_path} aborted.')
+                break
+
+    log.info(f'Exported {written} samples to {file_path}.')
+
+
+class _TextWriter:
+    def __init__(self, file_path: str, sep: str):
+        self._file = open(file_path, 'w', newline='')
+        self._sep = sep
+        self._header = True
+
+    def write(self, frame: pd.DataFrame):
+        self._file.write(to_text(frame, self._sep, self._header))
+        self._header = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, file_path: str, store: SampleStore):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Exporting to Parquet requires pyarrow, '
+                               'install it with pip install pyarrow.')
+
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._file_path = file_path
+        self._writer = None
+
+        # the types of the whole columns, as a chunk, e.g. with only missing
+        # values, does not tell them. Object columns mixing strings and
+        # other values are written as strings
+        sample_columns, detection_columns = store_columns(store)
+        fields = list()
+        self._to_string = list()
+        for name, column in {**sample_columns, **detection_columns}.items():
+            arrow_type, to_string = _arrow_type(pyarrow, column)
+            fields.append((name, arrow_type))
+            if to_string:
+                self._to_string.append(name)
+        self._schema = pyarrow.schema(fields)
+
+    def write(self, frame: pd.DataFrame):
+        for name in self._to_string:
+            frame[name] = [o if pd.isna(o) else str(o) for o in frame[name]]
+
+        table = self._pa.Table.from_pandas(frame, schema=self._schema,
+                                           preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._file_path,
+                                                  self._schema)
+        self._writer.write_table(table)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _arrow_type(pa, column: np.ndarray):
+    """
+    Returns the Arrow type of a column, and whether its values need to be
+    converted to strings.
+    """
+    if column.dtype.kind != 'O':
+        return pa.from_numpy_dtype(column.dtype), False
+
+    kind = pd.api.types.infer_dtype(column, skipna=True)
+    if kind == 'integer':
+        return pa.int64(), False
+    elif kind in ('floating', 'mixed-integer-float'):
+        return pa.float64(), False
+    elif kind == 'boolean':
+        return pa.bool_(), False
+
+    return pa.string(), kind not in ('string', 'empty')
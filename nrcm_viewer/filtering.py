@@ -0,0 +1,542 @@
+"""
+Sorting and filtering of samples, evaluated on the columns of a SampleStore
+with NumPy.
+
+A filter is a conjunction of comparisons, e.g.
+
+    line == "Line 0" and offset >= 10 and offset < 20 and class == crack
+
+Fields are line (line_name), line_id, offset (line_offset), channel
+(channel_id), timestamp, class (cls), score and detections (the number of
+detections of a sample). Operators are ==, !=, <, <=, >, >= and ~ (contains,
+ignoring case). Values with spaces can be quoted, or are joined up to the
+next `and`.
+
+Comparisons of the detection fields class and score must hold for the same
+detection, i.e. `class == crack and score > 0.5` selects the samples with a
+crack detected with a score above 0.5.
+
+Filters of a line name, offset bounds and at most one class, e.g.
+
+    line == "Line 0" and offset >= 10 and offset <= 20 and class == crack
+
+are answered by the position index of the samples instead of a scan of the
+columns.
+"""
+import operator
+import re
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+from .data import SampleStore
+from .profiling import timed
+
+FIELDS = {
+    'line': 'line_name',
+    'line_name': 'line_name',
+    'line_id': 'line_id',
+    'offset': 'line_offset',
+    'line_offset': 'line_offset',
+    'channel': 'channel_id',
+    'channel_id': 'channel_id',
+    'timestamp': 'timestamp',
+    'class': 'cls',
+    'cls': 'cls',
+    'score': 'score',
+    'detections': 'detections',
+}
+DETECTION_FIELDS = ('cls', 'score')
+
+OPERATORS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+CONTAINS = '~'
+# side of the offsets searched for the lower and upper bounds of a range
+_LOWER_SIDES = {'>=': 'left', '>': 'right', '==': 'left', '=': 'left'}
+_UPPER_SIDES = {'<=': 'right', '<': 'left', '==': 'right', '=': 'right'}
+
+_TOKEN = re.compile(r'\s*(?:"(?P<dquote>[^"]*)"|\'(?P<squote>[^\']*)\''
+                    r'|(?P<op>==|!=|<=|>=|<|>|=|~)'
+                    r'|(?P<word>[^\s=!<>~"\']+))')
+
+
+class StoreColumns:
+    """
+    Cached representations of the columns of a store, used for sorting and
+    filtering. The cache is cleared whenever the store has grown.
+    """
+    def __init__(self, store: SampleStore):
+        self._store = store
+        self._length = -1
+        self._cache: t.Dict[t.Tuple[str, str], t.Any] = dict()
+
+    @property
+    def store(self) -> SampleStore:
+        return self._store
+
+    def column(self, attr: str) -> np.ndarray:
+        if attr in DETECTION_FIELDS:
+            return self._store.detection_column(attr)
+        return self._store.column(attr)
+
+    def factorized(self, attr: str) -> t.Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the codes and the unique values of a column, in order of
+        first appearance. Codes of missing values are -1.
+        """
+        return self._cached('factorized', attr,
+                            lambda: pd.factorize(self.column(attr)))
+
+    def strings(self, attr: str) -> t.Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the codes of a column into the sorted unique string
+        representations of its values. Codes of missing values are -1.
+        """
+        def rank():
+            codes, uniques = self.factorized(attr)
+            strings = np.asarray(uniques, dtype=str)
+            order = np.argsort(strings, kind='stable')
+
+            ranks = np.empty(len(order) + 1, dtype=np.int64)
+            ranks[order] = np.arange(len(order))
+            ranks[-1] = -1
+            return ranks[codes], strings[order]
+
+        return self._cached('strings', attr, rank)
+
+    def numeric(self, attr: str) -> t.Optional[np.ndarray]:
+        """
+        Returns the column as floats, or None if it has values that are not
+        numbers. Strings of numbers, e.g. offsets, are converted.
+        """
+        def convert():
+            column = self.column(attr)
+            if column.dtype.kind in 'iufb':
+                return column.astype(np.float64)
+
+            codes, uniques = self.factorized(attr)
+            try:
+                values = pd.to_numeric(pd.Series(uniques)) \
+                    .to_numpy(dtype=np.float64)
+            except (ValueError, TypeError):
+                return None
+
+            return np.append(values, np.nan)[codes]
+
+        return self._cached('numeric', attr, convert)
+
+    def order(self, attr: str) -> np.ndarray:
+        """
+        Returns the indices that sort the samples by an attribute, in
+        numeric order if all values are numbers and in lexical order
+        otherwise.
+        """
+        def argsort():
+            key = self.numeric(attr)
+            if key is None:
+                key = self.strings(attr)[0]
+            return np.argsort(key, kind='stable')
+
+        return self._cached('order', attr, argsort)
+
+    def positions(self) -> t.Optional['PositionIndex']:
+        """
+        Returns the index of the samples by track position, or None if the
+        offsets are not numbers.
+        """
+        def build():
+            if self.numeric('line_offset') is None:
+                return None
+            return PositionIndex(self)
+
+        return self._cached('positions', '', build)
+
+    def set_positions(self, index: 'PositionIndex'):
+        """
+        Uses an index built elsewhere, e.g. in the background on a snapshot
+        of the store. Ignored if the store has grown since.
+        """
+        if len(index) == len(self._store):
+            self._cached('positions', '', lambda: index)
+
+    def _cached(self, kind: str, attr: str, compute: t.Callable[[], t.Any]):
+        if len(self._store) != self._length:
+            self._cache.clear()
+            self._length = len(self._store)
+
+        key = (kind, attr)
+        if key not in self._cache:
+            self._cache[key] = compute()
+
+        return self._cache[key]
+
+
+class PositionIndex:
+    """
+    Index of the samples by track position, i.e. sorted by line name,
+    numeric offset and timestamp. Lines and offsets are looked up by binary
+    search, and the samples in a range of offsets are a slice of the index.
+
+    Samples without an offset are last within their line, and are never in
+    a range.
+    """
+    @timed('build_positions')
+    def __init__(self, columns: StoreColumns):
+        offsets = columns.numeric('line_offset')
+        if offsets is None:
+            raise ValueError('The offsets are not numbers.')
+
+        lines, self._line_names = columns.strings('line_name')
+        timestamps = columns.strings('timestamp')[0]
+
+        self._rows = np.lexsort((timestamps, offsets, lines))
+        self._lines = lines[self._rows]
+        self._offsets = offsets[self._rows]
+
+        # the line names of every line id, to look up lines by id
+        ids, id_strings = columns.strings('line_id')
+        pairs = pd.unique(lines * (len(id_strings) + 1) + ids + 1)
+        # without samples of missing line names
+        pairs = pairs[pairs >= 0]
+        self._line_ids: t.Dict[str, t.List[int]] = dict()
+        for line, line_id in zip(*np.divmod(pairs, len(id_strings) + 1)):
+            if line_id > 0:
+                self._line_ids.setdefault(str(id_strings[line_id - 1]),
+                                          list()).append(int(line))
+
+        # whether a sample has a detection of a class, in index order, with a
+        # column per class
+        classes, self._class_names = columns.strings('cls')
+        store = columns.store
+        samples = np.repeat(np.arange(len(store)), store.num_detections)
+        present = classes >= 0
+        has_class = np.zeros((len(store), len(self._class_names)), dtype=bool)
+        has_class[samples[present], classes[present]] = True
+        self._has_class = has_class[self._rows]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def rows(self) -> np.ndarray:
+        """ Rows of the store, in order of track position. """
+        return self._rows
+
+    def line_codes(self, line: str, by_id: bool = True) -> t.List[int]:
+        """
+        Returns the codes of the line names equal to a line name, or
+        else, if by_id, of the lines with that line id.
+        """
+        code = int(np.searchsorted(self._line_names, line))
+        if code < len(self._line_names) and self._line_names[code] == line:
+            return [code]
+        if by_id:
+            return self._line_ids.get(line, list())
+        return list()
+
+    def locate(self, line: str, offset: float) -> int:
+        """
+        Returns the row of the store of the sample closest to an offset on
+        a line, given by name or id. Raises a ValueError if there is no
+        such line.
+        """
+        best, best_distance = -1, np.inf
+        for start, stop in self._bounds(self._codes(line)):
+            if stop == start:
+                continue
+
+            i = start + int(np.searchsorted(self._offsets[start:stop],
+                                            offset))
+            for position in (i - 1, i):
+                if start <= position < stop:
+                    distance = abs(self._offsets[position] - offset)
+                    if distance < best_distance:
+                        best, best_distance = position, distance
+
+        if best < 0:
+            raise ValueError(f'Line "{line}" has no samples with an '
+                             f'offset.')
+
+        return int(self._rows[best])
+
+    def query(self, line: t.Optional[str] = None,
+              low: t.Optional[float] = None, high: t.Optional[float] = None,
+              classes: t.Optional[t.Collection[str]] = None) -> np.ndarray:
+        """
+        Returns the rows of the store of the samples on a line, given by
+        name or id, or on all lines if None, with low <= offset <= high and
+        a detection of one of the classes, in order of track position.
+        Raises a ValueError if there is no such line.
+        """
+        codes = None if line is None else self._codes(line)
+        return self.query_codes(codes, low, high, classes)
+
+    def query_codes(self, codes: t.Optional[t.Sequence[int]],
+                    low: t.Optional[float] = None,
+                    high: t.Optional[float] = None,
+                    classes: t.Optional[t.Collection[str]] = None,
+                    low_side: str = 'left', high_side: str = 'right') \
+            -> np.ndarray:
+        """
+        As query, on the lines of the given codes. The sides are those of
+        np.searchsorted, i.e. 'right' excludes low and 'left' excludes
+        high.
+        """
+        if codes is None:
+            codes = range(len(self._line_names))
+
+        slices = list()
+        for start, stop in self._bounds(codes):
+            if low is not None:
+                start += int(np.searchsorted(self._offsets[start:stop], low,
+                                             side=low_side))
+            if high is not None:
+                stop = start + int(np.searchsorted(self._offsets[start:stop],
+                                                   high, side=high_side))
+            if stop > start:
+                slices.append(slice(start, stop))
+
+        if len(slices) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        class_mask = None
+        if classes:
+            class_mask = np.logical_or.reduce(
+                [self._class_mask(o) for o in classes])
+
+        rows = list()
+        for positions in slices:
+            if class_mask is None:
+                rows.append(self._rows[positions])
+            else:
+                rows.append(self._rows[positions][class_mask[positions]])
+
+        return np.concatenate(rows)
+
+    def _codes(self, line: str) -> t.List[int]:
+        codes = self.line_codes(line)
+        if len(codes) == 0:
+            raise ValueError(f'Unknown line "{line}".')
+        return codes
+
+    def _bounds(self, codes: t.Iterable[int]) \
+            -> t.Iterator[t.Tuple[int, int]]:
+        """ Yields the positions of the samples of every line with offsets. """
+        for code in codes:
+            start = int(np.searchsorted(self._lines, code, side='left'))
+            stop = int(np.searchsorted(self._lines, code, side='right'))
+            # missing offsets sort after infinity
+            stop = start + int(np.searchsorted(self._offsets[start:stop],
+                                               np.inf, side='right'))
+            yield start, stop
+
+    def _class_mask(self, cls: str) -> np.ndarray:
+        code = int(np.searchsorted(self._class_names, cls))
+        if code < len(self._class_names) and self._class_names[code] == cls:
+            return self._has_class[:, code]
+        return np.zeros(len(self._rows), dtype=bool)
+
+
+class SampleFilter:
+    """ A parsed filter expression, see the module documentation. """
+    def __init__(self, text: str):
+        self.text = text
+        self._terms = _parse(text)
+
+    def mask(self, columns: StoreColumns) -> np.ndarray:
+        """ Returns a boolean mask of the samples matching the filter. """
+        store = columns.store
+        rows = self._indexed_rows(columns)
+        if rows is not None:
+            mask = np.zeros(len(store), dtype=bool)
+            mask[rows] = True
+            return mask
+
+        mask = np.ones(len(store), dtype=bool)
+        detection_mask = None
+
+        for field, op, value in self._terms:
+            if field == 'detections':
+                mask &= _compare_numbers(store.num_detections, op, value)
+            elif field in DETECTION_FIELDS:
+                term = _compare(columns, field, op, value)
+                detection_mask = term if detection_mask is None \
+                    else detection_mask & term
+            else:
+                mask &= _compare(columns, field, op, value)
+
+        if detection_mask is not None:
+            # whether any detection of a sample matches
+            offsets = store.offsets
+            counts = np.concatenate([[0], np.cumsum(detection_mask)])
+            mask &= counts[offsets[1:]] > counts[offsets[:-1]]
+
+        return mask
+
+    def _indexed_rows(self, columns: StoreColumns) \
+            -> t.Optional[np.ndarray]:
+        """
+        Returns the matching rows from the position index if the filter is
+        a line name, offset bounds and at most one class, or None.
+        """
+        lines = [o for o in self._terms if o[0] == 'line_name']
+        bounds = [o for o in self._terms if o[0] == 'line_offset']
+        classes = [o for o in self._terms if o[0] == 'cls']
+        if len(lines) != 1 or len(classes) > 1 \
+                or len(lines) + len(bounds) + len(classes) != len(self._terms):
+            return None
+
+        _, op, line = lines[0]
+        if op not in ('==', '='):
+            return None
+        # names that are numbers are compared numerically
+        if _to_number(line) is not None \
+                and columns.numeric('line_name') is not None:
+            return None
+        if any(o[1] not in _LOWER_SIDES and o[1] not in _UPPER_SIDES
+               or _to_number(o[2]) is None for o in bounds):
+            return None
+        if len(classes) > 0 and classes[0][1] not in ('==', '='):
+            return None
+
+        index = columns.positions()
+        if index is None:
+            return None
+
+        # the tightest bounds
+        low = high = None
+        low_side, high_side = 'left', 'right'
+        for _, op, value in bounds:
+            number = _to_number(value)
+            if op in _LOWER_SIDES and (
+                    low is None or number > low
+                    or number == low and _LOWER_SIDES[op] == 'right'):
+                low, low_side = number, _LOWER_SIDES[op]
+            if op in _UPPER_SIDES and (
+                    high is None or number < high
+                    or number == high and _UPPER_SIDES[op] == 'left'):
+                high, high_side = number, _UPPER_SIDES[op]
+
+        return index.query_codes(index.line_codes(line, by_id=False), low,
+                                 high, [o[2] for o in classes], low_side,
+                                 high_side)
+
+
+def _parse(text: str) -> t.List[t.Tuple[str, str, str]]:
+    tokens = list()
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f'Invalid filter at "{text[position:]}".')
+        position = match.end()
+
+        if match.group('op') is not None:
+            tokens.append(('op', match.group('op')))
+        elif match.group('word') is not None:
+            tokens.append(('word', match.group('word')))
+        else:
+            quoted = match.group('dquote')
+            if quoted is None:
+                quoted = match.group('squote')
+            tokens.append(('value', quoted))
+
+    terms = list()
+    i = 0
+    while i < len(tokens):
+        kind, field = tokens[i]
+        if kind != 'word' or field.lower() not in FIELDS:
+            raise ValueError(f'Unknown field "{field}", expected one of '
+                             f'{", ".join(sorted(set(FIELDS)))}.')
+        if i + 1 >= len(tokens) or tokens[i + 1][0] != 'op':
+            raise ValueError(f'Expected an operator after "{field}".')
+        op = tokens[i + 1][1]
+
+        # the value extends up to the next "and"
+        j = i + 2
+        while j < len(tokens) and not (tokens[j][0] == 'word'
+                                       and tokens[j][1].lower() == 'and'):
+            if tokens[j][0] == 'op':
+                raise ValueError(f'Unexpected operator "{tokens[j][1]}".')
+            j += 1
+        if j == i + 2:
+            raise ValueError(f'Expected a value after "{field} {op}".')
+
+        value = ' '.join(o[1] for o in tokens[i + 2:j])
+        terms.append((FIELDS[field.lower()], op, value))
+
+        i = j + 1
+        if j < len(tokens) and i >= len(tokens):
+            raise ValueError('Expected a comparison after "and".')
+
+    return terms
+
+
+def _to_number(value: str) -> t.Optional[float]:
+    # float accepts underscores between digits, as in timestamps
+    if '_' in value:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _compare_numbers(values: np.ndarray, op: str, value: str) -> np.ndarray:
+    number = _to_number(value)
+    if number is None or op == CONTAINS:
+        raise ValueError(f'Expected a number instead of "{value}".')
+
+    return OPERATORS[op](values, number)
+
+
+def _compare(columns: StoreColumns, attr: str, op: str, value: str) \
+        -> np.ndarray:
+    """
+    Compares numerically if both the column and the value are numbers, and
+    by the string representation of the values otherwise. String
+    comparisons are evaluated on the sorted unique values of the column, by
+    binary search where possible.
+    """
+    if op != CONTAINS:
+        if _to_number(value) is not None:
+            numeric = columns.numeric(attr)
+            if numeric is not None:
+                return _compare_numbers(numeric, op, value)
+        elif columns.column(attr).dtype.kind in 'iufb':
+            raise ValueError(f'Expected a number instead of "{value}".')
+
+    codes, strings = columns.strings(attr)
+    if op == CONTAINS:
+        value = value.lower()
+        matches = np.array([value in o.lower() for o in strings.tolist()],
+                           dtype=bool)
+        # missing values, with code -1, never match
+        return np.append(matches, False)[codes]
+
+    left = np.searchsorted(strings, value, side='left')
+    right = np.searchsorted(strings, value, side='right')
+    present = codes >= 0
+
+    if op in ('==', '='):
+        return (codes >= left) & (codes < right)
+    elif op == '!=':
+        return present & ((codes < left) | (codes >= right))
+    elif op == '<':
+        return present & (codes < left)
+    elif op == '<=':
+        return present & (codes < right)
+    elif op == '>':
+        return codes >= right
+    else:
+        return codes >= left
@@ -0,0 +1,110 @@
+"""
+Selection of the frames with detections passing a filter, and their
+processing in batches by a pool of worker processes, as shared by the
+headless exports, see `render` and `crops`.
+"""
+import logging
+import multiprocessing
+import typing as t
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .data import Reader, SampleStore
+
+log = logging.getLogger(__name__)
+
+# frames sent to a worker at once
+BATCH_SIZE = 16
+
+# a frame: image path, the values of the requested sample attributes and
+# the arrays of the requested detection attributes of its passing detections
+Frame = t.Tuple[str, t.List[t.Any], t.Tuple[np.ndarray, ...]]
+T = t.TypeVar('T')
+R = t.TypeVar('R')
+
+
+def detection_mask(samples: SampleStore,
+                   classes: t.Optional[t.Collection[str]] = None,
+                   min_score: t.Optional[float] = None) -> np.ndarray:
+    """ Boolean mask of the detections passing the filter. """
+    mask = np.ones(len(samples.detection_column('score')), dtype=bool)
+    if classes:
+        mask &= np.isin(samples.detection_column('cls').astype(str),
+                        list(classes))
+    if min_score is not None:
+        mask &= samples.detection_column('score') >= min_score
+
+    return mask
+
+
+def iter_frames(reader: Reader,
+                classes: t.Optional[t.Collection[str]] = None,
+                min_score: t.Optional[float] = None,
+                detection_attrs: t.Sequence[str] = ('boxes', 'cls', 'score'),
+                sample_attrs: t.Sequence[str] = ()) -> t.Iterator[Frame]:
+    """
+    Yields the frames with detections passing the filter, with only those
+    detections, one CSV file at a time.
+    """
+    for samples in reader.iter_samples():
+        mask = detection_mask(samples, classes, min_score)
+        columns = [samples.detection_column(attr) for attr in detection_attrs]
+        offsets = samples.offsets
+
+        # frames with at least one passing detection
+        passing = np.concatenate([[0], np.cumsum(mask)])
+        rows = np.flatnonzero(passing[offsets[1:]] > passing[offsets[:-1]])
+        for row in rows.tolist():
+            detections = np.flatnonzero(mask[offsets[row]:offsets[row + 1]]) \
+                + offsets[row]
+            yield (samples.value(row, 'filepath'),
+                   [samples.value(row, attr) for attr in sample_attrs],
+                   tuple(o[detections] for o in columns))
+
+
+def batched(items: t.Iterable[T], size: int = BATCH_SIZE) \
+        -> t.Iterator[t.List[T]]:
+    batch = list()
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = list()
+    if batch:
+        yield batch
+
+
+def map_batches(function: t.Callable[[t.List[T]], R],
+                batches: t.Iterable[t.List[T]], workers: int,
+                initializer: t.Callable[..., None],
+                initargs: tuple = ()) -> t.Iterator[R]:
+    """
+    Yields the results of a function of every batch, in order. With more
+    than one worker the batches are processed in a pool of worker processes,
+    every one set up by the initializer, otherwise in this process after
+    calling the initializer.
+    """
+    if workers <= 1:
+        initializer(*initargs)
+        for batch in batches:
+            yield function(batch)
+        return
+
+    executor = ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=initializer, initargs=initargs)
+    # keep a bounded number of batches in flight
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(function, batch))
+            while len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
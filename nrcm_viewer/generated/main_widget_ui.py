@@ -15,8 +15,20 @@ class Ui_MainWidget(object):
     def setupUi(self, MainWidget):
         MainWidget.setObjectName("MainWidget")
         MainWidget.resize(800, 640)
-        self.horizontalLayout = QtWidgets.QHBoxLayout(MainWidget)
+        self.verticalLayout = QtWidgets.QVBoxLayout(MainWidget)
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
         self.horizontalLayout.setObjectName("horizontalLayout")
+        self.tableLayout = QtWidgets.QVBoxLayout()
+        self.tableLayout.setObjectName("tableLayout")
+        self.filterEdit = QtWidgets.QLineEdit(MainWidget)
+        self.filterEdit.setClearButtonEnabled(True)
+        self.filterEdit.setObjectName("filterEdit")
+        self.tableLayout.addWidget(self.filterEdit)
+        self.gotoEdit = QtWidgets.QLineEdit(MainWidget)
+        self.gotoEdit.setClearButtonEnabled(True)
+        self.gotoEdit.setObjectName("gotoEdit")
+        self.tableLayout.addWidget(self.gotoEdit)
         self.table = QtWidgets.QTableView(MainWidget)
         self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.table.setAlternatingRowColors(False)
@@ -24,10 +36,31 @@ class Ui_MainWidget(object):
         self.table.setObjectName("table")
         self.table.horizontalHeader().setSortIndicatorShown(True)
         self.table.horizontalHeader().setStretchLastSection(True)
-        self.horizontalLayout.addWidget(self.table)
+        self.tableLayout.addWidget(self.table)
+        self.horizontalLayout.addLayout(self.tableLayout)
+        self.gallery = GalleryView(MainWidget)
+        self.gallery.setObjectName("gallery")
+        self.horizontalLayout.addWidget(self.gallery)
         self.widget = PlotWidget(MainWidget)
         self.widget.setObjectName("widget")
         self.horizontalLayout.addWidget(self.widget)
+        self.verticalLayout.addLayout(self.horizontalLayout)
+        self.loadingWidget = QtWidgets.QWidget(MainWidget)
+        self.loadingWidget.setObjectName("loadingWidget")
+        self.loadingLayout = QtWidgets.QHBoxLayout(self.loadingWidget)
+        self.loadingLayout.setContentsMargins(0, 0, 0, 0)
+        self.loadingLayout.setObjectName("loadingLayout")
+        self.loadingLabel = QtWidgets.QLabel(self.loadingWidget)
+        self.loadingLabel.setObjectName("loadingLabel")
+        self.loadingLayout.addWidget(self.loadingLabel)
+        self.loadingProgress = QtWidgets.QProgressBar(self.loadingWidget)
+        self.loadingProgress.setProperty("value", 0)
+        self.loadingProgress.setObjectName("loadingProgress")
+        self.loadingLayout.addWidget(self.loadingProgress)
+        self.cancelButton = QtWidgets.QPushButton(self.loadingWidget)
+        self.cancelButton.setObjectName("cancelButton")
+        self.loadingLayout.addWidget(self.cancelButton)
+        self.verticalLayout.addWidget(self.loadingWidget)
 
         self.retranslateUi(MainWidget)
         QtCore.QMetaObject.connectSlotsByName(MainWidget)
@@ -35,4 +68,9 @@ class Ui_MainWidget(object):
     def retranslateUi(self, MainWidget):
         _translate = QtCore.QCoreApplication.translate
         MainWidget.setWindowTitle(_translate("MainWidget", "Inference Output"))
+        self.filterEdit.setPlaceholderText(_translate("MainWidget", "Filter, e.g. class == crack and score > 0.5"))
+        self.gotoEdit.setPlaceholderText(_translate("MainWidget", "Go to line and offset, e.g. Line 0, 12.5"))
+        self.loadingLabel.setText(_translate("MainWidget", "Loading..."))
+        self.cancelButton.setText(_translate("MainWidget", "Cancel"))
+from nrcm_viewer.ui.gallery_widget import GalleryView
 from nrcm_viewer.ui.plot_widget import PlotWidget
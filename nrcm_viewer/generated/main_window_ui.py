@@ -38,8 +38,21 @@ class Ui_MainWindow(object):
         self.actionLoad_zip.setObjectName("actionLoad_zip")
         self.actionLoad_Workspace = QtWidgets.QAction(MainWindow)
         self.actionLoad_Workspace.setObjectName("actionLoad_Workspace")
+        self.actionOpen_Session = QtWidgets.QAction(MainWindow)
+        self.actionOpen_Session.setObjectName("actionOpen_Session")
+        self.actionExport = QtWidgets.QAction(MainWindow)
+        self.actionExport.setEnabled(False)
+        self.actionExport.setObjectName("actionExport")
+        self.actionWatch_Workspace = QtWidgets.QAction(MainWindow)
+        self.actionWatch_Workspace.setCheckable(True)
+        self.actionWatch_Workspace.setEnabled(False)
+        self.actionWatch_Workspace.setObjectName("actionWatch_Workspace")
         self.menu_Menu.addAction(self.actionLoad_zip)
         self.menu_Menu.addAction(self.actionLoad_Workspace)
+        self.menu_Menu.addAction(self.actionOpen_Session)
+        self.menu_Menu.addAction(self.actionExport)
+        self.menu_Menu.addSeparator()
+        self.menu_Menu.addAction(self.actionWatch_Workspace)
         self.menubar.addAction(self.menu_Menu.menuAction())
 
         self.retranslateUi(MainWindow)
@@ -51,3 +64,6 @@ class Ui_MainWindow(object):
         self.menu_Menu.setTitle(_translate("MainWindow", "&File"))
         self.actionLoad_zip.setText(_translate("MainWindow", "Load .zip"))
         self.actionLoad_Workspace.setText(_translate("MainWindow", "Load Workspace"))
+        self.actionOpen_Session.setText(_translate("MainWindow", "Open Session..."))
+        self.actionExport.setText(_translate("MainWindow", "Export Detections..."))
+        self.actionWatch_Workspace.setText(_translate("MainWindow", "Watch Workspace"))
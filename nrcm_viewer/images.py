@@ -0,0 +1,271 @@
+"""
+Decoding of the images referenced by samples, backed by a shared in-memory
+cache of decoded images, and generation of their thumbnails.
+"""
+import logging
+import threading
+import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .cache import ImageCache, ThumbnailCache
+from .data import Reader
+
+log = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_CACHE_MB = 512
+
+image_cache = ImageCache(DEFAULT_IMAGE_CACHE_MB * 2 ** 20)
+
+
+def decode_image(reader: Reader, filepath: str) -> np.ndarray:
+    with reader.open(filepath) as f:
+        return np.asarray(Image.open(f))
+
+
+class ImagePyramid:
+    """
+    Level of detail pyramid of an image. Level k is the image downsampled by
+    a factor 2 ** k along both axes, every pixel the mean of a 2 x 2 block
+    of the previous level, so that thin structures do not alias away.
+    Levels are created on first use.
+    """
+    def __init__(self, image: np.ndarray, min_size: int = 256):
+        self.image = image
+        self._levels = [image]
+
+        size = max(image.shape[:2])
+        self.num_levels = 1 + max(0, int(np.floor(np.log2(
+            max(size, 1) / min_size))))
+
+    @property
+    def shape(self) -> t.Tuple[int, ...]:
+        return self.image.shape
+
+    def level(self, k: int) -> np.ndarray:
+        while len(self._levels) <= k:
+            self._levels.append(_halve(self._levels[-1]))
+
+        return self._levels[k]
+
+    def level_for_pixel_size(self, pixel_size: float) -> int:
+        """
+        Returns the coarsest level that still has at least one image pixel
+        per screen pixel, given the number of image pixels per screen
+        pixel.
+        """
+        if not np.isfinite(pixel_size) or pixel_size <= 1:
+            return 0
+
+        return min(int(np.floor(np.log2(pixel_size))), self.num_levels - 1)
+
+    def value_range(self) -> t.Tuple[float, float]:
+        """
+        Estimates the range of values from a subsample of the size of the
+        coarsest level, without creating the levels.
+        """
+        step = 2 ** (self.num_levels - 1)
+        coarse = self.image[::step, ::step]
+        if coarse.size == 0:
+            return 0., 1.
+
+        return float(coarse.min()), float(coarse.max())
+
+
+def _halve(image: np.ndarray) -> np.ndarray:
+    """
+    Downsamples an image by 2 along both axes by averaging 2 x 2 blocks. An
+    odd last row or column is averaged with itself.
+    """
+    if image.dtype == np.uint8 and (image.ndim == 2 or
+                                    image.shape[2] == 3):
+        # about twice as fast for 8 bit images
+        return np.asarray(Image.fromarray(image).reduce(2))
+
+    if image.shape[0] % 2:
+        image = np.concatenate([image, image[-1:]], axis=0)
+    if image.shape[1] % 2:
+        image = np.concatenate([image, image[:, -1:]], axis=1)
+
+    # summed as strided views, which is much faster than a mean over the
+    # axes of the reshaped blocks
+    if np.issubdtype(image.dtype, np.integer) and image.itemsize <= 2:
+        total = image[0::2, 0::2].astype(np.int32)
+    else:
+        total = image[0::2, 0::2].astype(np.float64)
+    total += image[1::2, 0::2]
+    total += image[0::2, 1::2]
+    total += image[1::2, 1::2]
+
+    if total.dtype == np.int32:
+        # rounded half up
+        return ((total + 2) // 4).astype(image.dtype)
+    if np.issubdtype(image.dtype, np.integer):
+        return np.rint(total / 4).astype(image.dtype)
+
+    return (total / 4).astype(image.dtype)
+
+
+def load_image(reader: Reader, filepath: str,
+               cache: ImageCache = image_cache,
+               prefetcher: t.Optional['ImagePrefetcher'] = None) \
+        -> np.ndarray:
+    """
+    Returns the decoded image from the cache, decoding and caching it on a
+    miss. The cache is keyed by the source of the reader and the file path.
+
+    If the prefetcher is already decoding the image, that decode is waited
+    for instead.
+    """
+    key = (reader.source, filepath)
+
+    image = cache.get(key)
+    if image is None and prefetcher is not None:
+        prefetcher.wait(key)
+        image = cache.get(key)
+    if image is None:
+        image = decode_image(reader, filepath)
+        cache.put(key, image)
+
+    return image
+
+
+def to_uint8(image: np.ndarray) -> np.ndarray:
+    """ Scales images of other integer or float types to 8 bits. """
+    if image.dtype == np.uint8:
+        return image
+
+    image = image.astype(np.float32)
+    low, high = image.min(initial=0.), image.max(initial=0.)
+    if high > low:
+        image = (image - low) * (255. / (high - low))
+
+    return image.astype(np.uint8)
+
+
+def make_thumbnail(image: t.Union[np.ndarray, Image.Image], size: int) \
+        -> np.ndarray:
+    """ Downscales an image to fit into a square of the given size. """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(to_uint8(image))
+    elif image.mode not in ('L', 'RGB', 'RGBA'):
+        image = Image.fromarray(to_uint8(np.asarray(image)))
+
+    # reduces by an integer factor first, which is much faster than
+    # resampling the full image
+    image.thumbnail((size, size), reducing_gap=2.)
+    return np.asarray(image)
+
+
+def load_thumbnail(reader: Reader, filepath: str, cache: ThumbnailCache,
+                   images: ImageCache = image_cache) \
+        -> t.Tuple[np.ndarray, t.Tuple[int, int]]:
+    """
+    Returns the thumbnail of an image and the (height, width) of the image,
+    from the thumbnail cache if possible. Otherwise the thumbnail is made
+    from the decoded image, if it is in the image cache, or by decoding the
+    image, and then cached.
+    """
+    cached = cache.load(reader.source, filepath)
+    if cached is not None:
+        return cached
+
+    image = images.get((reader.source, filepath))
+    if image is not None:
+        shape = image.shape[:2]
+        thumbnail = make_thumbnail(image, cache.size)
+    else:
+        with reader.open(filepath) as f, Image.open(f) as img:
+            shape = (img.height, img.width)
+            thumbnail = make_thumbnail(img, cache.size)
+
+    cache.save(reader.source, filepath, thumbnail, shape)
+    return thumbnail, shape
+
+
+class ImagePrefetcher:
+    """
+    Decodes images into the image cache on background threads, ahead of
+    them being shown.
+
+    Every call to prefetch replaces the set of wanted images. Pending
+    decodes of images that are no longer wanted are cancelled, decodes that
+    have already started run to completion.
+    """
+    def __init__(self, cache: ImageCache = image_cache, workers: int = 2):
+        self._cache = cache
+        self._executor = ThreadPoolExecutor(workers,
+                                            thread_name_prefix='prefetch')
+        self._pending: t.Dict[t.Tuple[str, str], Future] = dict()
+        # reentrant, as done callbacks run immediately for finished futures
+        self._lock = threading.RLock()
+
+    def prefetch(self, reader: Reader, filepaths: t.Sequence[str]):
+        """ Prefetches the images in order of priority. """
+        self.prefetch_images([(reader, o) for o in filepaths])
+
+    def prefetch_images(self, images: t.Sequence[t.Tuple[Reader, str]]):
+        """
+        Prefetches the images, given by reader and file path, in order of
+        priority.
+        """
+        keys = [(reader.source, filepath) for reader, filepath in images]
+
+        with self._lock:
+            wanted = set(keys)
+            # cancelling runs the done callback, which removes the future
+            for key in list(self._pending):
+                if key not in wanted:
+                    self._pending[key].cancel()
+
+            for (reader, _), key in zip(images, keys):
+                if key in self._pending or key in self._cache:
+                    continue
+
+                future = self._executor.submit(self._load, reader, key)
+                self._pending[key] = future
+                future.add_done_callback(
+                    lambda _, key_=key: self._done(key_))
+
+    def wait(self, key: t.Tuple[str, str]):
+        """
+        Waits for the prefetch of an image that is being decoded, and
+        cancels it if it has not started yet, as the image is then better
+        decoded by the caller right away.
+        """
+        with self._lock:
+            future = self._pending.get(key)
+
+        if future is not None and not future.cancel():
+            # waits without raising, an image that could not be prefetched
+            # is decoded again by the caller
+            future.exception()
+
+    def shutdown(self, wait: bool = False):
+        """
+        Cancels the pending prefetches, and waits for the running ones if
+        wait is set.
+        """
+        with self._lock:
+            for future in list(self._pending.values()):
+                future.cancel()
+            self._pending.clear()
+
+        self._executor.shutdown(wait=wait)
+
+    def _load(self, reader: Reader, key: t.Tuple[str, str]):
+        if key in self._cache:
+            return
+
+        try:
+            self._cache.put(key, decode_image(reader, key[1]))
+        except OSError as e:
+            log.debug(f'Could not prefetch {key[1]}: {e}')
+
+    def _done(self, key: t.Tuple[str, str]):
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None and future.done():
+                del self._pending[key]
@@ -0,0 +1,206 @@
+"""
+Lightweight timing spans of the hot paths, e.g. indexing, CSV parsing and
+showing a frame.
+
+    with span('read_csv', 'load'):
+        ...
+
+Spans are only recorded once profiling has been enabled with `enable`;
+until then `span` returns a shared no-op context manager. Recorded spans
+can be written as a Chrome trace (chrome://tracing or Perfetto) with
+`write_trace`.
+
+Spans with a stage, 'load' or 'frame', are also summed up per run of the
+stage. A span named like its stage starts a new run on its thread, to which
+the later spans of the stage on that thread are added, so that concurrent
+loads are timed separately. Spans on other threads are added to the last run
+of the stage. Listeners are called with the stage and the timings of the run
+whenever a span of the stage ends. Spans in worker processes are not
+recorded.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+from functools import wraps
+
+log = logging.getLogger(__name__)
+
+Listener = t.Callable[[str, t.Dict[str, float]], None]
+
+_enabled = False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'stage', 'args', 'start')
+
+    def __init__(self, name: str, stage: t.Optional[str],
+                 args: t.Dict[str, t.Any]):
+        self.name = name
+        self.stage = stage
+        self.args = args
+        self.start = 0.
+
+    def __enter__(self):
+        if self.stage == self.name:
+            _recorder.begin_stage(self.stage)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        _recorder.add(self, time.perf_counter() - self.start)
+        return False
+
+
+class _Recorder:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: t.List[t.Tuple[str, t.Optional[str], float, float, int,
+                                    t.Dict[str, t.Any]]] = list()
+        # timings of the last run of every stage, and of the runs started
+        # on every thread
+        self.stages: t.Dict[str, t.Dict[str, float]] = dict()
+        self.listeners: t.List[Listener] = list()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def begin_stage(self, stage: str):
+        timings = OrderedDict()
+        if not hasattr(self._local, 'runs'):
+            self._local.runs = dict()
+        self._local.runs[stage] = timings
+
+        with self._lock:
+            self.stages[stage] = timings
+
+    def add(self, span: _Span, duration: float):
+        with self._lock:
+            self.events.append((span.name, span.stage, span.start, duration,
+                                threading.get_ident(), span.args))
+            if span.stage is None:
+                return
+
+            timings = getattr(self._local, 'runs', dict()).get(span.stage)
+            if timings is None:
+                timings = self.stages.setdefault(span.stage, OrderedDict())
+            timings[span.name] = timings.get(span.name, 0.) + duration
+            timings = timings.copy()
+
+        for listener in list(self.listeners):
+            listener(span.stage, timings)
+
+
+_recorder = _Recorder()
+
+
+def enable():
+    """ Starts recording spans, discarding the ones recorded before. """
+    global _enabled, _recorder
+
+    listeners = _recorder.listeners
+    _recorder = _Recorder()
+    _recorder.listeners = listeners
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, stage: t.Optional[str] = None, **args):
+    """
+    Returns a context manager timing its body as a span, or a no-op one if
+    profiling is disabled. Keyword arguments are added to the trace event.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+
+    return _Span(name, stage, args)
+
+
+def timed(name: t.Optional[str] = None, stage: t.Optional[str] = None):
+    """ Decorator recording every call of a function as a span. """
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            with _Span(span_name, stage, dict()):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_listener(listener: Listener):
+    """
+    Calls the listener with the stage and its timings, by span name, when a
+    span of the stage ends. Listeners are called from the thread of the
+    span.
+    """
+    _recorder.listeners.append(listener)
+
+
+def remove_listener(listener: Listener):
+    if listener in _recorder.listeners:
+        _recorder.listeners.remove(listener)
+
+
+def stage_timings(stage: str) -> t.Dict[str, float]:
+    """ Timings of the last run of a stage started, by span name. """
+    with _recorder._lock:
+        return dict(_recorder.stages.get(stage, dict()))
+
+
+def format_timings(timings: t.Dict[str, float]) -> str:
+    return ', '.join(f'{name} {duration * 1000:.0f} ms'
+                     for name, duration in timings.items())
+
+
+def write_trace(file_path: str):
+    """ Writes the recorded spans in the Chrome trace event format. """
+    with _recorder._lock:
+        events = list(_recorder.events)
+        origin = _recorder.origin
+
+    pid = os.getpid()
+    trace = [{
+        'name': name,
+        'cat': stage or 'span',
+        'ph': 'X',
+        'ts': (start - origin) * 1e6,
+        'dur': duration * 1e6,
+        'pid': pid,
+        'tid': tid,
+        'args': args,
+    } for name, stage, start, duration, tid, args in events]
+
+    with open(file_path, 'w') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+    log.info(f'Wrote {len(trace)} spans to {file_path}.')
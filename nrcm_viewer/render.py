@@ -0,0 +1,213 @@
+"""
+Headless rendering of frames with their detection boxes and `cls: score`
+labels burned in, as shown by the plot widget, without Qt.
+
+    python -m nrcm_viewer.render archive.zip out/
+    python -m nrcm_viewer.render workspace/ out/ --classes crack squat \\
+        --min-score 0.5 --format jpg -j 16
+
+Frames with at least one detection passing the filter are rendered, with
+only the passing detections drawn. Decoding, drawing and encoding happen in
+a pool of worker processes, every one with its own handle to the archive
+or workspace, so throughput scales with the number of cores. The outputs
+mirror the directories of the source, with `_original.png` replaced by
+`_annotated.<format>`.
+"""
+import logging
+import os
+import typing as t
+from argparse import ArgumentParser
+from functools import partial
+from os import path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .data import IMG_APPENDIX, Reader, open_reader
+from .frames import Frame, batched, iter_frames, map_batches
+from .images import decode_image, to_uint8
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('png', 'jpg')
+BOX_COLOR = (255, 0, 0)
+# as the pen of the boxes in the plot widget
+LINE_WIDTH = 4
+FONT_SIZE = 24
+
+
+def to_rgb(image: np.ndarray) -> np.ndarray:
+    """ Converts a decoded image to a writable 8 bit RGB array. """
+    image = to_uint8(image)
+    if image.ndim == 2:
+        return np.repeat(image[:, :, None], 3, axis=2)
+    return np.array(image[:, :, :3])
+
+
+def draw_boxes(image: np.ndarray, boxes: np.ndarray,
+               color: t.Tuple[int, int, int] = BOX_COLOR,
+               width: int = LINE_WIDTH):
+    """
+    Draws the outlines of the boxes (x0, x1, y0, y1) into an RGB image in
+    place, as bands of the given width inside the boxes, clipped to the
+    image.
+    """
+    height, image_width = image.shape[:2]
+    for x0, x1, y0, y1 in np.asarray(boxes, dtype=np.int64).tolist():
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        if x1 < 0 or y1 < 0 or x0 >= image_width or y0 >= height:
+            continue
+
+        left, right = max(x0, 0), min(x1 + 1, image_width)
+        top, bottom = max(y0, 0), min(y1 + 1, height)
+        # the bands are clipped by the slicing
+        image[top:bottom, max(x0, 0):max(x0 + width, 0)] = color
+        image[top:bottom, max(x1 + 1 - width, 0):right] = color
+        image[max(y0, 0):max(y0 + width, 0), left:right] = color
+        image[max(y1 + 1 - width, 0):bottom, left:right] = color
+
+
+def load_font(size: int = FONT_SIZE) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # older Pillow only has the small bitmap font
+        return ImageFont.load_default()
+
+
+def draw_labels(img: Image.Image, boxes: np.ndarray, labels: t.Sequence[str],
+                font: ImageFont.ImageFont,
+                color: t.Tuple[int, int, int] = BOX_COLOR):
+    """ Writes the labels above the top left corner of the boxes. """
+    draw = ImageDraw.Draw(img)
+    for (x0, _, y0, _), label in zip(np.asarray(boxes).tolist(), labels):
+        _, top, _, bottom = draw.textbbox((0, 0), label, font=font)
+        position = (max(x0, 0), max(y0 - (bottom - top) - 4, 0))
+        draw.text(position, label, fill=color, font=font, stroke_width=1,
+                  stroke_fill=(0, 0, 0))
+
+
+def render_frame(image: np.ndarray, boxes: np.ndarray, classes: np.ndarray,
+                 scores: np.ndarray, font: ImageFont.ImageFont,
+                 line_width: int = LINE_WIDTH) -> Image.Image:
+    """ Returns the image with the boxes and their labels drawn. """
+    rgb = to_rgb(image)
+    draw_boxes(rgb, boxes, width=line_width)
+
+    img = Image.fromarray(rgb)
+    draw_labels(img, boxes, [f'{c}: {s:.3f}' for c, s in zip(classes, scores)],
+                font)
+    return img
+
+
+def output_path(out_dir: str, filepath: str, fmt: str, source: str) -> str:
+    # images of workspaces have absolute paths
+    if path.isabs(filepath):
+        filepath = path.relpath(filepath, source)
+
+    if filepath.endswith(IMG_APPENDIX):
+        filepath = filepath[:-len(IMG_APPENDIX)]
+    else:
+        filepath = path.splitext(filepath)[0]
+
+    return path.join(out_dir, filepath + f'_annotated.{fmt}')
+
+
+# reader and font of a rendering worker process, set by the initializer
+_worker_reader: t.Optional[Reader] = None
+_worker_font: t.Optional[ImageFont.ImageFont] = None
+
+
+def _init_worker(source: str, font_size: int):
+    global _worker_reader, _worker_font
+    _worker_reader = open_reader(source, use_cache=False)
+    _worker_font = load_font(font_size)
+
+
+def _render_batch(frames: t.List[Frame], out_dir: str, fmt: str,
+                  line_width: int) -> int:
+    rendered = 0
+    # boxes (x0, x1, y0, y1), classes and scores
+    for filepath, _, (boxes, classes, scores) in frames:
+        try:
+            image = decode_image(_worker_reader, filepath)
+        except (OSError, KeyError) as e:
+            log.error(f'Error in loading image from {filepath}: {e}')
+            continue
+
+        img = render_frame(image, boxes, classes, scores, _worker_font,
+                           line_width)
+        file_path = output_path(out_dir, filepath, fmt,
+                                _worker_reader.source)
+        os.makedirs(path.dirname(file_path), exist_ok=True)
+        if fmt == 'jpg':
+            img.save(file_path, quality=90)
+        else:
+            img.save(file_path)
+        rendered += 1
+
+    return rendered
+
+
+def render(source: str, out_dir: str,
+           classes: t.Optional[t.Collection[str]] = None,
+           min_score: t.Optional[float] = None, fmt: str = 'png',
+           workers: int = 1, line_width: int = LINE_WIDTH,
+           font_size: int = FONT_SIZE,
+           progress: t.Optional[t.Callable[[int], None]] = None) -> int:
+    """
+    Renders the frames of a source with detections passing the filter to
+    out_dir, and returns the number of frames rendered. Progress is called
+    with the number of frames rendered so far.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format "{fmt}", expected one of '
+                         f'{", ".join(FORMATS)}.')
+
+    reader = open_reader(source, use_cache=False)
+    batches = batched(iter_frames(reader, classes, min_score))
+
+    rendered = 0
+    for batch_rendered in map_batches(
+            partial(_render_batch, out_dir=out_dir, fmt=fmt,
+                    line_width=line_width),
+            batches, workers, _init_worker, (source, font_size)):
+        rendered += batch_rendered
+        if progress is not None:
+            progress(rendered)
+
+    return rendered
+
+
+def main():
+    parser = ArgumentParser(description='Renders frames with their '
+                                        'detections burned in.')
+    parser.add_argument('source', help='Archive (*.zip) or workspace.')
+    parser.add_argument('out_dir', help='Output directory.')
+    parser.add_argument('--classes', nargs='+',
+                        help='Only draw detections of these classes.')
+    parser.add_argument('--min-score', type=float,
+                        help='Only draw detections with at least this '
+                             'score.')
+    parser.add_argument('--format', choices=FORMATS, default='png')
+    parser.add_argument('-j', '--workers', type=int,
+                        default=os.cpu_count() or 1,
+                        help='Number of worker processes.')
+    parser.add_argument('--line-width', type=int, default=LINE_WIDTH)
+    parser.add_argument('--font-size', type=int, default=FONT_SIZE)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - [%(levelname)s] - %(name)s - %(message)s')
+
+    rendered = render(args.source, args.out_dir, args.classes,
+                      args.min_score, args.format, args.workers,
+                      args.line_width, args.font_size)
+    print(f'Rendered {rendered} frames to {args.out_dir}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Merging of the samples of several archives or workspaces into one sequence,
+e.g. ordered by timestamp or track position, without concatenating the
+stores.
+
+The rows of every store are sorted on their own, with the cached sort keys
+or the position index of its StoreColumns, and then merged lazily by a
+k-way merge. Rows are produced as (member, row of the member's store)
+pairs, in chunks, so only the rows that are consumed are ever materialized.
+"""
+import heapq
+import itertools
+import logging
+import typing as t
+
+import numpy as np
+import pandas as pd
+
+from .data import SampleStore
+from .filtering import StoreColumns
+
+log = logging.getLogger(__name__)
+
+# besides the sample attributes, e.g. timestamp
+POSITION = 'position'
+# rows of a store turned into merge keys at once
+KEY_CHUNK_SIZE = 4096
+
+
+def sorted_rows(columns: StoreColumns, order: str,
+                mask: t.Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Returns the rows of a store in the given order, a sample attribute or
+    the track position, only those in the mask if given. Raises a
+    ValueError if the order is by position and the offsets are not numbers.
+    """
+    if order == POSITION:
+        positions = columns.positions()
+        if positions is None:
+            raise ValueError('The offsets are not numbers.')
+        rows = positions.rows
+    elif order in SampleStore.SAMPLE_ATTRS:
+        rows = columns.order(order)
+    else:
+        raise ValueError(f'Unknown order "{order}", expected "{POSITION}" '
+                         f'or one of {", ".join(SampleStore.SAMPLE_ATTRS)}.')
+
+    if mask is not None:
+        rows = rows[mask[rows]]
+
+    return rows
+
+
+def _value_keys(columns: StoreColumns, attr: str, rows: np.ndarray) \
+        -> t.List[tuple]:
+    """
+    Keys of the values of an attribute, ordered as by StoreColumns.order,
+    which are comparable across stores: missing strings first, then
+    numbers, then strings.
+    """
+    numeric = columns.numeric(attr)
+    if numeric is not None:
+        # missing numbers sort last
+        values = np.nan_to_num(numeric[rows], nan=np.inf)
+        return [(0, o) for o in values.tolist()]
+
+    return [(-1, '') if pd.isna(o) else (1, str(o))
+            for o in columns.column(attr)[rows].tolist()]
+
+
+def _keys(columns: StoreColumns, rows: np.ndarray, order: str, member: int,
+          descending: bool) -> t.Iterator[tuple]:
+    """
+    Yields (key..., member, row) of the rows, computing the keys a chunk at
+    a time.
+    """
+    if descending:
+        rows = rows[::-1]
+
+    for start in range(0, len(rows), KEY_CHUNK_SIZE):
+        chunk = rows[start:start + KEY_CHUNK_SIZE]
+        members = itertools.repeat(member, len(chunk))
+        if order == POSITION:
+            # as in the position index, missing names sort first and
+            # missing offsets last
+            names = ['' if pd.isna(o) else str(o)
+                     for o in columns.column('line_name')[chunk].tolist()]
+            offsets = np.nan_to_num(columns.numeric('line_offset')[chunk],
+                                    nan=np.inf)
+            yield from zip(names, offsets.tolist(),
+                           _value_keys(columns, 'timestamp', chunk), members,
+                           chunk.tolist())
+        else:
+            yield from zip(_value_keys(columns, order, chunk), members,
+                           chunk.tolist())
+
+
+def merge(members: t.Sequence[StoreColumns], order: str = 'timestamp',
+          masks: t.Optional[t.Sequence[t.Optional[np.ndarray]]] = None,
+          descending: bool = False) -> t.Iterator[t.Tuple[int, int]]:
+    """
+    Returns an iterator lazily merging the rows of several stores into
+    (member, row) pairs in the given order, see `sorted_rows`. Only the
+    rows in the masks are included, if given. Ties are broken by member.
+    The stores are sorted right away, raising a ValueError if they cannot
+    be.
+    """
+    if masks is None:
+        masks = [None] * len(members)
+
+    iterables = [_keys(columns, sorted_rows(columns, order, mask), order, i,
+                       descending)
+                 for i, (columns, mask) in enumerate(zip(members, masks))]
+
+    return (key[-2:] for key in heapq.merge(*iterables, reverse=descending))
+
+
+def merge_chunks(merged: t.Iterator[t.Tuple[int, int]], chunk_size: int) \
+        -> t.Iterator[t.Tuple[np.ndarray, np.ndarray]]:
+    """ Groups merged rows into arrays of members and rows. """
+    while True:
+        chunk = list(itertools.islice(merged, chunk_size))
+        if len(chunk) == 0:
+            return
+
+        pairs = np.array(chunk, dtype=np.int64).reshape(-1, 2)
+        yield pairs[:, 0], pairs[:, 1]
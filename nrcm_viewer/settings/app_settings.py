@@ -4,6 +4,7 @@ QSettings class.
 """
 import typing as t
 import logging
+import os
 from os import path
 
 from PyQt5.QtCore import QSettings
@@ -75,5 +76,151 @@ class AppSettings:
 
         self.settings.setValue('current_directory', pth)
 
+    @property
+    def parse_workers(self) -> int:
+        """
+        Number of processes used to parse the CSV files of an archive or
+        workspace. Defaults to the number of available CPUs, at most 4.
+        """
+        if not self.is_init:
+            self.init()
+
+        return self.settings.value('parse_workers',
+                                   min(4, os.cpu_count() or 1), int)
+
+    @parse_workers.setter
+    def parse_workers(self, workers: int):
+        if not self.is_init:
+            self.init()
+
+        if workers < 1:
+            raise ValueError(f'Number of workers {workers} should be >= 1.')
+
+        self.settings.setValue('parse_workers', workers)
+
+    @property
+    def mmap_archives(self) -> bool:
+        """
+        Whether zip archives are memory-mapped, so that stored images are
+        read without copying them.
+        """
+        if not self.is_init:
+            self.init()
+
+        return self.settings.value('mmap_archives', True, bool)
+
+    @mmap_archives.setter
+    def mmap_archives(self, enabled: bool):
+        if not self.is_init:
+            self.init()
+
+        self.settings.setValue('mmap_archives', enabled)
+
+    @property
+    def image_cache_size(self) -> int:
+        """ Memory budget of the decoded image cache, in MB. """
+        if not self.is_init:
+            self.init()
+
+        # not imported at the top, the images module pulls in numpy and
+        # pandas, which are imported once the window is shown
+        from ..images import DEFAULT_IMAGE_CACHE_MB
+        return self.settings.value('image_cache_size', DEFAULT_IMAGE_CACHE_MB,
+                                   int)
+
+    @image_cache_size.setter
+    def image_cache_size(self, size: int):
+        if not self.is_init:
+            self.init()
+
+        if size < 0:
+            raise ValueError(f'Image cache size {size} should be >= 0.')
+
+        self.settings.setValue('image_cache_size', size)
+
+    @property
+    def lod_rendering(self) -> bool:
+        """
+        Whether images are rendered from a level of detail pyramid, instead
+        of always at full resolution.
+        """
+        if not self.is_init:
+            self.init()
+
+        return self.settings.value('lod_rendering', True, bool)
+
+    @lod_rendering.setter
+    def lod_rendering(self, enabled: bool):
+        if not self.is_init:
+            self.init()
+
+        self.settings.setValue('lod_rendering', enabled)
+
+    @property
+    def prefetch_ahead(self) -> int:
+        """ Number of images after the current row that are prefetched. """
+        if not self.is_init:
+            self.init()
+
+        return self.settings.value('prefetch_ahead', 5, int)
+
+    @prefetch_ahead.setter
+    def prefetch_ahead(self, num: int):
+        if not self.is_init:
+            self.init()
+
+        self.settings.setValue('prefetch_ahead', max(num, 0))
+
+    @property
+    def prefetch_behind(self) -> int:
+        """ Number of images before the current row that are prefetched. """
+        if not self.is_init:
+            self.init()
+
+        return self.settings.value('prefetch_behind', 2, int)
+
+    @prefetch_behind.setter
+    def prefetch_behind(self, num: int):
+        if not self.is_init:
+            self.init()
+
+        self.settings.setValue('prefetch_behind', max(num, 0))
+
+    @property
+    def thumbnail_size(self) -> int:
+        """ Size of the thumbnails in the gallery, in pixels. """
+        if not self.is_init:
+            self.init()
+
+        return self.settings.value('thumbnail_size', 160, int)
+
+    @thumbnail_size.setter
+    def thumbnail_size(self, size: int):
+        if not self.is_init:
+            self.init()
+
+        if size < 16:
+            raise ValueError(f'Thumbnail size {size} should be >= 16.')
+
+        self.settings.setValue('thumbnail_size', size)
+
+    @property
+    def watch_interval(self) -> int:
+        """ Interval between polls of a watched workspace, in ms. """
+        if not self.is_init:
+            self.init()
+
+        return self.settings.value('watch_interval', 2000, int)
+
+    @watch_interval.setter
+    def watch_interval(self, interval: int):
+        if not self.is_init:
+            self.init()
+
+        if interval < 100:
+            raise ValueError(f'Watch interval {interval} should be >= 100.')
+
+        self.settings.setValue('watch_interval', interval)
+
 
 app = AppSettings()
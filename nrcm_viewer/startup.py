@@ -0,0 +1,103 @@
+"""
+Deferred imports of the heavy modules, i.e. NumPy, pandas, PIL and
+pyqtgraph, so that the main window shows before they are loaded.
+
+Once the window is shown, `Warmup` imports the modules without Qt widgets
+on a background thread, and then finishes on the main thread by importing
+the widgets, which pull in pyqtgraph. Code that needs the widgets before
+the warmup is done calls `finish`, which imports whatever is still missing.
+"""
+import importlib
+import logging
+import threading
+import typing as t
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from .profiling import span
+from .settings import app
+
+log = logging.getLogger(__name__)
+
+# safe to import off the main thread
+BACKGROUND_MODULES = (
+    'numpy',
+    'pandas',
+    'PIL.Image',
+    'nrcm_viewer.data',
+    'nrcm_viewer.images',
+    'nrcm_viewer.filtering',
+    'nrcm_viewer.export',
+    'nrcm_viewer.session',
+)
+# imported on the main thread, as they create Qt objects
+MAIN_THREAD_MODULES = (
+    'nrcm_viewer.ui.main_widget',
+    'nrcm_viewer.ui.session_widget',
+)
+
+_finished = False
+
+
+def import_background_modules():
+    for name in BACKGROUND_MODULES:
+        importlib.import_module(name)
+
+
+def finish():
+    """
+    Imports the remaining modules on the main thread and applies the
+    settings of the imported modules. Does nothing if already finished.
+    """
+    global _finished
+    if _finished:
+        return
+
+    with span('warmup_main_thread'):
+        for name in BACKGROUND_MODULES + MAIN_THREAD_MODULES:
+            importlib.import_module(name)
+
+        from .images import image_cache
+        image_cache.max_bytes = app.image_cache_size * 2 ** 20
+
+    _finished = True
+
+
+def is_finished() -> bool:
+    return _finished
+
+
+class Warmup(QObject):
+    """
+    Runs the warmup, in the background as far as possible. Must be created
+    on the main thread, which finishes the warmup.
+    """
+    _background_done = pyqtSignal()
+
+    def __init__(self, parent: t.Optional[QObject] = None):
+        super().__init__(parent)
+        self._thread: t.Optional[threading.Thread] = None
+
+        self._background_done.connect(self._on_background_done)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='warmup',
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with span('warmup_background'):
+                import_background_modules()
+        except Exception:  # noqa
+            # the imports are retried, and fail loudly, on first use
+            log.exception('Error in warming up.')
+
+        try:
+            self._background_done.emit()
+        except RuntimeError:
+            pass
+
+    def _on_background_done(self):
+        finish()
+        log.debug('Warmup finished.')
@@ -0,0 +1,403 @@
+"""
+Headless detection statistics of many archives and workspaces, without Qt.
+
+    python -m nrcm_viewer.stats week/*.zip -o stats.json
+    python -m nrcm_viewer.stats week/*.zip --format csv -o stats.csv -j 16
+
+Every CSV file of every source is parsed in a pool of worker processes, one
+file at a time, and only the aggregated statistics of a file are sent back.
+The statistics of a source are written as soon as all its CSV files are
+parsed, so memory use depends neither on the number nor on the size of the
+sources. The last record holds the totals of all sources.
+
+Statistics are detection counts, frames with detections, mean scores and
+score histograms per line, channel, class and directory, and the number of
+frames without faults, i.e. images without rows in the CSV files.
+
+JSON output is written as JSON lines, one object per source. CSV output has
+one row per source, group and key.
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import sys
+import typing as t
+from argparse import ArgumentParser
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from os import path
+
+import numpy as np
+import pandas as pd
+
+from .data import Reader, SampleStore, open_reader
+
+log = logging.getLogger(__name__)
+
+GROUPS = ('total', 'directory', 'line', 'channel', 'class')
+NUM_BINS = 20
+# readers kept open in every worker process
+MAX_READERS = 2
+
+# frames, detections and sum of scores, followed by the score histogram
+_FRAMES, _DETECTIONS, _SCORE_SUM, _HISTOGRAM = 0, 1, 2, 3
+
+
+class Stats:
+    """
+    Detection statistics of a set of samples, by group and key, that can be
+    merged with those of other samples.
+    """
+    def __init__(self, num_bins: int = NUM_BINS):
+        self.num_bins = num_bins
+        self.groups: t.Dict[str, t.Dict[t.Any, np.ndarray]] = {
+            group: dict() for group in GROUPS}
+        # by directory
+        self.frames_without_faults: t.Dict[str, int] = dict()
+        self.csv_files = 0
+        self.errors = 0
+
+    def add(self, samples: SampleStore, files: t.Dict[str, str],
+            directory: str):
+        """
+        Adds the samples of the CSV file of a directory with the given
+        timestamp to image mapping.
+        """
+        self.csv_files += 1
+
+        owner = np.repeat(np.arange(len(samples)), samples.num_detections)
+        scores = samples.detection_column('score').astype(np.float64)
+        bins = np.clip((scores * self.num_bins).astype(np.int64), 0,
+                       self.num_bins - 1)
+
+        sample_codes = {
+            'total': (np.zeros(len(samples), dtype=np.int64), ['total']),
+            'directory': (np.zeros(len(samples), dtype=np.int64),
+                          [directory]),
+            'line': _factorize(samples.column('line_name')),
+            'channel': _factorize(samples.column('channel_id')),
+        }
+        for group, (codes, keys) in sample_codes.items():
+            self._add_group(group, keys, codes, codes[owner], scores, bins)
+
+        # frames with a detection of a class
+        codes, keys = _factorize(samples.detection_column('cls'))
+        pairs = np.unique(owner * max(len(keys), 1) + codes)
+        frame_codes = pairs % max(len(keys), 1)
+        self._add_group('class', keys, frame_codes, codes, scores, bins)
+
+        self.frames_without_faults[directory] = \
+            self.frames_without_faults.get(directory, 0) + \
+            len(set(files) - set(samples.column('timestamp')))
+
+    def merge(self, other: 'Stats'):
+        for group, values in other.groups.items():
+            own = self.groups[group]
+            for key, value in values.items():
+                if key in own:
+                    own[key] = own[key] + value
+                else:
+                    own[key] = value.copy()
+
+        for key, count in other.frames_without_faults.items():
+            self.frames_without_faults[key] = \
+                self.frames_without_faults.get(key, 0) + count
+        self.csv_files += other.csv_files
+        self.errors += other.errors
+
+    def to_dict(self, source: str) -> t.Dict[str, t.Any]:
+        total = self.groups['total'].get('total', self._empty())
+        return {
+            'source': source,
+            'csv_files': self.csv_files,
+            'errors': self.errors,
+            'frames': int(total[_FRAMES]),
+            'detections': int(total[_DETECTIONS]),
+            'frames_without_faults': sum(
+                self.frames_without_faults.values()),
+            'score_bins': self.bin_edges(),
+            'groups': {
+                group: {str(key): self._entry(group, key, value)
+                        for key, value in self.groups[group].items()}
+                for group in GROUPS if group != 'total'},
+        }
+
+    def rows(self, source: str) -> t.Iterator[t.List[t.Any]]:
+        """ Rows of CSV output, see `csv_header`. """
+        for group in GROUPS:
+            for key, value in self.groups[group].items():
+                entry = self._entry(group, key, value)
+                yield [source, group, key, entry['frames'],
+                       entry['detections'],
+                       entry.get('frames_without_faults', ''),
+                       entry['mean_score'], *entry['score_histogram']]
+
+    def csv_header(self) -> t.List[str]:
+        return ['source', 'group', 'key', 'frames', 'detections',
+                'frames_without_faults', 'mean_score'] + \
+            [f'score_{o:.2f}' for o in self.bin_edges()[:-1]]
+
+    def bin_edges(self) -> t.List[float]:
+        return np.linspace(0, 1, self.num_bins + 1).round(6).tolist()
+
+    def _entry(self, group: str, key: t.Any, value: np.ndarray) \
+            -> t.Dict[str, t.Any]:
+        detections = int(value[_DETECTIONS])
+        entry = {
+            'frames': int(value[_FRAMES]),
+            'detections': detections,
+            'mean_score': float(value[_SCORE_SUM] / detections)
+            if detections > 0 else None,
+            'score_histogram': value[_HISTOGRAM:].astype(np.int64).tolist(),
+        }
+        if group == 'total':
+            entry['frames_without_faults'] = sum(
+                self.frames_without_faults.values())
+        elif group == 'directory':
+            entry['frames_without_faults'] = \
+                self.frames_without_faults.get(key, 0)
+
+        return entry
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros(_HISTOGRAM + self.num_bins)
+
+    def _add_group(self, group: str, keys: t.Sequence[t.Any],
+                   frame_codes: np.ndarray, detection_codes: np.ndarray,
+                   scores: np.ndarray, bins: np.ndarray):
+        n = len(keys)
+        if n == 0:
+            return
+
+        values = np.zeros((n, _HISTOGRAM + self.num_bins))
+        values[:, _FRAMES] = np.bincount(frame_codes, minlength=n)
+        values[:, _DETECTIONS] = np.bincount(detection_codes, minlength=n)
+        values[:, _SCORE_SUM] = np.bincount(detection_codes, scores,
+                                            minlength=n)
+        values[:, _HISTOGRAM:] = np.bincount(
+            detection_codes * self.num_bins + bins,
+            minlength=n * self.num_bins).reshape(n, self.num_bins)
+
+        own = self.groups[group]
+        for key, value in zip(keys, values):
+            if key in own:
+                own[key] += value
+            else:
+                own[key] = value
+
+
+def _factorize(values: np.ndarray) -> t.Tuple[np.ndarray, t.List[t.Any]]:
+    """ Codes and keys of values, missing values have the key None. """
+    codes, uniques = pd.factorize(values)
+    keys = [o.item() if isinstance(o, np.generic) else o
+            for o in np.asarray(uniques)]
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(keys), codes)
+        keys.append(None)
+
+    return codes, keys
+
+
+# readers of a worker process, by source
+_readers: t.OrderedDict[str, Reader] = OrderedDict()
+
+
+def csv_stats(reader: Reader, i: int, files: t.Dict[str, str],
+              num_bins: int = NUM_BINS) -> Stats:
+    """ Statistics of the i-th CSV file of a reader, with its images. """
+    csv_file = reader.csv_files[i]
+    directory = reader._dirs_with_csv[i]
+
+    stats = Stats(num_bins)
+    try:
+        samples = reader._read_csv(csv_file, files)
+    except Exception as e:  # noqa
+        log.error(f'Error in reading {csv_file} of {reader.source}: {e}')
+        stats.errors += 1
+        return stats
+
+    stats.add(samples, files, directory)
+    return stats
+
+
+def _csv_stats_in_worker(source: str, reader_state: bytes, i: int,
+                         files: t.Dict[str, str], num_bins: int) -> Stats:
+    """
+    Statistics of the i-th CSV file of a source in a worker process. The
+    reader indexed by the main process is unpickled once per worker.
+    """
+    reader = _readers.pop(source, None)
+    if reader is None:
+        try:
+            reader = pickle.loads(reader_state)
+        except Exception as e:  # noqa
+            log.error(f'Error in opening {source}: {e}')
+            stats = Stats(num_bins)
+            stats.errors += 1
+            return stats
+    _readers[source] = reader
+    while len(_readers) > MAX_READERS:
+        _readers.popitem(last=False)[1].close()
+
+    return csv_stats(reader, i, files, num_bins)
+
+
+def iter_stats(sources: t.Sequence[str], workers: int = 1,
+               num_bins: int = NUM_BINS) \
+        -> t.Iterator[t.Tuple[str, Stats]]:
+    """
+    Yields the statistics of every source, in order, once all its CSV files
+    have been parsed. With more than one worker, the CSV files are parsed
+    in a process pool with a bounded number of files in flight.
+
+    Every source is indexed once, by this process, and every task gets the
+    images of its CSV file along with the indexed reader.
+    """
+    Task = t.Tuple[str, t.Optional[Reader], bytes, int, bool]
+
+    def tasks() -> t.Iterator[Task]:
+        # i is -1 for sources without CSV files, and -2 for sources that
+        # could not be opened
+        for source in sources:
+            try:
+                reader = open_reader(source, use_cache=False)
+            except Exception as e:  # noqa
+                log.error(f'Error in opening {source}: {e}')
+                yield source, None, b'', -2, True
+                continue
+
+            # pickled once for all the tasks of the source
+            state = pickle.dumps(reader) if executor is not None else b''
+            num_csv_files = len(reader.csv_files)
+            for i in range(num_csv_files):
+                yield source, reader, state, i, i == num_csv_files - 1
+            if num_csv_files == 0:
+                yield source, reader, state, -1, True
+            # the tasks of this process have run, workers have own copies
+            reader.close()
+
+    def run(source: str, reader: t.Optional[Reader], state: bytes,
+            i: int) -> t.Union[Stats, Future]:
+        if i < 0:
+            stats = Stats(num_bins)
+            stats.errors = int(i == -2)
+            return stats
+
+        files = reader._dir_to_file[reader._dirs_with_csv[i]]
+        if executor is None:
+            return csv_stats(reader, i, files, num_bins)
+        return executor.submit(_csv_stats_in_worker, source, state, i,
+                               files, num_bins)
+
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'))
+
+    pending = deque()
+    jobs = iter(tasks())
+    current: t.Optional[Stats] = None
+    try:
+        while True:
+            # keep the workers busy, but only a bounded number of files in
+            # flight
+            for source, reader, state, i, last in jobs:
+                pending.append((source, last, run(source, reader, state, i)))
+                if len(pending) >= 2 * max(workers, 1):
+                    break
+            if len(pending) == 0:
+                break
+
+            source, last, result = pending.popleft()
+            if isinstance(result, Future):
+                result = result.result()
+
+            if current is None:
+                current = Stats(num_bins)
+            current.merge(result)
+            if last:
+                yield source, current
+                current = None
+    finally:
+        if executor is not None:
+            for _, _, result in pending:
+                if isinstance(result, Future):
+                    result.cancel()
+            executor.shutdown()
+
+
+def write_stats(sources: t.Sequence[str], out: t.TextIO, fmt: str = 'json',
+                workers: int = 1, num_bins: int = NUM_BINS) -> Stats:
+    """
+    Writes the statistics of every source as soon as they are complete,
+    followed by the totals of all sources, and returns the totals.
+    """
+    total = Stats(num_bins)
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(total.csv_header())
+
+    def write(source: str, stats: Stats):
+        if writer is None:
+            out.write(json.dumps(stats.to_dict(source)) + '\n')
+        else:
+            writer.writerows(stats.rows(source))
+        out.flush()
+
+    for source, stats in iter_stats(sources, workers, num_bins):
+        log.info(f'{source}: {stats.csv_files} CSV files, '
+                 f'{stats.errors} errors.')
+        write(source, stats)
+        # directories of different sources are kept apart in the totals
+        stats.groups['directory'] = {
+            path.join(source, key): value
+            for key, value in stats.groups['directory'].items()}
+        stats.frames_without_faults = {
+            path.join(source, key): value
+            for key, value in stats.frames_without_faults.items()}
+        total.merge(stats)
+
+    write('*', total)
+    return total
+
+
+def main():
+    parser = ArgumentParser(description='Detection statistics of archives '
+                                        'and workspaces.')
+    parser.add_argument('sources', nargs='+',
+                        help='Archives (*.zip) or workspace directories.')
+    parser.add_argument('-o', '--output',
+                        help='Output file, standard output by default.')
+    parser.add_argument('--format', choices=('json', 'csv'),
+                        help='Output format, by default from the extension '
+                             'of the output file, else json.')
+    parser.add_argument('-j', '--workers', type=int,
+                        default=os.cpu_count() or 1,
+                        help='Number of worker processes.')
+    parser.add_argument('--bins', type=int, default=NUM_BINS,
+                        help='Number of bins of the score histograms.')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - [%(levelname)s] - %(name)s - %(message)s')
+
+    fmt = args.format
+    if fmt is None:
+        fmt = 'csv' if args.output and args.output.endswith('.csv') \
+            else 'json'
+
+    if args.output is None:
+        write_stats(args.sources, sys.stdout, fmt, args.workers, args.bins)
+    else:
+        with open(args.output, 'w', newline='') as f:
+            write_stats(args.sources, f, fmt, args.workers, args.bins)
+
+
+if __name__ == '__main__':
+    main()
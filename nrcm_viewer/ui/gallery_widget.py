@@ -0,0 +1,242 @@
+import logging
+import typing as t
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+from PyQt5.QtCore import (QIdentityProxyModel, QModelIndex, QObject, QSize,
+                          QTimer, Qt, pyqtSignal)
+from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QListView, QWidget
+
+from ..cache import ThumbnailCache
+from ..data import Reader
+from ..images import load_thumbnail
+from ..settings import app
+from .table_model import HEADER, TableModel
+
+log = logging.getLogger(__name__)
+
+# number of generated thumbnails kept in memory
+MAX_THUMBNAILS = 2000
+THUMBNAIL_WORKERS = 4
+
+# source of a reader and file path of an image
+ImageKey = t.Tuple[str, str]
+
+
+def draw_detections(thumbnail: np.ndarray, shape: t.Tuple[int, int],
+                    boxes: np.ndarray, classes: np.ndarray) -> np.ndarray:
+    """
+    Draws the boxes (x0, x1, y0, y1) of an image of the given
+    (height, width) onto the thumbnail of the image.
+    """
+    img = Image.fromarray(thumbnail).convert('RGB')
+    draw = ImageDraw.Draw(img)
+
+    scale_y = img.height / max(shape[0], 1)
+    scale_x = img.width / max(shape[1], 1)
+    for (x0, x1, y0, y1), cls in zip(boxes, classes):
+        rect = (x0 * scale_x, y0 * scale_y, x1 * scale_x, y1 * scale_y)
+        draw.rectangle(rect, outline=(255, 0, 0), width=2)
+        draw.text((rect[0] + 2, rect[1] + 1), str(cls), fill=(255, 0, 0))
+
+    return np.asarray(img)
+
+
+def to_qimage(image: np.ndarray) -> QImage:
+    height, width = image.shape[:2]
+    image = np.ascontiguousarray(image)
+    # the QImage does not own the buffer, copy it before it goes away
+    return QImage(image.data, width, height, image.strides[0],
+                  QImage.Format_RGB888).copy()
+
+
+class GalleryModel(QIdentityProxyModel):
+    """
+    Proxy of the table model that decorates every row with a thumbnail of
+    its image, with the detections drawn on top.
+
+    Thumbnails are generated on a thread pool, but only for the rows passed
+    to `request`, i.e. the visible ones, from the reader of every row.
+    Pending thumbnails of rows that are no longer requested are cancelled.
+    """
+    _thumbnail_ready = pyqtSignal(object, QImage)
+
+    def __init__(self, size: int, parent: t.Optional[QObject] = None):
+        super().__init__(parent)
+
+        self._cache = ThumbnailCache(size)
+        self._executor = ThreadPoolExecutor(THUMBNAIL_WORKERS,
+                                            thread_name_prefix='thumbnail')
+        # thumbnails by the source of their reader and their file path
+        self._thumbnails: t.OrderedDict[ImageKey, QImage] = OrderedDict()
+        self._pending: t.Dict[ImageKey, Future] = dict()
+        self._rows: t.Dict[ImageKey, int] = dict()
+
+        # shown until the thumbnail is ready, it also gives all items the
+        # same size, which the view relies on
+        self._placeholder = QImage(size, size, QImage.Format_RGB888)
+        self._placeholder.fill(Qt.lightGray)
+
+        self._thumbnail_ready.connect(self._on_thumbnail_ready)
+
+    @property
+    def size(self) -> int:
+        return self._cache.size
+
+    def data(self, index: QModelIndex, role: int = ...) -> t.Any:
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._thumbnails.get(self._key(index.row()),
+                                        self._placeholder)
+
+        return super().data(index, role)
+
+    def request(self, rows: t.Iterable[int]):
+        """ Generates the thumbnails of the rows that are not ready yet. """
+        wanted = dict()
+        for row in rows:
+            key = self._key(row)
+            # the samples of a reader that is not ready yet have no key
+            if key is not None:
+                wanted[key] = row
+
+        for key in list(self._pending):
+            if key not in wanted and self._pending[key].cancel():
+                del self._pending[key]
+
+        self._rows = wanted
+        model: TableModel = self.sourceModel()
+        for key, row in wanted.items():
+            if key in self._thumbnails:
+                self._thumbnails.move_to_end(key)
+                continue
+            if key in self._pending:
+                continue
+
+            samples, sample_row, reader = model.sample_at(row)
+            self._pending[key] = self._executor.submit(
+                self._generate, reader, key, samples.boxes(sample_row),
+                samples.classes(sample_row))
+
+    def shutdown(self, wait: bool = False):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+        self._executor.shutdown(wait=wait)
+
+    def _key(self, row: int) -> t.Optional[ImageKey]:
+        samples, sample_row, reader = self.sourceModel().sample_at(row)
+        if reader is None:
+            return None
+        return reader.source, samples.value(sample_row, 'filepath')
+
+    def _generate(self, reader: Reader, key: ImageKey, boxes: np.ndarray,
+                  classes: np.ndarray):
+        filepath = key[1]
+        try:
+            thumbnail, shape = load_thumbnail(reader, filepath, self._cache)
+            image = to_qimage(draw_detections(thumbnail, shape, boxes,
+                                              classes))
+        except (OSError, KeyError, ValueError) as e:
+            # e.g. a member missing from the archive or a corrupt image, the
+            # thumbnail stays empty but is no longer pending
+            log.debug(f'Could not make thumbnail of {filepath}: {e}')
+            image = QImage()
+
+        try:
+            self._thumbnail_ready.emit(key, image)
+        except RuntimeError:
+            # the model has been deleted in the meantime
+            pass
+
+    def _on_thumbnail_ready(self, key: ImageKey, image: QImage):
+        self._pending.pop(key, None)
+
+        self._thumbnails[key] = image
+        self._thumbnails.move_to_end(key)
+        while len(self._thumbnails) > MAX_THUMBNAILS:
+            self._thumbnails.popitem(last=False)
+
+        row = self._rows.get(key)
+        if row is not None and row < self.rowCount() \
+                and self._key(row) == key:
+            self.dataChanged.emit(self.index(row, 0),
+                                  self.index(row, self.columnCount() - 1),
+                                  [Qt.ItemDataRole.DecorationRole])
+
+
+class GalleryView(QListView):
+    """
+    Grid of thumbnails of the rows of a table model. Thumbnails are only
+    requested for the visible rows, once scrolling has settled.
+    """
+    def __init__(self, parent: t.Optional[QWidget] = None):
+        super().__init__(parent)
+
+        self.setViewMode(QListView.IconMode)
+        self.setMovement(QListView.Static)
+        self.setResizeMode(QListView.Adjust)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setEditTriggers(QListView.NoEditTriggers)
+
+        self._request_timer = QTimer(self)
+        self._request_timer.setSingleShot(True)
+        self._request_timer.setInterval(50)
+        self._request_timer.timeout.connect(self.request_visible)
+
+        self.verticalScrollBar().valueChanged.connect(self._schedule_request)
+
+    def set_table_model(self, table_model: TableModel):
+        size = app.thumbnail_size
+        model = GalleryModel(size, self)
+        model.setSourceModel(table_model)
+        self.setModel(model)
+        self.setModelColumn(HEADER.index('Timestamp'))
+
+        self.setIconSize(QSize(size, size))
+        self.setGridSize(
+            QSize(size + 16, size + 2 * self.fontMetrics().height()))
+
+        model.modelReset.connect(self._schedule_request)
+        model.rowsInserted.connect(self._schedule_request)
+        model.layoutChanged.connect(self._schedule_request)
+
+    def shutdown(self, wait: bool = False):
+        if self.model() is not None:
+            self.model().shutdown(wait)
+
+    def visible_rows(self) -> range:
+        """
+        Rows with a thumbnail in the viewport, computed from the uniform
+        grid rather than by hit testing every item.
+        """
+        model = self.model()
+        if model is None or model.rowCount() == 0:
+            return range(0)
+
+        grid = self.gridSize()
+        rect = self.viewport().rect()
+        per_line = max(rect.width() // max(grid.width(), 1), 1)
+
+        top = self.verticalScrollBar().value()
+        first_line = top // max(grid.height(), 1)
+        last_line = (top + rect.height()) // max(grid.height(), 1)
+
+        first = min(first_line * per_line, model.rowCount())
+        last = min((last_line + 1) * per_line, model.rowCount())
+        return range(first, last)
+
+    def request_visible(self):
+        if self.model() is not None:
+            self.model().request(self.visible_rows())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._schedule_request()
+
+    def _schedule_request(self, *_):
+        self._request_timer.start()
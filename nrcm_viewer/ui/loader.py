@@ -0,0 +1,244 @@
+import logging
+import threading
+import typing as t
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from ..profiling import span
+
+if t.TYPE_CHECKING:
+    # the readers pull in pandas, which is imported once the window is shown
+    from ..data import Reader, WorkspaceReader
+
+log = logging.getLogger(__name__)
+
+
+class ReaderLoader(QObject):
+    """
+    Creates a reader and parses its samples on the global thread pool.
+
+    The samples are emitted one CSV file at a time as they are parsed, and
+    progress is reported as (CSV files done, total CSV files, samples
+    parsed). The finished signal is always emitted last, also when loading
+    failed or was cancelled.
+
+    With more than one worker, the CSV files are parsed in a process pool.
+    """
+    reader_ready = pyqtSignal(object)
+    samples_loaded = pyqtSignal(object)
+    progress = pyqtSignal(int, int, int)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self, factory: t.Callable[[], 'Reader'], workers: int = 1,
+                 parent: t.Optional[QObject] = None):
+        super().__init__(parent)
+
+        self._factory = factory
+        self._workers = workers
+        self._cancel_event = threading.Event()
+        self._task: t.Optional[_LoadTask] = None
+
+    def start(self):
+        self._task = _LoadTask(self)
+        QThreadPool.globalInstance().start(self._task)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def _run(self):
+        try:
+            with span('load', 'load'):
+                self._load()
+        except Exception as e:  # noqa
+            log.exception('Error while loading samples.')
+            self._emit('failed', str(e))
+        finally:
+            self._emit('finished')
+
+    def _load(self):
+        reader = self._factory()
+        if self.is_cancelled:
+            self._emit('cancelled')
+            return
+        self._emit('reader_ready', reader)
+
+        total = len(reader.csv_files)
+        done = rows = 0
+        self._emit('progress', done, total, rows)
+
+        for samples in reader.iter_samples(workers=self._workers):
+            if self.is_cancelled:
+                log.debug('Loading cancelled.')
+                self._emit('cancelled')
+                return
+
+            done = min(done + 1, total)
+            rows += len(samples)
+            self._emit('samples_loaded', samples)
+            self._emit('progress', done, total, rows)
+
+        self._emit('progress', total, total, rows)
+
+    def _emit(self, signal: str, *args):
+        # the loader may have been deleted along with its tab
+        try:
+            getattr(self, signal).emit(*args)
+        except RuntimeError:
+            self._cancel_event.set()
+
+
+class _LoadTask(QRunnable):
+    def __init__(self, loader: ReaderLoader):
+        super().__init__()
+        self._loader = loader
+
+    def run(self):
+        self._loader._run()
+
+
+class WorkspaceWatcher(QObject):
+    """
+    Polls a workspace for new results, refreshing the reader on the global
+    thread pool, and emits the samples added since the last poll.
+
+    A poll is skipped while the previous one is still running.
+    """
+    samples_loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, reader: 'WorkspaceReader', interval_ms: int,
+                 parent: t.Optional[QObject] = None):
+        super().__init__(parent)
+
+        self._reader = reader
+        self._running = threading.Event()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.poll)
+
+    def start(self):
+        """ Starts polling, the first poll starting to watch the reader. """
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    @property
+    def is_active(self) -> bool:
+        return self._timer.isActive()
+
+    def poll(self):
+        if self._running.is_set():
+            return
+
+        self._running.set()
+        QThreadPool.globalInstance().start(_RefreshTask(self))
+
+    def _run(self):
+        try:
+            if not self._reader.is_watching:
+                self._reader.watch()
+            samples = self._reader.refresh()
+        except Exception as e:  # noqa
+            log.exception('Error while refreshing workspace.')
+            self._emit('failed', str(e))
+        else:
+            if len(samples) > 0:
+                self._emit('samples_loaded', samples)
+        finally:
+            self._running.clear()
+
+    def _emit(self, signal: str, *args):
+        # the watcher may have been deleted along with its tab
+        try:
+            getattr(self, signal).emit(*args)
+        except RuntimeError:
+            pass
+
+
+class _RefreshTask(QRunnable):
+    def __init__(self, watcher: WorkspaceWatcher):
+        super().__init__()
+        self._watcher = watcher
+
+    def run(self):
+        self._watcher._run()
+
+
+class BackgroundTask(QObject):
+    """
+    Runs a function on the global thread pool. The function is passed a
+    progress callback, taking the work done and the total, which returns
+    False once the task has been cancelled. Its return value is kept in
+    `result`.
+    """
+    progress = pyqtSignal(int, int)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, function: t.Callable[[t.Callable[[int, int], bool]],
+                                            t.Any],
+                 parent: t.Optional[QObject] = None):
+        super().__init__(parent)
+
+        self._function = function
+        self._cancel_event = threading.Event()
+        self._has_failed = False
+        self._result: t.Any = None
+        self._task: t.Optional[_FunctionTask] = None
+
+    def start(self):
+        self._task = _FunctionTask(self._run)
+        QThreadPool.globalInstance().start(self._task)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def has_failed(self) -> bool:
+        return self._has_failed
+
+    @property
+    def result(self) -> t.Any:
+        return self._result
+
+    def _run(self):
+        try:
+            self._result = self._function(self._report)
+        except Exception as e:  # noqa
+            log.exception('Error in background task.')
+            self._has_failed = True
+            self._emit('failed', str(e))
+        finally:
+            self._emit('finished')
+
+    def _report(self, done: int, total: int) -> bool:
+        self._emit('progress', done, total)
+        return not self.is_cancelled
+
+    def _emit(self, signal: str, *args):
+        # the task may have been deleted along with its tab
+        try:
+            getattr(self, signal).emit(*args)
+        except RuntimeError:
+            self._cancel_event.set()
+
+
+class _FunctionTask(QRunnable):
+    def __init__(self, function: t.Callable[[], None]):
+        super().__init__()
+        self._function = function
+
+    def run(self):
+        self._function()
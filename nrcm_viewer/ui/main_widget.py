@@ -1,37 +1,464 @@
 import logging
-from typing import Optional
+from functools import partial
+from os import path
+from typing import Optional, Tuple
 
-from PyQt5.QtCore import QSortFilterProxyModel, QModelIndex
-from PyQt5.QtWidgets import QWidget
+import numpy as np
+from PyQt5.QtCore import QModelIndex, Qt, pyqtSignal
+from PyQt5.QtWidgets import QAbstractItemView, QFileDialog, QInputDialog, \
+    QWidget, QMessageBox
 
+from .loader import BackgroundTask, ReaderLoader, WorkspaceWatcher
 from .table_model import TableModel, CopySelectedCellsAction
-from ..data import ZipReader, Reader, WorkspaceReader
+from ..data import ZipReader, Reader, SampleStore, WorkspaceReader
+from ..export import export_samples
+from ..filtering import SampleFilter, StoreColumns
 from ..generated.main_widget_ui import Ui_MainWidget
+from ..images import ImagePrefetcher
+from ..settings import app
 
 log = logging.getLogger(__name__)
 
+EXPORT_FILTERS = {
+    'CSV (*.csv)': 'csv',
+    'TSV (*.tsv)': 'tsv',
+    'Parquet (*.parquet)': 'parquet',
+}
+
 
 class MainWidget(Ui_MainWidget, QWidget):
-    def __init__(self, reader: Reader, parent: Optional[QWidget] = None):
+    status_message = pyqtSignal(str)
+    # emitted when loading finishes, or watching starts or stops
+    state_changed = pyqtSignal()
+
+    def __init__(self, reader: Optional[Reader] = None,
+                 parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.setupUi(self)
 
         self._reader = reader
-        self._table_model = TableModel(parent=self)
+        self._loader: Optional[ReaderLoader] = None
+        self._watcher: Optional[WorkspaceWatcher] = None
+        self._export: Optional[BackgroundTask] = None
+        self._export_path: Optional[str] = None
+        self._indexing: Optional[BackgroundTask] = None
+        self._table_model = self._create_model()
 
-        proxy_model = QSortFilterProxyModel(self)
-        proxy_model.setSourceModel(self._table_model)
         self.table.setModel(self._table_model)
+        # show the samples in the order of the store until a column is
+        # clicked
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.filterEdit.returnPressed.connect(self.apply_filter)
+        self.filterEdit.textChanged.connect(self._on_filter_text_changed)
+        self.gotoEdit.returnPressed.connect(self.go_to_position)
 
         self.table.activated.connect(self.show_img)
         self.copy_action = CopySelectedCellsAction(self.table)
 
-        self._table_model.samples = self._reader.samples
+        # the image of the current row is shown after the prefetch of it
+        # and its neighbours has started
+        self._prefetcher = ImagePrefetcher()
+        self._prefetch_ahead = app.prefetch_ahead
+        self._prefetch_behind = app.prefetch_behind
+        self.widget.prefetcher = self._prefetcher
+        self.table.selectionModel().currentRowChanged.connect(
+            self.prefetch_around)
+        self.table.selectionModel().currentRowChanged.connect(self.show_img)
+
+        self.gallery.set_table_model(self._table_model)
+        self.gallery.activated.connect(self.select_gallery_row)
+        self.table.selectionModel().currentRowChanged.connect(
+            self.sync_gallery)
+
+        self.loadingWidget.setVisible(False)
+        self.cancelButton.clicked.connect(self._on_cancel_clicked)
+
+        if reader is not None:
+            self.load(ReaderLoader(lambda: reader))
+
+    def _create_model(self) -> TableModel:
+        return TableModel(parent=self)
+
+    def load(self, loader: ReaderLoader):
+        """
+        Loads the samples in the background, adding them to the table as
+        they are parsed.
+        """
+        self._loader = loader
+        loader.setParent(self)
+
+        loader.reader_ready.connect(self._on_reader_ready)
+        loader.samples_loaded.connect(self._table_model.append_samples)
+        loader.progress.connect(self._on_load_progress)
+        loader.failed.connect(self._on_load_failed)
+        loader.cancelled.connect(self._on_load_cancelled)
+        loader.finished.connect(self._on_load_finished)
+
+        self.loadingLabel.setText('Indexing...')
+        self.loadingProgress.setRange(0, 0)
+        self.loadingWidget.setVisible(True)
+
+        loader.start()
+
+    def cancel_loading(self):
+        if self._loader is not None:
+            self._loader.cancel()
+            if self._export is None:
+                self.loadingLabel.setText('Cancelling...')
+                self.cancelButton.setEnabled(False)
+
+    def cancel_export(self):
+        if self._export is not None:
+            self._export.cancel()
+            self.loadingLabel.setText('Cancelling...')
+            self.cancelButton.setEnabled(False)
+
+    def export_samples(self):
+        """
+        Exports the detections of the selected, filtered or all samples to a
+        file, in the background.
+        """
+        if self._export is not None:
+            self.status_message.emit('An export is already running.')
+            return
+
+        # the rows and samples as they are now, the selection, filter and
+        # order may change while the dialogs are open, and loading or
+        # watching may append samples during the export
+        model = self._table_model
+        store = model.samples
+        snapshot = store.slice(0, len(store))
+        scopes = dict()
+        selected = self.table.selectionModel().selectedRows()
+        if len(selected) > 0:
+            scopes['Selected samples'] = model.rows[
+                np.unique([o.row() for o in selected])]
+        if model.sample_filter is not None:
+            scopes['Filtered samples'] = model.rows
+        scopes['All samples'] = np.arange(len(snapshot))
+
+        scope, ok = QInputDialog.getItem(self, 'Export detections',
+                                         'Samples to export:', list(scopes),
+                                         0, False)
+        if not ok:
+            return
+
+        file_path, file_filter = QFileDialog.getSaveFileName(
+            self, 'Export detections', app.current_dir,
+            ';;'.join(EXPORT_FILTERS))
+        if file_path is None or file_path == '':
+            log.debug('No export file selected.')
+            return
+
+        fmt = EXPORT_FILTERS.get(file_filter, 'csv')
+        if path.splitext(file_path)[1].lstrip('.').lower() != fmt:
+            file_path = f'{file_path}.{fmt}'
+
+        rows = scopes[scope]
+        self._export_path = file_path
+        self._export = BackgroundTask(
+            partial(_export, snapshot, rows, file_path, fmt), self)
+        self._export.progress.connect(self._on_export_progress)
+        self._export.failed.connect(self._on_export_failed)
+        self._export.finished.connect(
+            partial(self._on_export_finished, file_path))
+
+        # the progress of the export is shown until it is done, also while
+        # loading
+        self.loadingLabel.setText('Exporting...')
+        self.loadingProgress.setRange(0, len(rows))
+        self.loadingProgress.setValue(0)
+        self.cancelButton.setEnabled(True)
+        self.loadingWidget.setVisible(True)
+
+        self._export.start()
+
+    @property
+    def can_export(self) -> bool:
+        return True
+
+    @property
+    def can_watch(self) -> bool:
+        """ Whether the widget shows a workspace that is fully loaded. """
+        return isinstance(self._reader, WorkspaceReader) \
+            and not self.is_loading
+
+    @property
+    def is_watching(self) -> bool:
+        return self._watcher is not None and self._watcher.is_active
+
+    def set_watching(self, enabled: bool):
+        """
+        Starts or stops polling the workspace for new results, which are
+        appended to the table.
+        """
+        if not enabled:
+            if self._watcher is not None:
+                self._watcher.stop()
+                self.state_changed.emit()
+            return
+        if not self.can_watch:
+            return
+
+        if self._watcher is None:
+            self._watcher = WorkspaceWatcher(self._reader,
+                                             app.watch_interval, self)
+            self._watcher.samples_loaded.connect(self._on_samples_refreshed)
+            self._watcher.failed.connect(self._on_refresh_failed)
+
+        self._watcher.start()
+        self.status_message.emit('Watching workspace for new results.')
+        self.state_changed.emit()
+
+    def dispose(self):
+        """ Stops all background work of the widget before it is closed. """
+        self.set_watching(False)
+        self.cancel_loading()
+        if self._export is not None:
+            # reported here, the widget is closed before the export stops
+            self._export.finished.disconnect()
+            self.cancel_export()
+            log.warning(f'Export cancelled as its tab was closed, '
+                        f'{self._export_path} is incomplete.')
+            self.status_message.emit(
+                f'Export cancelled, {self._export_path} is incomplete.')
+        # the reader is closed once no image is being read from it anymore
+        self._prefetcher.shutdown(wait=True)
+        self.gallery.shutdown(wait=True)
+        if self._reader is not None:
+            self._reader.close()
+
+    def prefetch_around(self, index: QModelIndex):
+        """
+        Prefetches the images of the rows following and preceding the row of
+        the index, in the order of the table.
+        """
+        if not index.isValid():
+            return
+
+        row = index.row()
+        num_rows = self._table_model.rowCount()
+        ahead = range(row + 1, min(row + 1 + self._prefetch_ahead, num_rows))
+        behind = range(row - 1, max(row - 1 - self._prefetch_behind, -1), -1)
+
+        images = list()
+        for o in (row, *ahead, *behind):
+            samples, sample_row, reader = self._table_model.sample_at(o)
+            if reader is not None:
+                images.append((reader, samples.value(sample_row, 'filepath')))
+        self._prefetcher.prefetch_images(images)
+
+    def apply_filter(self):
+        """ Filters the table with the expression in the filter field. """
+        text = self.filterEdit.text().strip()
+        try:
+            sample_filter = SampleFilter(text) if text else None
+            self._table_model.set_filter(sample_filter)
+        except ValueError as e:
+            self.filterEdit.setStyleSheet('QLineEdit { color: red; }')
+            self.filterEdit.setToolTip(str(e))
+            self.status_message.emit(f'Invalid filter: {e}')
+            return
+
+        self.filterEdit.setStyleSheet('')
+        self.filterEdit.setToolTip('')
+        if sample_filter is not None:
+            self.status_message.emit(
+                f'{self._table_model.num_matching} of '
+                f'{self._table_model.num_samples} samples match the '
+                f'filter.')
+
+    def go_to_position(self):
+        """
+        Shows the sample closest to the line and offset in the go to field,
+        looked up in the position index.
+        """
+        model = self._table_model
+        try:
+            line, offset = _parse_position(self.gotoEdit.text())
+            positions = model.columns.positions()
+            if positions is None:
+                raise ValueError('The offsets are not numbers.')
+            sample_row = positions.locate(line, offset)
+        except ValueError as e:
+            self.gotoEdit.setStyleSheet('QLineEdit { color: red; }')
+            self.gotoEdit.setToolTip(str(e))
+            self.status_message.emit(f'Cannot go to position: {e}')
+            return
+
+        self.gotoEdit.setStyleSheet('')
+        self.gotoEdit.setToolTip('')
+
+        row = model.table_row(sample_row)
+        found = f'{model.samples.value(sample_row, "line_name")} at ' \
+                f'{model.samples.value(sample_row, "line_offset")}'
+        if row < 0:
+            self.status_message.emit(f'The closest sample, {found}, is '
+                                     f'hidden by the filter.')
+            return
+
+        index = model.index(row, 0)
+        self.table.setCurrentIndex(index)
+        self.table.scrollTo(index, QAbstractItemView.PositionAtCenter)
+        self.status_message.emit(f'Showing {found}.')
+
+    def _on_filter_text_changed(self, text: str):
+        # clearing the field shows all samples again
+        if text == '' and self._table_model.sample_filter is not None:
+            self.apply_filter()
+
+    def select_gallery_row(self, index: QModelIndex):
+        """ Makes the row of a thumbnail current, which shows its image. """
+        table_index = self._table_model.index(index.row(), 0)
+        self.table.setCurrentIndex(table_index)
+        self.table.scrollTo(table_index)
+
+    def sync_gallery(self, index: QModelIndex):
+        if not index.isValid():
+            return
+
+        gallery_index = self.gallery.model().index(
+            index.row(), self.gallery.modelColumn())
+        self.gallery.setCurrentIndex(gallery_index)
+        self.gallery.scrollTo(gallery_index)
+
+    @property
+    def is_loading(self) -> bool:
+        return self._loader is not None
+
+    def _on_reader_ready(self, reader: Reader):
+        self._reader = reader
+        self._table_model.reader = reader
+
+    def _on_load_progress(self, done: int, total: int, rows: int):
+        if self._export is not None:
+            return
+        self.loadingProgress.setRange(0, total)
+        self.loadingProgress.setValue(done)
+        self.loadingLabel.setText(
+            f'Parsed {done}/{total} CSV files, {rows} samples')
+
+    def _on_load_failed(self, message: str):
+        QMessageBox.critical(self, 'Error',
+                             f'Error in loading samples.\n{message}')
+
+    def _on_load_cancelled(self):
+        self.status_message.emit(
+            f'Loading cancelled after {self._table_model.rowCount()} '
+            f'samples.')
+
+    def _on_load_finished(self):
+        if not self._loader.is_cancelled:
+            self.status_message.emit(
+                f'Loaded {self._table_model.rowCount()} samples.')
+
+        self._loader.deleteLater()
+        self._loader = None
+        self.loadingWidget.setVisible(self._export is not None)
+        self.state_changed.emit()
+
+        self.build_position_index()
+
+    def build_position_index(self):
+        """
+        Builds the position index of the samples in the background, on a
+        snapshot of the store. Until it is done, the index is built on first
+        use.
+        """
+        if self._indexing is not None:
+            return
+
+        store = self._table_model.samples
+        snapshot = store.slice(0, len(store))
+        self._indexing = BackgroundTask(
+            lambda _: StoreColumns(snapshot).positions(), self)
+        self._indexing.finished.connect(
+            partial(self._on_position_index_built, store))
+        self._indexing.start()
+
+    def _on_position_index_built(self, store: SampleStore):
+        index = self._indexing.result
+        # the samples may have been replaced or extended since
+        if index is not None and self._table_model.samples is store:
+            self._table_model.columns.set_positions(index)
+
+        self._indexing.deleteLater()
+        self._indexing = None
+
+    def _on_export_progress(self, done: int, total: int):
+        self.loadingProgress.setValue(done)
+        self.loadingLabel.setText(f'Exported {done}/{total} samples')
+
+    def _on_export_failed(self, message: str):
+        QMessageBox.critical(self, 'Error',
+                             f'Error in exporting samples.\n{message}')
+
+    def _on_cancel_clicked(self):
+        # cancels the task whose progress is shown
+        if self._export is not None:
+            self.cancel_export()
+        else:
+            self.cancel_loading()
+
+    def _on_export_finished(self, file_path: str):
+        if self._export.has_failed:
+            self.status_message.emit('Export failed.')
+        elif self._export.is_cancelled:
+            self.status_message.emit(
+                f'Export cancelled, {file_path} is incomplete.')
+        else:
+            self.status_message.emit(f'Exported samples to {file_path}.')
+
+        self._export.deleteLater()
+        self._export = self._export_path = None
+
+        # back to the progress of the loader, if any
+        self.loadingWidget.setVisible(self.is_loading)
+        if self.is_loading:
+            cancelled = self._loader.is_cancelled
+            self.loadingLabel.setText('Cancelling...' if cancelled
+                                      else 'Loading...')
+            self.loadingProgress.setRange(0, 0)
+            self.cancelButton.setEnabled(not cancelled)
+
+    def _on_samples_refreshed(self, samples: SampleStore):
+        self._table_model.append_samples(samples)
+        self.status_message.emit(
+            f'Added {len(samples)} new samples, '
+            f'{self._table_model.rowCount()} in total.')
+
+    def _on_refresh_failed(self, message: str):
+        self.status_message.emit(f'Error in refreshing workspace: {message}')
 
     def show_current_img(self):
         raise NotImplementedError
 
     def show_img(self, index: QModelIndex):
-        sample = self._table_model.get_sample(index.row())
+        if not index.isValid():
+            return
+
+        samples, sample_row, reader = self._table_model.sample_at(index.row())
+        if reader is not None:
+            self.widget.show_image(samples, sample_row, reader)
+
+
+def _parse_position(text: str) -> Tuple[str, float]:
+    """ Splits `<line>, <offset>` or `<line> <offset>`. """
+    text = text.strip()
+    parts = text.rsplit(',' if ',' in text else None, 1)
+    if len(parts) != 2 or parts[0].strip() == '':
+        raise ValueError('Expected a line and an offset, e.g. "Line 0, '
+                         '12.5".')
+
+    line, offset = parts[0].strip(), parts[1].strip()
+    try:
+        return line, float(offset)
+    except ValueError:
+        raise ValueError(f'Expected a number instead of "{offset}".') \
+            from None
+
 
-        self.widget.show_image(sample, self._reader)
+def _export(store: SampleStore, rows: np.ndarray, file_path: str, fmt: str,
+            progress):
+    export_samples(store, rows, file_path, fmt, progress=progress)
@@ -1,10 +1,12 @@
 import logging
+from functools import partial
 from os import path
 
-from PyQt5.QtWidgets import QMainWindow, QFileDialog
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QMainWindow, QFileDialog, QLabel, QWidget
 
-from .main_widget import MainWidget
-from ..data import WorkspaceReader, ZipReader
+from .loader import ReaderLoader
+from .. import profiling, startup
 from ..generated.main_window_ui import Ui_MainWindow
 from ..settings import app
 
@@ -12,13 +14,28 @@ log = logging.getLogger(__name__)
 
 
 class MainWindow(Ui_MainWindow, QMainWindow):
+    # stage and timings of a profiled stage, from any thread
+    stage_timed = pyqtSignal(str, object)
+
     def __init__(self):
         super().__init__()
         self.setupUi(self)
 
+        self._stage_labels = dict()
+        if profiling.is_enabled():
+            for stage in ('load', 'frame'):
+                self._stage_labels[stage] = QLabel(self.statusbar)
+                self.statusbar.addPermanentWidget(self._stage_labels[stage])
+            self.stage_timed.connect(self.show_stage_timings)
+            profiling.add_listener(self._emit_stage_timed)
+
         self.actionLoad_zip.triggered.connect(self.load_zip)
         self.actionLoad_Workspace.triggered.connect(self.load_workspace)
+        self.actionOpen_Session.triggered.connect(self.open_session)
+        self.actionExport.triggered.connect(self.export_detections)
+        self.actionWatch_Workspace.toggled.connect(self.watch_workspace)
         self.tabWidget.tabCloseRequested.connect(self.close_tab)
+        self.tabWidget.currentChanged.connect(self.update_menu_state)
 
     def load_zip(self):
         zip_file, ok = QFileDialog.getOpenFileName(
@@ -29,11 +46,12 @@ class MainWindow(Ui_MainWindow, QMainWindow):
             return
 
         app.current_dir = zip_file
-        new_widget = MainWidget(ZipReader(zip_file), self.tabWidget)
-        filename = path.split(zip_file)[-1]
 
-        self.tabWidget.addTab(new_widget, filename)
-        self.tabWidget.setCurrentWidget(new_widget)
+        from ..data import ZipReader
+        self.add_tab(ReaderLoader(partial(ZipReader, zip_file,
+                                          use_mmap=app.mmap_archives),
+                                  app.parse_workers),
+                     path.split(zip_file)[-1])
 
     def load_workspace(self):
         workspace_path = QFileDialog.getExistingDirectory(
@@ -45,14 +63,106 @@ class MainWindow(Ui_MainWindow, QMainWindow):
 
         app.current_dir = workspace_path
 
-        new_widget = MainWidget(WorkspaceReader(workspace_path),
-                                self.tabWidget)
+        from ..data import WorkspaceReader
+        self.add_tab(ReaderLoader(partial(WorkspaceReader, workspace_path),
+                                  app.parse_workers),
+                     path.split(workspace_path)[-1])
+
+    def open_session(self):
+        """
+        Opens several archives in a single tab, with their samples merged
+        into one table.
+        """
+        zip_files, _ = QFileDialog.getOpenFileNames(
+            self, 'Select .zip files', app.current_dir, '*.zip')
+
+        if zip_files is None or len(zip_files) == 0:
+            log.debug('No .zip files selected.')
+            return
+
+        app.current_dir = zip_files[0]
+
+        from ..data import ZipReader
+        loaders = [(path.split(o)[-1],
+                    ReaderLoader(partial(ZipReader, o,
+                                         use_mmap=app.mmap_archives),
+                                 app.parse_workers))
+                   for o in zip_files]
+
+        startup.finish()
+        from .session_widget import SessionWidget
 
-        self.tabWidget.addTab(new_widget, path.split(workspace_path)[-1])
+        new_widget = SessionWidget(parent=self.tabWidget)
+        self._add_widget(new_widget, f'Session of {len(loaders)} archives')
+        new_widget.load_session(loaders)
+
+    def add_tab(self, loader: ReaderLoader, title: str):
+        """
+        Adds a tab right away and loads its samples in the background.
+        """
+        # the widgets are imported by the warmup, unless it is still running
+        startup.finish()
+        from .main_widget import MainWidget
+
+        new_widget = MainWidget(parent=self.tabWidget)
+        self._add_widget(new_widget, title)
+        new_widget.load(loader)
+
+    def _add_widget(self, new_widget: QWidget, title: str):
+        new_widget.status_message.connect(
+            lambda msg: self.statusbar.showMessage(f'{title}: {msg}'))
+        new_widget.state_changed.connect(self.update_menu_state)
+
+        self.tabWidget.addTab(new_widget, title)
         self.tabWidget.setCurrentWidget(new_widget)
 
     def close_tab(self, index: int):
-        self.tabWidget.removeTab(index)
+        widget = self.tabWidget.widget(index)
+        widget.dispose()
 
-    def update_menu_state(self):
-        pass
+        self.tabWidget.removeTab(index)
+        widget.deleteLater()
+
+    def export_detections(self):
+        widget = self.tabWidget.currentWidget()
+        if widget is not None:
+            widget.export_samples()
+
+    def watch_workspace(self, enabled: bool):
+        widget = self.tabWidget.currentWidget()
+        if widget is not None and widget.is_watching != enabled:
+            widget.set_watching(enabled)
+
+    def show_stage_timings(self, stage: str, timings: dict):
+        """ Shows the timings of the last load or frame. """
+        timings = dict(timings)
+        total = timings.pop(stage, None)
+        text = f'{stage}: ' + profiling.format_timings(timings)
+        if total is not None:
+            text = f'{stage} {total * 1000:.0f} ms (' + \
+                profiling.format_timings(timings) + ')'
+
+        self._stage_labels[stage].setText(text)
+
+    def closeEvent(self, event):
+        profiling.remove_listener(self._emit_stage_timed)
+        super().closeEvent(event)
+
+    def _emit_stage_timed(self, stage: str, timings: dict):
+        # called from the thread of the span
+        try:
+            self.stage_timed.emit(stage, timings)
+        except RuntimeError:
+            pass
+
+    def update_menu_state(self, *_):
+        widget = self.tabWidget.currentWidget()
+
+        self.actionExport.setEnabled(widget is not None and widget.can_export)
+        self.actionWatch_Workspace.setEnabled(
+            widget is not None and widget.can_watch)
+        # reflect the state of the current tab without toggling it
+        self.actionWatch_Workspace.blockSignals(True)
+        self.actionWatch_Workspace.setChecked(
+            widget is not None and widget.is_watching)
+        self.actionWatch_Workspace.blockSignals(False)
@@ -2,17 +2,27 @@ import logging
 from typing import Optional, List
 
 import numpy as np
-from PIL import Image
+from PyQt5.QtCore import QRectF
 from PyQt5.QtGui import QPen, QColorConstants as QColor, QBrush
 from PyQt5.QtWidgets import QWidget, QMessageBox
-from pyqtgraph import ImageItem, GraphicsView, ViewBox, PlotDataItem, TextItem
+from pyqtgraph import ImageItem, GraphicsView, ViewBox, PlotCurveItem, TextItem
 
-from .table_model import Sample
-from ..data import ZipReader
+from ..data import Reader, SampleStore
+from ..images import ImagePrefetcher, ImagePyramid, image_cache, \
+    load_image
+from ..profiling import span
+from ..settings import app
 from ..utils import run_in_main_thread
 
 log = logging.getLogger(__name__)
 
+# full resolution regions are snapped to a grid of this size, so that small
+# pans do not upload a new region
+TILE_SIZE = 512
+# maximum number of box labels shown at once, the labels of the highest
+# scoring boxes in view are shown
+MAX_LABELS = 50
+
 
 class PlotWidget(GraphicsView):
     def __init__(self, parent: Optional[QWidget] = None):
@@ -25,54 +35,181 @@ class PlotWidget(GraphicsView):
 
         self.item: ImageItem = ImageItem(axisOrder='row-major')
 
-        self.boxes: List[PlotDataItem] = list()
         self.labels: List[TextItem] = list()
 
         self.pen_red = QPen(QColor.Red, 4)
 
         self.vb.addItem(self.item)
 
+        # all boxes of a frame are drawn as a single path
+        self.boxes = PlotCurveItem(pen=self.pen_red)
+        self.vb.addItem(self.boxes)
+
+        self._boxes = np.empty((0, 4), dtype=np.int64)
+        self._label_texts = np.empty(0, dtype=object)
+        self._scores = np.empty(0)
+        self._label_key: Optional[tuple] = None
+
+        self.lod_enabled = app.lod_rendering
+        self._pyramid: Optional[ImagePyramid] = None
+        self._lod_key: Optional[tuple] = None
+        self._lod_levels: Optional[tuple] = None
+        self.vb.sigRangeChanged.connect(self.update_lod)
+        self.vb.sigResized.connect(self.update_lod)
+        self.vb.sigRangeChanged.connect(self.update_labels)
+
+        # images being prefetched are waited for rather than decoded again
+        self.prefetcher: Optional[ImagePrefetcher] = None
+        # whether the first paint of the frame shown is still to be timed
+        self._paint_pending = False
+
     @run_in_main_thread
-    def show_image(self, sample: Sample, reader: ZipReader):
-        try:
-            image = Image.open(reader.open(sample.filepath))
-        except OSError as e:
-            QMessageBox.critical(
-                self, 'Error',
-                f'Error in loading image from {sample.filepath}\n{e}')
+    def show_image(self, samples: SampleStore, row: int, reader: Reader):
+        filepath = samples.value(row, 'filepath')
+        with span('frame', 'frame', file=filepath):
+            try:
+                with span('load_image', 'frame'):
+                    image = load_image(reader, filepath,
+                                       prefetcher=self.prefetcher)
+            except OSError as e:
+                QMessageBox.critical(
+                    self, 'Error',
+                    f'Error in loading image from {filepath}\n{e}')
+                return
+            log.debug(f'Image cache: {image_cache.stats()}')
+
+            with span('set_image', 'frame'):
+                self.set_image(image)
+
+            with span('draw_boxes', 'frame'):
+                self.draw_boxes(samples, row)
+            self._paint_pending = True
+
+    def paintEvent(self, event):
+        # the first paint after show_image is added to the timings of the
+        # frame shown, later ones are not part of showing it
+        if not self._paint_pending:
+            super().paintEvent(event)
             return
 
-        self.item.setImage(np.asarray(image))
+        self._paint_pending = False
+        with span('paint', 'frame'):
+            super().paintEvent(event)
 
-        self.draw_boxes(sample)
+    def set_image(self, image: np.ndarray):
+        if not self.lod_enabled:
+            self._pyramid = None
+            self.item.setImage(image)
+            return
 
-    def draw_boxes(self, sample: Sample):
-        if sample.num_detections > len(self.boxes):
-            self.create_boxes(sample.num_detections - len(self.boxes))
+        self._pyramid = ImagePyramid(image)
+        self._lod_key = None
+        self._lod_levels = self._pyramid.value_range()
+        self.update_lod()
+
+    def update_lod(self, *_):
+        """
+        Shows the pyramid level matching the current zoom. At full
+        resolution, only the visible region of the image is uploaded.
+        """
+        if self._pyramid is None:
+            return
 
-        i = 0
-        for i in range(sample.num_detections):
-            box = np.array(sample.bbox[i].to_coords())
-            label = sample.bbox[i].cls
-            score = sample.bbox[i].score
+        height, width = self._pyramid.shape[:2]
+        if self._lod_key is None:
+            # a new image, fit it into the view
+            view_width = max(self.vb.width(), 1)
+            view_height = max(self.vb.height(), 1)
+            pixel_size = max(width / view_width, height / view_height)
+        else:
+            pixel_size = min(self.vb.viewPixelSize())
+
+        level = self._pyramid.level_for_pixel_size(pixel_size)
+        if level > 0 or self._lod_key is None:
+            x0, y0, x1, y1 = 0, 0, width, height
+        else:
+            view = self.vb.viewRect()
+            x0 = int(np.clip(view.left() // TILE_SIZE * TILE_SIZE, 0, width))
+            y0 = int(np.clip(view.top() // TILE_SIZE * TILE_SIZE, 0, height))
+            x1 = int(np.clip(-(-view.right() // TILE_SIZE) * TILE_SIZE,
+                             0, width))
+            y1 = int(np.clip(-(-view.bottom() // TILE_SIZE) * TILE_SIZE,
+                             0, height))
+            if x1 <= x0 or y1 <= y0:
+                return
+
+        key = (level, x0, y0, x1, y1)
+        if key == self._lod_key:
+            return
+        self._lod_key = key
+
+        if level > 0:
+            region = self._pyramid.level(level)
+        else:
+            region = self._pyramid.image[y0:y1, x0:x1]
+
+        self.item.setImage(region, autoLevels=False, levels=self._lod_levels)
+        self.item.setRect(QRectF(x0, y0, x1 - x0, y1 - y0))
+
+    def draw_boxes(self, samples: SampleStore, row: int):
+        boxes = samples.boxes(row)
+        num_detections = len(boxes)
+
+        # closed polygons of the boxes, one after the other, with the last
+        # point of every box not connected to the first one of the next
+        x0, x1, y0, y1 = boxes.T
+        x = np.stack([x0, x1, x1, x0, x0], axis=1).ravel()
+        y = np.stack([y0, y0, y1, y1, y0], axis=1).ravel()
+        connect = np.ones(5 * num_detections, dtype=np.int32)
+        connect[4::5] = 0
+
+        if num_detections > 0:
+            self.boxes.setData(x.astype(float), y.astype(float),
+                               connect=connect)
+        else:
+            self.boxes.clear()
+
+        self._boxes = boxes
+        self._scores = samples.scores(row)
+        self._label_texts = np.array(
+            [f'{c}: {s:.3f}' for c, s in zip(samples.classes(row),
+                                              self._scores)], dtype=object)
+        self._label_key = None
+        self.update_labels()
+
+    def update_labels(self, *_):
+        """
+        Labels the boxes in view. When more boxes than MAX_LABELS are in
+        view, only the highest scoring ones are labelled.
+        """
+        view = self.vb.viewRect()
+        x0, x1, y0, y1 = self._boxes.T
+        in_view = np.flatnonzero((x1 >= view.left()) & (x0 <= view.right())
+                                 & (y1 >= view.top()) & (y0 <= view.bottom()))
+        if len(in_view) > MAX_LABELS:
+            best = np.argsort(-self._scores[in_view],
+                              kind='stable')[:MAX_LABELS]
+            in_view = np.sort(in_view[best])
+
+        key = tuple(in_view)
+        if key == self._label_key:
+            return
+        self._label_key = key
 
-            text = f'{label}: {score:.3f}'
+        if len(in_view) > len(self.labels):
+            self.create_labels(len(in_view) - len(self.labels))
 
-            self.boxes[i].setData(box)
-            self.labels[i].setText(text)
-            self.labels[i].setPos(sample.bbox[i].x0, sample.bbox[i].y1 + 10)
-            self.labels[i].setVisible(True)
+        for label, i in zip(self.labels, in_view):
+            label.setText(self._label_texts[i])
+            label.setPos(float(x0[i]), float(y1[i] + 10))
+            label.setVisible(True)
 
-        for j in range(i + 1, len(self.boxes)):
-            self.boxes[j].clear()
-            self.labels[j].setVisible(False)
+        for label in self.labels[len(in_view):]:
+            label.setVisible(False)
 
-    def create_boxes(self, num_boxes: int):
-        for _ in range(num_boxes):
-            self.boxes.append(
-                PlotDataItem(pen=self.pen_red, connect='all', ))
+    def create_labels(self, num_labels: int):
+        for _ in range(num_labels):
             self.labels.append(TextItem(color=QColor.Black, fill=QColor.Red))
             self.labels[-1].fill = QBrush(QColor.Red)
 
-            self.vb.addItem(self.boxes[-1])
             self.vb.addItem(self.labels[-1])
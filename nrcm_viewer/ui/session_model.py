@@ -0,0 +1,242 @@
+import logging
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QObject, Qt
+
+from ..data import Reader, SampleStore
+from ..export import sample_frame
+from ..filtering import SampleFilter, StoreColumns
+from ..profiling import timed
+from ..session import POSITION, merge, merge_chunks
+from .table_model import COLUMN_TO_ATTR, HEADER
+
+log = logging.getLogger(__name__)
+
+# rows merged per call to fetchMore
+CHUNK_SIZE = 10000
+# offsets are only comparable on the same line, so these columns sort by
+# track position
+POSITION_ATTRS = ('line_name', 'line_offset')
+
+
+class SessionModel(QAbstractTableModel):
+    """
+    Table of the samples of several readers, e.g. the archives of a week of
+    runs, merged into one order, by timestamp unless sorted by a column.
+
+    The stores of the readers, the members of the session, are never
+    concatenated. The table is a lazy k-way merge of the sorted rows of
+    every store, see `session.merge`, of which a chunk is materialized as
+    (member, row) pairs per call to fetchMore. Use `sample_at` to map a row
+    of the table to its store, row of the store and reader.
+    """
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+
+        self._names: List[str] = list()
+        self._readers: List[Reader] = list()
+        self._columns: List[StoreColumns] = list()
+
+        self._order = 'timestamp'
+        self._descending = False
+        self._filter: Optional[SampleFilter] = None
+        self._masks: Optional[List[np.ndarray]] = None
+
+        self._merged: Optional[Iterator[Tuple[np.ndarray, np.ndarray]]] = \
+            None
+        # members and rows of the stores of the rows merged so far, over-
+        # allocated as in SampleStore
+        self._members = np.empty(0, dtype=np.int64)
+        self._rows = np.empty(0, dtype=np.int64)
+        self._length = 0
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    @property
+    def readers(self) -> List[Reader]:
+        return list(self._readers)
+
+    @property
+    def num_samples(self) -> int:
+        return sum(len(o.store) for o in self._columns)
+
+    @property
+    def num_matching(self) -> int:
+        """ Number of samples matching the filter, merged or not. """
+        if self._masks is None:
+            return self.num_samples
+        return sum(int(o.sum()) for o in self._masks)
+
+    @property
+    def sample_filter(self) -> Optional[SampleFilter]:
+        return self._filter
+
+    @timed('model_reset', 'load')
+    def add_member(self, name: str, reader: Reader, samples: SampleStore):
+        """ Adds the samples of a reader, and merges the rows again. """
+        columns = StoreColumns(samples)
+        mask = None
+        if self._filter is not None:
+            try:
+                mask = self._filter.mask(columns)
+            except ValueError as e:
+                log.warning(f'Filter does not apply to {name}: {e}')
+                mask = np.zeros(len(samples), dtype=bool)
+
+        self.beginResetModel()
+        self._names.append(name)
+        self._readers.append(reader)
+        self._columns.append(columns)
+        if self._masks is not None:
+            self._masks.append(mask)
+
+        try:
+            self._restart()
+        except ValueError as e:
+            # e.g. sorted by position and the offsets are not numbers
+            log.warning(f'Cannot sort by {self._order}, sorting by '
+                        f'timestamp: {e}')
+            self._order, self._descending = 'timestamp', False
+            self._restart()
+        self.endResetModel()
+
+    def set_filter(self, sample_filter: Optional[SampleFilter]):
+        """
+        Shows only the samples matching the filter, or all if None. Raises
+        a ValueError, and keeps the previous filter, if the filter cannot be
+        evaluated on the samples of every member.
+        """
+        masks = None
+        if sample_filter is not None:
+            masks = [sample_filter.mask(o) for o in self._columns]
+
+        self.beginResetModel()
+        self._filter, self._masks = sample_filter, masks
+        self._restart()
+        self.endResetModel()
+
+    def sort(self, column: int, order: Qt.SortOrder = ...):
+        """
+        Merges the rows by a column, or by timestamp if < 0. Keeps the
+        previous order if the rows cannot be sorted by the column.
+        """
+        if column < 0:
+            attr, descending = 'timestamp', False
+        else:
+            attr = COLUMN_TO_ATTR[column]
+            descending = order == Qt.SortOrder.DescendingOrder
+        if attr in POSITION_ATTRS:
+            attr = POSITION
+
+        previous = self._order, self._descending
+        self.beginResetModel()
+        self._order, self._descending = attr, descending
+        try:
+            self._restart()
+        except ValueError as e:
+            log.warning(f'Cannot sort by {attr}: {e}')
+            self._order, self._descending = previous
+            self._restart()
+        self.endResetModel()
+
+    def member_at(self, row: int) -> Tuple[int, int]:
+        """ Returns the member and the row of its store of a row. """
+        return int(self._members[row]), int(self._rows[row])
+
+    def sample_at(self, row: int) -> Tuple[SampleStore, int, Optional[Reader]]:
+        """
+        Returns the store, the row of the store and the reader of the images
+        of a row of the table.
+        """
+        member, sample_row = self.member_at(row)
+        return (self._columns[member].store, sample_row,
+                self._readers[member])
+
+    def frame(self, rows: np.ndarray, attrs: Sequence[str]) -> pd.DataFrame:
+        """ Returns a dataframe with the attributes of rows of the table. """
+        rows = np.asarray(rows, dtype=np.int64)
+        members = self._members[rows]
+
+        frames = list()
+        for member in np.unique(members).tolist():
+            selected = members == member
+            frame = sample_frame(self._columns[member].store,
+                                 self._rows[rows[selected]], attrs)
+            frame.index = np.flatnonzero(selected)
+            frames.append(frame)
+
+        if len(frames) == 0:
+            return pd.DataFrame({attr: [] for attr in attrs})
+
+        return pd.concat(frames).sort_index()
+
+    def _restart(self):
+        self._merged = merge_chunks(
+            merge(self._columns, self._order, self._masks, self._descending),
+            CHUNK_SIZE)
+        self._length = 0
+        # the first chunk right away, so that the view has rows to show
+        chunk = self._next_chunk()
+        if chunk is not None:
+            self._append(*chunk)
+
+    def _next_chunk(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        try:
+            return next(self._merged)
+        except StopIteration:
+            self._merged = None
+            return None
+
+    def _append(self, members: np.ndarray, rows: np.ndarray):
+        required = self._length + len(rows)
+        if required > len(self._rows):
+            capacity = max(required, 2 * len(self._rows))
+            self._members = np.resize(self._members, capacity)
+            self._rows = np.resize(self._rows, capacity)
+
+        self._members[self._length:required] = members
+        self._rows[self._length:required] = rows
+        self._length = required
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        if parent.isValid():
+            return False
+        return self._merged is not None
+
+    @timed('model_append', 'load')
+    def fetchMore(self, parent: QModelIndex):
+        if parent.isValid() or self._merged is None:
+            return
+
+        chunk = self._next_chunk()
+        if chunk is None:
+            return
+
+        first = self._length
+        self.beginInsertRows(QModelIndex(), first, first + len(chunk[1]) - 1)
+        self._append(*chunk)
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role: int = ...) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole:
+            samples, sample_row, _ = self.sample_at(index.row())
+            return samples.value(sample_row, COLUMN_TO_ATTR[index.column()])
+
+    def rowCount(self, parent: QModelIndex = ...) -> int:
+        return self._length
+
+    def columnCount(self, parent: QModelIndex = ...) -> int:
+        return len(HEADER)
+
+    def headerData(self, section: int,
+                   orientation: Qt.Orientation, role: int = ...) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return HEADER[section]
+            elif orientation == Qt.Vertical:
+                member, sample_row = self.member_at(section)
+                return f'{self._names[member]}: {sample_row}'
@@ -0,0 +1,111 @@
+import logging
+from functools import partial
+from typing import List, Optional, Sequence, Tuple
+
+from PyQt5.QtWidgets import QWidget
+
+from .loader import ReaderLoader
+from .main_widget import MainWidget
+from .session_model import SessionModel
+from ..data import Reader, SampleStore
+
+log = logging.getLogger(__name__)
+
+
+class SessionWidget(MainWidget):
+    """
+    The samples of several archives or workspaces in one table, merged by
+    timestamp or track position, see SessionModel. Images are loaded from
+    the reader of every row.
+
+    The readers are loaded one after the other, and every one is added to
+    the table once it is loaded.
+    """
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent=parent)
+
+        self._pending: List[Tuple[str, ReaderLoader]] = list()
+        self._num_readers = 0
+        # reader and samples of the current loader
+        self._member_reader: Optional[Reader] = None
+        self._member_samples: Optional[SampleStore] = None
+
+        # going to a position needs a single position index
+        self.gotoEdit.setVisible(False)
+
+    def _create_model(self) -> SessionModel:
+        return SessionModel(parent=self)
+
+    def load_session(self, loaders: Sequence[Tuple[str, ReaderLoader]]):
+        """ Loads the samples of the named loaders in the background. """
+        self._pending = list(loaders)
+        self._num_readers = len(self._pending)
+        self.loadingWidget.setVisible(True)
+
+        self._load_next()
+
+    @property
+    def can_export(self) -> bool:
+        return False
+
+    def export_samples(self):
+        self.status_message.emit('Sessions cannot be exported, export the '
+                                 'archives one by one.')
+
+    def cancel_loading(self):
+        self._pending.clear()
+        super().cancel_loading()
+
+    def _load_next(self):
+        if len(self._pending) == 0:
+            self.loadingWidget.setVisible(False)
+            self.status_message.emit(
+                f'Loaded {self._table_model.num_samples} samples of '
+                f'{len(self._table_model.names)} archives.')
+            self.state_changed.emit()
+            return
+
+        name, loader = self._pending.pop(0)
+        self._loader = loader
+        self._member_reader = None
+        self._member_samples = SampleStore()
+        loader.setParent(self)
+
+        loader.reader_ready.connect(self._on_reader_ready)
+        loader.samples_loaded.connect(self._on_member_samples)
+        loader.progress.connect(partial(self._on_member_progress, name))
+        loader.failed.connect(self._on_load_failed)
+        loader.finished.connect(partial(self._on_member_finished, name))
+
+        self.loadingLabel.setText(f'Indexing {name}...')
+        self.loadingProgress.setRange(0, 0)
+        self.cancelButton.setEnabled(True)
+
+        loader.start()
+
+    def _on_reader_ready(self, reader: Reader):
+        self._member_reader = reader
+
+    def _on_member_samples(self, samples: SampleStore):
+        self._member_samples.extend(samples)
+
+    def _on_member_progress(self, name: str, done: int, total: int,
+                            rows: int):
+        self.loadingProgress.setRange(0, total)
+        self.loadingProgress.setValue(done)
+        number = self._num_readers - len(self._pending)
+        self.loadingLabel.setText(
+            f'{name} ({number}/{self._num_readers}): parsed {done}/{total} '
+            f'CSV files, {rows} samples')
+
+    def _on_member_finished(self, name: str):
+        # the samples loaded before a failure or cancellation are kept
+        if self._member_reader is not None and len(self._member_samples) > 0:
+            self._table_model.add_member(name, self._member_reader,
+                                         self._member_samples)
+
+        self._loader.deleteLater()
+        self._loader = None
+        self._member_reader = self._member_samples = None
+
+        self._load_next()
@@ -1,10 +1,15 @@
 import logging
-from typing import Optional, Any, List
+from typing import Optional, Any, Sequence, Tuple
 
-from PyQt5.QtCore import QAbstractTableModel, QObject, QModelIndex, Qt
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QAbstractTableModel, QObject, QModelIndex, Qt, QTimer
 from PyQt5.QtWidgets import QAction, QTableView, QApplication
 
-from ..data import Sample
+from ..data import Reader, Sample, SampleStore
+from ..export import sample_frame, to_text
+from ..filtering import SampleFilter, StoreColumns
+from ..profiling import timed
 
 log = logging.getLogger(__name__)
 
@@ -16,38 +21,241 @@ HEADER_TO_ATTR = {
     'Timestamp': 'timestamp',
     'Channel ID': 'channel_id'
 }
+COLUMN_TO_ATTR = [HEADER_TO_ATTR[o] for o in HEADER]
 
 
 class TableModel(QAbstractTableModel):
-    def __init__(self, data: Optional[List[Sample]] = None,
+    """
+    Table of the samples of a SampleStore.
+
+    Sorting and filtering happen in the model: the rows of the table are a
+    permutation of a subset of the rows of the store, computed from cached
+    sort keys and filter masks over whole columns. Use `sample_row` to map
+    a row of the table to a row of the store, or `sample_at` to also get
+    the store and the reader of its image.
+
+    Samples appended with `append_samples`, e.g. by a ReaderLoader as they
+    are parsed, extend the store in place.
+    """
+    def __init__(self, data: Optional[SampleStore] = None,
                  parent: Optional[QObject] = None):
         super().__init__(parent)
 
         if data is None:
-            data = list()
+            data = SampleStore()
+
+        self._data = data
+        self._reader: Optional[Reader] = None
+
+        self._columns = StoreColumns(data)
+        # rows of the store shown in the table, None if all in store order
+        self._order: Optional[np.ndarray] = None
+        self._sort_attr: Optional[str] = None
+        self._descending = False
+        self._filter: Optional[SampleFilter] = None
 
-        self.samples = data
+        # appended rows are sorted in once a burst of appends is over
+        self._resort_timer = QTimer(self)
+        self._resort_timer.setSingleShot(True)
+        self._resort_timer.setInterval(200)
+        self._resort_timer.timeout.connect(self._update_order)
 
     @property
-    def samples(self) -> List[Sample]:
+    def samples(self) -> SampleStore:
         return self._data
 
     @samples.setter
-    def samples(self, new: List[Sample]):
-        self._data = new.copy()
+    @timed('model_reset', 'load')
+    def samples(self, new: SampleStore):
+        self.beginResetModel()
+        self._set_data(new)
+        self._order = self._compute_order()
+        self.endResetModel()
+
+    @property
+    def reader(self) -> Optional[Reader]:
+        """ Reader of the images of the samples. """
+        return self._reader
+
+    @reader.setter
+    def reader(self, reader: Optional[Reader]):
+        self._reader = reader
+
+    @property
+    def num_samples(self) -> int:
+        return len(self._data)
+
+    @property
+    def num_matching(self) -> int:
+        """ Number of samples matching the filter. """
+        return self.rowCount()
+
+    @property
+    def columns(self) -> StoreColumns:
+        return self._columns
+
+    @property
+    def sample_filter(self) -> Optional[SampleFilter]:
+        return self._filter
+
+    @property
+    def rows(self) -> np.ndarray:
+        """ Rows of the store, in the order of the table. """
+        if self._order is None:
+            return np.arange(len(self._data))
+        return self._order
+
+    def sample_row(self, row: int) -> int:
+        """ Returns the row of the store shown in a row of the table. """
+        if self._order is None:
+            return row
+        return int(self._order[row])
+
+    def sample_at(self, row: int) -> Tuple[SampleStore, int, Optional[Reader]]:
+        """
+        Returns the store, the row of the store and the reader of the images
+        of a row of the table.
+        """
+        return self._data, self.sample_row(row), self._reader
+
+    def frame(self, rows: np.ndarray, attrs: Sequence[str]) -> pd.DataFrame:
+        """ Returns a dataframe with the attributes of rows of the table. """
+        return sample_frame(self._data, self.rows[rows], attrs)
+
+    def table_row(self, sample_row: int) -> int:
+        """
+        Returns the row of the table showing a row of the store, or -1 if
+        it is not shown.
+        """
+        if self._order is None:
+            return sample_row if sample_row < len(self._data) else -1
+
+        rows = np.flatnonzero(self._order == sample_row)
+        return int(rows[0]) if len(rows) > 0 else -1
+
+    @timed('model_append', 'load')
+    def append_samples(self, samples: SampleStore):
+        if len(samples) == 0:
+            return
+
+        first = len(self._data)
+        if self._order is None:
+            self.beginInsertRows(QModelIndex(), first,
+                                 first + len(samples) - 1)
+            self._data.extend(samples)
+            self.endInsertRows()
+            return
 
-        self.modelReset.emit()
+        # only the new rows are filtered, they are added at the end and
+        # sorted in later
+        new_rows = np.arange(first, first + len(samples))
+        if self._filter is not None:
+            new_rows = new_rows[self._filter.mask(StoreColumns(samples))]
+
+        self._data.extend(samples)
+        if len(new_rows) > 0:
+            num_rows = len(self._order)
+            self.beginInsertRows(QModelIndex(), num_rows,
+                                 num_rows + len(new_rows) - 1)
+            self._order = np.concatenate([self._order, new_rows])
+            self.endInsertRows()
+
+        if self._sort_attr is not None:
+            self._resort_timer.start()
+
+    def set_filter(self, sample_filter: Optional[SampleFilter]):
+        """
+        Shows only the samples matching the filter, or all if None. Raises
+        a ValueError, and keeps the previous filter, if the filter cannot be
+        evaluated on the samples.
+        """
+        previous, self._filter = self._filter, sample_filter
+        try:
+            self._update_order()
+        except ValueError:
+            self._filter = previous
+            raise
+
+    def sort(self, column: int, order: Qt.SortOrder = ...):
+        """ Sorts by a column, or restores the order of the store if < 0. """
+        if column < 0:
+            self._sort_attr = None
+        else:
+            self._sort_attr = COLUMN_TO_ATTR[column]
+            self._descending = order == Qt.SortOrder.DescendingOrder
+
+        self._update_order()
+
+    def _set_data(self, data: SampleStore):
+        self._data = data
+        self._columns = StoreColumns(data)
+
+    def _compute_order(self) -> Optional[np.ndarray]:
+        if self._sort_attr is None and self._filter is None:
+            return None
+
+        if self._sort_attr is not None:
+            order = self._sort_order(self._sort_attr)
+            if self._descending:
+                order = order[::-1]
+        else:
+            order = np.arange(len(self._data))
+
+        if self._filter is not None:
+            order = order[self._filter.mask(self._columns)[order]]
+
+        return order
+
+    def _sort_order(self, attr: str) -> np.ndarray:
+        # offsets are only comparable on the same line, so samples are
+        # sorted by track position, i.e. line, offset and timestamp
+        if attr == 'line_offset':
+            positions = self._columns.positions()
+            if positions is not None:
+                return positions.rows
+
+        return self._columns.order(attr)
+
+    @timed('update_order')
+    def _update_order(self):
+        """
+        Applies the current sort and filter, keeping persistent indices,
+        e.g. the selection, on the same samples if they are still shown.
+        """
+        self._resort_timer.stop()
+        order = self._compute_order()
+
+        self.layoutAboutToBeChanged.emit()
+
+        persistent = self.persistentIndexList()
+        old_rows = [self.sample_row(o.row()) for o in persistent]
+
+        self._order = order
+
+        if len(persistent) > 0:
+            position = np.full(len(self._data), -1, dtype=np.int64)
+            rows = self.rows
+            position[rows] = np.arange(len(rows))
+
+            self.changePersistentIndexList(persistent, [
+                self.index(int(position[row]), index.column())
+                if position[row] >= 0 else QModelIndex()
+                for row, index in zip(old_rows, persistent)])
+
+        self.layoutChanged.emit()
 
     def data(self, index: QModelIndex, role: int = ...) -> Any:
         if role == Qt.ItemDataRole.DisplayRole:
-            return getattr(self._data[index.row()],
-                           HEADER_TO_ATTR[HEADER[index.column()]])
+            return self._data.value(self.sample_row(index.row()),
+                                    COLUMN_TO_ATTR[index.column()])
 
     def rowCount(self, parent: QModelIndex = ...) -> int:
-        return len(self._data)
+        if self._order is None:
+            return len(self._data)
+        return len(self._order)
 
     def columnCount(self, parent: QModelIndex = ...) -> int:
-        return len(HEADER) if len(self._data) > 0 else 0
+        return len(HEADER)
 
     def headerData(self, section: int,
                    orientation: Qt.Orientation, role: int = ...) -> Any:
@@ -55,10 +263,10 @@ class TableModel(QAbstractTableModel):
             if orientation == Qt.Horizontal:
                 return HEADER[section]
             elif orientation == Qt.Vertical:
-                return f'{section}'
+                return f'{self.sample_row(section)}'
 
     def get_sample(self, row: int) -> Sample:
-        return self._data[row]
+        return self._data.sample(self.sample_row(row))
 
 
 class CopySelectedCellsAction(QAction):
@@ -72,32 +280,24 @@ class CopySelectedCellsAction(QAction):
         self.table = table_widget
 
     def copy_cells_to_clipboard(self):
-        if len(self.table.selectionModel().selectedIndexes()) > 0:
-            # sort select indexes into rows and columns
-            previous = self.table.selectionModel().selectedIndexes()[0]
-            columns = []
-            rows = []
-            for index in self.table.selectionModel().selectedIndexes():
-                if previous.column() != index.column():
-                    columns.append(rows)
-                    rows = []
-                rows.append(index.data())
-                previous = index
-            columns.append(rows)
-
-            # add rows and columns to clipboard
-            clipboard = ""
-            nrows = len(columns[0])
-            ncols = len(columns)
-            for r in range(nrows):
-                for c in range(ncols):
-                    clipboard += columns[c][r]
-                    if c != (ncols - 1):
-                        clipboard += '\t'
-                clipboard += '\n'
-
-            # copy to the system clipboard
-            sys_clip = QApplication.clipboard()
-            sys_clip.setText(clipboard)
-
-            log.debug(f'Copied to clipboard: {clipboard}')
+        selection = self.table.selectionModel().selection()
+        if selection.isEmpty():
+            return
+
+        # the selected cells are copied as the grid of the selected rows and
+        # columns, in the order of the table
+        rows = np.unique(np.concatenate(
+            [np.arange(o.top(), o.bottom() + 1) for o in selection]))
+        columns = sorted({c for o in selection
+                          for c in range(o.left(), o.right() + 1)})
+
+        frame = self.table.model().frame(rows,
+                                         [COLUMN_TO_ATTR[c] for c in columns])
+        clipboard = to_text(frame)
+
+        # copy to the system clipboard
+        sys_clip = QApplication.clipboard()
+        sys_clip.setText(clipboard)
+
+        log.debug(f'Copied {len(rows)} rows and {len(columns)} columns to '
+                  f'clipboard.')
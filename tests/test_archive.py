@@ -0,0 +1,58 @@
+import random
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.bench_zip_concurrency import make_archive
+from nrcm_viewer.archive import MemberStream, ZipMemberReader
+
+
+@pytest.fixture(scope='module')
+def archive(tmp_path_factory) -> str:
+    file_path = str(tmp_path_factory.mktemp('archive') / 'archive.zip')
+    make_archive(file_path, 200, 64 * 1024)
+    return file_path
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_concurrent_reads(archive, use_mmap):
+    with zipfile.ZipFile(archive) as zip_file:
+        infos = zip_file.NameToInfo
+        members = ZipMemberReader(archive, zip_file, use_mmap)
+        names = list(infos) * 2
+        random.Random(0).shuffle(names)
+
+        with ThreadPoolExecutor(8) as executor:
+            crcs = list(executor.map(
+                lambda name: zlib.crc32(members.read_buffer(name)), names))
+        members.close()
+
+    assert crcs == [infos[name].CRC for name in names]
+
+
+def test_stream(archive):
+    with zipfile.ZipFile(archive) as zip_file:
+        members = ZipMemberReader(archive, zip_file)
+        for info in zip_file.infolist()[:4]:
+            stream = MemberStream(members._file, info,
+                                  members.data_offset(info.filename),
+                                  chunk_size=1000)
+            chunks = list(iter(lambda: stream.read(4096), b''))
+            assert b''.join(chunks) == zip_file.read(info.filename)
+        members.close()
+
+
+def test_stream_bad_crc(tmp_path):
+    file_path = str(tmp_path / 'archive.zip')
+    with zipfile.ZipFile(file_path, 'w') as f:
+        f.writestr('member.csv', b'a,b\n1,2\n' * 1000,
+                   compress_type=zipfile.ZIP_DEFLATED)
+
+    with zipfile.ZipFile(file_path) as zip_file:
+        zip_file.getinfo('member.csv').CRC ^= 1
+        members = ZipMemberReader(file_path, zip_file)
+        with pytest.raises(zipfile.BadZipFile):
+            members.stream('member.csv').read()
+        members.close()
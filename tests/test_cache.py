@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_results_frame
+from nrcm_viewer import cache as cache_module
+from nrcm_viewer.cache import ImageCache, IndexCache
+from nrcm_viewer.data import SampleStore, _build_store, _preprocess_df
+
+
+def image(value: int, size: int = 10) -> np.ndarray:
+    """ An image of size * size bytes. """
+    return np.full((size, size), value, dtype=np.uint8)
+
+
+def test_image_cache_evicts_least_recently_used():
+    cache = ImageCache(300)
+    for key in 'abc':
+        cache.put(key, image(ord(key)))
+    # a is used last, so b is evicted first
+    assert cache.get('a')[0, 0] == ord('a')
+
+    cache.put('d', image(0))
+
+    assert 'b' not in cache
+    assert [key in cache for key in 'acd'] == [True] * 3
+    assert cache.nbytes == 300
+    assert cache.stats()['hits'] == 1
+
+
+def test_image_cache_byte_limit():
+    cache = ImageCache(300)
+    cache.put('a', image(0))
+    cache.put('b', image(0))
+    # replacing an image counts its new size only
+    cache.put('a', image(0, 15))
+    assert cache.nbytes == 225
+    assert 'b' not in cache
+
+    # images larger than the cache are not cached
+    cache.put('large', image(0, 20))
+    assert 'large' not in cache
+    assert cache.get('large') is None
+
+    cache.max_bytes = 100
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_image_cache_images_are_read_only():
+    cache = ImageCache(300)
+    cache.put('a', image(0))
+
+    assert not cache.get('a').flags.writeable
+
+
+def make_store() -> SampleStore:
+    """ Samples with line names of mixed types and missing values. """
+    df, files = make_results_frame(6)
+    store = _build_store(_preprocess_df(df), files)
+
+    samples = {attr: store.column(attr) for attr in store.SAMPLE_ATTRS}
+    samples['line_name'] = np.array(['Line 0', 7, np.nan, 2.5, True, None],
+                                    dtype=object)
+    samples['line_id'] = np.array([1, np.nan, 3, 1, 2, 3], dtype=object)
+    return SampleStore(samples, {attr: store.detection_column(attr)
+                                 for attr in store.DETECTION_ATTRS},
+                       store.offsets)
+
+
+def assert_columns_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, column in expected.items():
+        assert actual[key].dtype.kind == column.dtype.kind \
+            or column.dtype == object, key
+        for a, e in zip(actual[key].tolist(), column.tolist()):
+            if pd.isna(e) is True:
+                assert pd.isna(a) is True, key
+            else:
+                assert (a, type(a)) == (e, type(e)), key
+
+
+def test_index_cache_round_trip(tmp_path):
+    store = make_store()
+    index = {'csv_files': ['a/results.csv'], 'dir_to_file': {'a': {}}}
+    IndexCache('/data/a.zip', {'size': 1}, str(tmp_path)).save(
+        index, store.to_arrays())
+
+    cached_index, arrays = IndexCache('/data/a.zip', {'size': 1},
+                                      str(tmp_path)).load()
+
+    assert cached_index == index
+    assert_columns_equal(SampleStore.from_arrays(arrays).to_arrays(),
+                         store.to_arrays())
+    # an entry of another key is stale
+    assert IndexCache('/data/a.zip', {'size': 2},
+                      str(tmp_path)).load() is None
+
+
+def test_index_cache_refuses_other_types(tmp_path):
+    store = make_store()
+    store.column('line_name')[0] = b'Line 0'
+    entry = IndexCache('/data/a.zip', {'size': 1}, str(tmp_path))
+
+    entry.save({}, store.to_arrays())
+
+    assert entry.load() is None
+
+
+def test_reader_samples_from_cache(tmp_path, monkeypatch):
+    from benchmarks.synthetic import write_dataset
+    from nrcm_viewer.data import WorkspaceReader
+
+    monkeypatch.setattr(cache_module, 'CACHE_DIR', str(tmp_path / 'cache'))
+    workspace = write_dataset(str(tmp_path / 'workspace'), 2, 10,
+                              image_size=(16, 64))
+    reader = WorkspaceReader(workspace)
+    stores = list(reader.iter_samples())
+    # memoized once iterated
+    assert reader._samples is not None
+
+    cached = WorkspaceReader(workspace)
+
+    assert cached._cached_arrays is not None
+    assert_columns_equal(cached.samples.to_arrays(),
+                         SampleStore.concat(stores).to_arrays())
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_results_frame
+from nrcm_viewer.data import SampleStore, _build_store, _preprocess_df
+from nrcm_viewer.export import BOX_COLUMNS, RH_BOX_COLUMNS, \
+    detection_frame, export_samples, format_of
+
+
+def make_store(num_frames: int = 20) -> SampleStore:
+    df, files = make_results_frame(num_frames)
+    return _build_store(_preprocess_df(df), files)
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'tsv'])
+def test_export_text_in_chunks(tmp_path, fmt):
+    store = make_store()
+    rows = np.array([3, 0, 7, 8, 15])
+    file_path = str(tmp_path / f'export.{fmt}')
+
+    export_samples(store, rows, file_path, chunk_size=2)
+
+    exported = pd.read_csv(file_path, sep=',' if fmt == 'csv' else '\t')
+    expected = detection_frame(store, rows)
+    assert list(exported.columns) == list(expected.columns)
+    assert len(exported) == 3 * len(rows)
+    np.testing.assert_array_equal(exported['FAULT_UUID'],
+                                  expected['FAULT_UUID'])
+    for name in BOX_COLUMNS + RH_BOX_COLUMNS:
+        np.testing.assert_array_equal(exported[name], expected[name])
+    np.testing.assert_allclose(exported['DEFECT_SCORE'],
+                               expected['DEFECT_SCORE'])
+
+
+def test_export_empty_and_aborted(tmp_path):
+    store = make_store()
+    file_path = str(tmp_path / 'export.csv')
+
+    export_samples(store, np.empty(0, dtype=np.int64), file_path)
+    assert len(pd.read_csv(file_path)) == 0
+
+    calls = list()
+    export_samples(store, np.arange(10), file_path, chunk_size=4,
+                   progress=lambda done, total: calls.append(done) or False)
+    # aborted after the first chunk
+    assert calls == [4]
+    assert len(pd.read_csv(file_path)) == 4 * 3
+
+
+def test_export_parquet_schema_of_whole_columns(tmp_path):
+    pytest.importorskip('pyarrow')
+    store = make_store()
+    # the first chunk only has missing line names, later ones mix types
+    names = np.full(len(store), np.nan, dtype=object)
+    names[10:] = 'Line 1'
+    names[12] = 7
+    samples = {attr: store.column(attr) for attr in store.SAMPLE_ATTRS}
+    store = SampleStore(dict(samples, line_name=names),
+                        {attr: store.detection_column(attr)
+                         for attr in store.DETECTION_ATTRS}, store.offsets)
+    file_path = str(tmp_path / 'export.parquet')
+
+    export_samples(store, np.arange(len(store)), file_path, chunk_size=5)
+
+    exported = pd.read_parquet(file_path)
+    assert len(exported) == 3 * len(store)
+    assert exported['LINE_NAME'].isna().sum() == 3 * 10
+    assert exported['LINE_NAME'].dropna().tolist() == \
+        ['Line 1'] * 6 + ['7'] * 3 + ['Line 1'] * 21
+    np.testing.assert_array_equal(exported['FAULT_X0_RH'],
+                                  store.detection_column('boxes_rh')[:, 0])
+
+
+def test_format_of():
+    assert format_of('a/b.TSV') == 'tsv'
+    with pytest.raises(ValueError):
+        format_of('a/b.xlsx')
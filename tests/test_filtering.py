@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_results_frame
+from nrcm_viewer.data import SampleStore, _build_store, _preprocess_df
+from nrcm_viewer.filtering import PositionIndex, SampleFilter, \
+    StoreColumns
+
+
+def make_store(num_frames: int = 2500) -> SampleStore:
+    """ Samples on three lines, in shuffled order. """
+    df, files = make_results_frame(num_frames)
+    df = df.sample(frac=1, random_state=0).reset_index(drop=True)
+    return _build_store(_preprocess_df(df), files)
+
+
+@pytest.fixture(scope='module')
+def store() -> SampleStore:
+    return make_store()
+
+
+def filter_mask(store: SampleStore, text: str) -> np.ndarray:
+    return SampleFilter(text).mask(StoreColumns(store))
+
+
+def test_filter_line_and_offsets(store):
+    # answered by the position index, and by a scan with a term it cannot
+    # answer
+    text = 'line == "Line 1" and offset >= 600 and offset < 700'
+    indexed = filter_mask(store, text)
+    scanned = filter_mask(store, text + ' and detections >= 0')
+
+    offsets = store.column('line_offset').astype(float)
+    expected = (store.column('line_name') == 'Line 1') & \
+        (offsets >= 600) & (offsets < 700)
+    assert expected.sum() == 200
+    np.testing.assert_array_equal(indexed, expected)
+    np.testing.assert_array_equal(scanned, expected)
+
+
+def test_filter_detection_terms_hold_for_one_detection(store):
+    mask = filter_mask(store, 'class == crack and score > 0.5')
+
+    expected = [bool(np.any((store.classes(row) == 'crack')
+                            & (store.scores(row) > 0.5)))
+                for row in range(len(store))]
+    np.testing.assert_array_equal(mask, expected)
+    # not the samples with a crack and another detection above 0.5
+    assert mask.sum() < (filter_mask(store, 'class == crack')
+                         & filter_mask(store, 'score > 0.5')).sum()
+
+
+def test_filter_unquoted_values_and_contains(store):
+    np.testing.assert_array_equal(
+        filter_mask(store, 'line == Line 2 and channel == 0'),
+        store.column('line_name') == 'Line 2')
+    np.testing.assert_array_equal(
+        filter_mask(store, 'line ~ "ne 0"'),
+        store.column('line_name') == 'Line 0')
+
+
+@pytest.mark.parametrize('text', [
+    'speed > 3',
+    'score 0.5',
+    'score >',
+    'score > high',
+    'score > 0.5 and',
+    'line == a == b',
+])
+def test_filter_rejects_invalid_expressions(store, text):
+    with pytest.raises(ValueError):
+        filter_mask(store, text)
+
+
+def test_position_query_in_track_order(store):
+    index = PositionIndex(StoreColumns(store))
+
+    rows = index.query('Line 1', 600, 700, ['crack'])
+
+    offsets = store.column('line_offset').astype(float)
+    expected = np.flatnonzero(
+        (store.column('line_name') == 'Line 1') & (offsets >= 600)
+        & (offsets <= 700)
+        & [bool(np.any(store.classes(row) == 'crack'))
+           for row in range(len(store))])
+    assert sorted(rows.tolist()) == expected.tolist()
+    assert np.all(np.diff(offsets[rows]) >= 0)
+    # lines are also looked up by id
+    np.testing.assert_array_equal(index.query('101', 600, 700, ['crack']),
+                                  rows)
+
+
+def test_position_locate_closest(store):
+    index = PositionIndex(StoreColumns(store))
+
+    row = index.locate('Line 2', 1100.3)
+
+    assert store.value(row, 'line_name') == 'Line 2'
+    assert float(store.value(row, 'line_offset')) == 1100.5
+    # offsets beyond the line snap to its last sample
+    row = index.locate('Line 0', 1e9)
+    assert float(store.value(row, 'line_offset')) == 499.5
+    with pytest.raises(ValueError):
+        index.locate('Line 9', 0)
@@ -0,0 +1,86 @@
+import csv
+import io
+import os
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmarks.synthetic import write_dataset
+from nrcm_viewer.crops import MANIFEST_COLUMNS, MANIFEST_NAME, crop_region, \
+    export_crops
+from nrcm_viewer.data import ZipReader
+from nrcm_viewer.frames import batched, iter_frames, map_batches
+
+
+def pid_and_sum(batch):
+    return os.getpid(), sum(batch)
+
+
+def no_setup():
+    pass
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_map_batches_in_order(workers):
+    batches = list(batched(range(100), 7))
+    assert [len(o) for o in batches] == [7] * 14 + [2]
+
+    results = list(map_batches(pid_and_sum, batches, workers, no_setup))
+
+    assert [o[1] for o in results] == [sum(o) for o in batches]
+    in_process = {o[0] for o in results} == {os.getpid()}
+    assert in_process == (workers == 1)
+
+
+@pytest.fixture(scope='module')
+def archive(tmp_path_factory) -> str:
+    return write_dataset(str(tmp_path_factory.mktemp('frames') /
+                             'archive.zip'), 2, 8, image_size=(64, 256))
+
+
+def test_iter_frames_only_passing_detections(archive):
+    reader = ZipReader(archive, use_cache=False)
+
+    frames = list(iter_frames(reader, ['crack', 'squat'], 0.3,
+                              ('cls', 'score'), ('line_offset',)))
+
+    samples = reader.samples
+    expected = list()
+    for row in range(len(samples)):
+        passing = np.isin(samples.classes(row), ['crack', 'squat']) & \
+            (samples.scores(row) >= 0.3)
+        if passing.any():
+            expected.append((samples.value(row, 'filepath'),
+                             samples.value(row, 'line_offset'),
+                             samples.scores(row)[passing].tolist()))
+    assert [(o[0], o[1][0], o[2][1].tolist()) for o in frames] == expected
+    assert all(np.isin(o[2][0], ['crack', 'squat']).all() for o in frames)
+
+
+def test_export_crops_with_manifest(archive, tmp_path):
+    zip_path = str(tmp_path / 'crops.zip')
+
+    written = export_crops(archive, zip_path, padding=2, min_score=0.5,
+                           workers=2)
+
+    # all passing detections, but those outside of their frame
+    samples = ZipReader(archive, use_cache=False).samples
+    passing = samples.detection_column('score') >= 0.5
+    assert written == sum(
+        crop_region(box, (256, 64), 2) is not None
+        for box in samples.detection_column('boxes')[passing].tolist())
+
+    with zipfile.ZipFile(zip_path) as f:
+        rows = list(csv.DictReader(io.TextIOWrapper(f.open(MANIFEST_NAME))))
+        assert list(rows[0].keys()) == list(MANIFEST_COLUMNS)
+        assert len(rows) == written > 0
+        assert len(f.namelist()) == written + 1
+        for row in rows:
+            assert float(row['DEFECT_SCORE']) >= 0.5
+            assert row['FILE'] == f'{row["CLASS"]}/{row["FAULT_UUID"]}.png'
+            with Image.open(f.open(row['FILE'])) as crop:
+                assert crop.size == (
+                    int(row['CROP_X1']) - int(row['CROP_X0']),
+                    int(row['CROP_Y1']) - int(row['CROP_Y0']))
@@ -0,0 +1,69 @@
+import os
+import shutil
+import time
+import zipfile
+from os import path
+
+import pytest
+
+from benchmarks.synthetic import make_member_names, write_dataset
+from nrcm_viewer.data import CSV_NAME, IMG_APPENDIX, index_members, \
+    index_workspace
+
+
+def test_index_members_assigns_images_to_closest_csv():
+    names = make_member_names(2, 3)
+    names += [f'root/run_0001/left/20220101_010000_000009_cam1{IMG_APPENDIX}',
+              f'root/other/20220101_000000_000000_cam0{IMG_APPENDIX}',
+              'root/run_0000/notes.txt']
+
+    csv_files, dirs_with_csv, dir_to_file = index_members(names)
+
+    assert csv_files == [f'root/run_{i:04d}/{CSV_NAME}' for i in range(2)]
+    assert dirs_with_csv == ['root/run_0000', 'root/run_0001']
+    assert len(dir_to_file['root/run_0000']) == 3
+    # images of subdirectories belong to the closest CSV file above them,
+    # other images to none
+    assert dir_to_file['root/run_0001']['20220101_010000_000009'] == \
+        names[-3]
+    assert len(dir_to_file['root/run_0001']) == 4
+
+
+def test_index_workspace_like_archive(tmp_path):
+    workspace = write_dataset(str(tmp_path / 'workspace'), 3, 5,
+                              image_size=(16, 64))
+    archive = write_dataset(str(tmp_path / 'archive.zip'), 3, 5,
+                            image_size=(16, 64))
+    with zipfile.ZipFile(archive) as f:
+        expected = index_members(o.filename for o in f.filelist)
+
+    csv_files, dirs_with_csv, dir_to_file = index_workspace(workspace)
+
+    def relative(file_path: str) -> str:
+        return path.relpath(file_path, workspace).replace(os.sep, '/')
+
+    assert [relative(o) for o in csv_files] == expected[0]
+    assert [relative(o) for o in dirs_with_csv] == expected[1]
+    assert {relative(dir_): {ts: relative(o) for ts, o in files.items()}
+            for dir_, files in dir_to_file.items()} == expected[2]
+
+
+def test_index_workspace_lists_changed_directories_only(tmp_path,
+                                                       monkeypatch):
+    workspace = write_dataset(str(tmp_path / 'workspace'), 2, 5,
+                              image_size=(16, 64))
+    past = time.time() - 60
+    for dir_, _, _ in os.walk(workspace):
+        os.utime(dir_, (past, past))
+    listings = dict()
+    index = index_workspace(workspace, listings)
+
+    with monkeypatch.context() as m:
+        m.setattr(os, 'scandir', pytest.fail)
+        assert index_workspace(workspace, listings) == index
+
+    dir_ = path.join(workspace, 'root', 'run_0001')
+    image = next(iter(index[2][dir_].values()))
+    shutil.copy(image, path.join(dir_, f'20220102_000000_000000_cam1'
+                                       f'{IMG_APPENDIX}'))
+    assert len(index_workspace(workspace, listings)[2][dir_]) == 6
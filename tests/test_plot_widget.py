@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QRectF  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from nrcm_viewer.data import SampleStore  # noqa: E402
+from nrcm_viewer.ui.plot_widget import MAX_LABELS, PlotWidget  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def widget() -> PlotWidget:
+    application = QApplication.instance() or QApplication([])
+    widget = PlotWidget()
+    widget.vb.setRange(QRectF(0, 0, 1000, 1000), padding=0)
+    yield widget
+    widget.deleteLater()
+    application.processEvents()
+
+
+def make_store(num_detections: int) -> SampleStore:
+    """ A sample with num_detections boxes and one without any. """
+    rng = np.random.default_rng(0)
+    x0 = rng.integers(0, 900, num_detections)
+    y0 = rng.integers(0, 900, num_detections)
+    boxes = np.stack([x0, x0 + 50, y0, y0 + 50], axis=1)
+
+    samples = {attr: np.array([attr, attr], dtype=object)
+               for attr in SampleStore.SAMPLE_ATTRS}
+    detections = {
+        'fault_id': np.arange(num_detections).astype(object),
+        'boxes': boxes,
+        'boxes_rh': boxes,
+        'cls': np.full(num_detections, 'crack', dtype=object),
+        'score': rng.uniform(0, 1, num_detections),
+    }
+    return SampleStore(samples, detections,
+                       np.array([0, num_detections, num_detections]))
+
+
+def test_boxes_drawn_as_one_path(widget):
+    store = make_store(3)
+
+    widget.draw_boxes(store, 0)
+
+    x, y = widget.boxes.getData()
+    assert len(x) == 15
+    for i, (x0, x1, y0, y1) in enumerate(store.boxes(0)):
+        np.testing.assert_array_equal(x[5 * i:5 * i + 5],
+                                      [x0, x1, x1, x0, x0])
+        np.testing.assert_array_equal(y[5 * i:5 * i + 5],
+                                      [y0, y0, y1, y1, y0])
+
+    widget.draw_boxes(store, 1)
+    x, _ = widget.boxes.getData()
+    assert x is None or len(x) == 0
+    assert not any(label.isVisible() for label in widget.labels)
+
+
+def test_labels_of_highest_scores(widget):
+    store = make_store(2 * MAX_LABELS)
+
+    widget.draw_boxes(store, 0)
+
+    visible = [label.textItem.toPlainText() for label in widget.labels
+               if label.isVisible()]
+    scores = np.sort(store.scores(0))[::-1][:MAX_LABELS]
+    assert sorted(visible) == sorted(f'crack: {o:.3f}' for o in scores)
@@ -0,0 +1,50 @@
+import os
+from os import path
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.synthetic import write_dataset
+from nrcm_viewer.data import ZipReader
+from nrcm_viewer.frames import detection_mask
+from nrcm_viewer.render import BOX_COLOR, draw_boxes, output_path, render
+
+
+def test_draw_boxes_clipped_bands():
+    image = np.zeros((20, 30, 3), dtype=np.uint8)
+
+    draw_boxes(image, np.array([[2, 11, 3, 12], [25, 40, -5, 4]]), width=2)
+
+    drawn = np.all(image == BOX_COLOR, axis=2)
+    # the outline of the first box, 2 pixels wide inside the box
+    assert drawn[3:13, 2:4].all() and drawn[3:13, 10:12].all()
+    assert drawn[3:5, 2:12].all() and drawn[11:13, 2:12].all()
+    assert not drawn[5:11, 4:10].any()
+    # the second box is clipped to the image, its right edge is outside
+    assert drawn[0:5, 25:27].all() and drawn[3:5, 25:30].all()
+    assert not drawn[0:3, 27:30].any()
+    # and nothing else, the bands of the boxes overlap in their corners
+    assert drawn.sum() == 2 * 10 * 2 + 2 * 6 * 2 + 5 * 2 + 2 * 3
+
+
+def test_render_frames_with_passing_detections(tmp_path):
+    source = write_dataset(str(tmp_path / 'archive.zip'), 2, 6,
+                           image_size=(64, 256))
+    samples = ZipReader(source, use_cache=False).samples
+    mask = detection_mask(samples, min_score=0.5)
+    passing = np.add.reduceat(mask, samples.offsets[:-1]) > 0
+
+    rendered = render(source, str(tmp_path / 'out'), min_score=0.5,
+                      fmt='jpg', workers=2)
+
+    expected = sorted(
+        output_path(str(tmp_path / 'out'), samples.value(row, 'filepath'),
+                    'jpg', source)
+        for row in np.flatnonzero(passing))
+    written = sorted(path.join(dir_, name)
+                     for dir_, _, names in os.walk(tmp_path / 'out')
+                     for name in names)
+    assert rendered == len(expected) > 0
+    assert written == expected
+    with Image.open(written[0]) as img:
+        assert (img.mode, img.size) == ('RGB', (64, 256))
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from nrcm_viewer.data import SampleStore
+from nrcm_viewer.filtering import StoreColumns
+from nrcm_viewer.session import POSITION, merge
+
+
+def make_columns(seed: int, length: int = 200) -> StoreColumns:
+    """ Samples without detections, with missing line names and offsets. """
+    rng = np.random.default_rng(seed)
+    names = rng.choice(np.array(['Line 0', 'Line 1', 'Line 2', np.nan],
+                                dtype=object), length)
+    offsets = rng.uniform(0, 1000, length).astype(object)
+    offsets[rng.random(length) < 0.1] = np.nan
+
+    samples = {attr: np.array([f'{attr} {i}' for i in range(length)],
+                              dtype=object)
+               for attr in SampleStore.SAMPLE_ATTRS}
+    samples['timestamp'] = np.array([f'2020-01-01 {i:06d}'
+                                     for i in range(length)], dtype=object)
+    samples['line_name'] = names
+    samples['line_offset'] = offsets
+
+    return StoreColumns(SampleStore(samples,
+                                    offsets=np.zeros(length + 1,
+                                                     dtype=np.int64)))
+
+
+def test_merge_missing_values_first():
+    members = [make_columns(0), make_columns(1)]
+
+    merged = list(merge(members, 'line_name'))
+
+    names = [members[m].column('line_name')[row] for m, row in merged]
+    missing = [bool(pd.isna(o)) for o in names]
+    num_missing = sum(missing)
+    assert len(merged) == sum(len(o.store) for o in members)
+    assert missing == [True] * num_missing + [False] * (len(names) -
+                                                        num_missing)
+    assert names[num_missing:] == sorted(names[num_missing:])
+
+
+def test_merge_position_missing_names_and_offsets():
+    members = [make_columns(2), make_columns(3)]
+
+    merged = list(merge(members, POSITION))
+
+    keys = list()
+    for m, row in merged:
+        name = members[m].column('line_name')[row]
+        offset = float(members[m].column('line_offset')[row])
+        keys.append(('' if pd.isna(name) else name,
+                     np.inf if np.isnan(offset) else offset))
+    assert len(merged) == sum(len(o.store) for o in members)
+    assert keys == sorted(keys)
+
+
+def test_merge_descending():
+    members = [make_columns(4), make_columns(5)]
+
+    merged = list(merge(members, 'line_name', descending=True))
+
+    names = [members[m].column('line_name')[row] for m, row in merged]
+    num_present = sum(not pd.isna(o) for o in names)
+    assert all(pd.isna(o) for o in names[num_present:])
+    assert names[:num_present] == sorted(names[:num_present], reverse=True)
@@ -0,0 +1,98 @@
+import os
+import time
+
+from benchmarks.synthetic import write_dataset
+from nrcm_viewer.data import CSV_NAME, SETTLE_SECONDS, WorkspaceReader
+
+
+def make_workspace(tmp_path, num_lines: int, settled: bool = True):
+    """
+    Writes a workspace and truncates its first CSV file to num_lines lines,
+    two header lines then 3 detections per frame. Returns the workspace, the
+    CSV file and all its lines.
+    """
+    workspace = write_dataset(str(tmp_path / 'workspace'), 2, 20,
+                              image_size=(16, 64))
+    csv_file = f'{workspace}/root/run_0000/{CSV_NAME}'
+    with open(csv_file) as f:
+        lines = f.readlines()
+    with open(csv_file, 'w') as f:
+        f.writelines(lines[:num_lines])
+
+    if settled:
+        past = time.time() - 2 * SETTLE_SECONDS
+        for dir_, _, names in os.walk(workspace):
+            if CSV_NAME in names:
+                os.utime(os.path.join(dir_, CSV_NAME), (past, past))
+
+    return workspace, csv_file, lines
+
+
+def test_watch_resumes_after_parsed_rows(tmp_path):
+    workspace, csv_file, lines = make_workspace(tmp_path, 2 + 30)
+
+    reader = WorkspaceReader(workspace, use_cache=False)
+    # rows written after the workspace was indexed, the last one partially
+    with open(csv_file, 'a') as f:
+        f.writelines(lines[32:44])
+        f.write(lines[44][:10])
+    samples = reader.samples
+    assert len(samples) == 10 + 20
+
+    with open(csv_file, 'a') as f:
+        f.write(lines[44][10:])
+        f.writelines(lines[45:])
+    reader.watch()
+    refreshed = reader.refresh()
+
+    # the last frame is held back while the file changes
+    assert len(refreshed) == 9
+    assert refreshed.num_detections.sum() == 27
+    refreshed = reader.refresh()
+    assert len(refreshed) == 1
+    assert refreshed.num_detections.sum() == 3
+    assert len(reader.refresh()) == 0
+
+
+def test_refresh_joins_frame_split_across_refreshes(tmp_path):
+    workspace, csv_file, lines = make_workspace(tmp_path, 2 + 30)
+
+    reader = WorkspaceReader(workspace, use_cache=False)
+    assert len(reader.samples) == 10 + 20
+    reader.watch()
+
+    # the first two of the three detections of the next frame
+    with open(csv_file, 'a') as f:
+        f.writelines(lines[32:34])
+    assert len(reader.refresh()) == 0
+
+    with open(csv_file, 'a') as f:
+        f.writelines(lines[34:38])
+    refreshed = reader.refresh()
+    assert len(refreshed) == 1
+    assert refreshed.num_detections.tolist() == [3]
+
+    refreshed = reader.refresh()
+    assert len(refreshed) == 1
+    assert refreshed.num_detections.tolist() == [3]
+
+
+def test_unsettled_last_frame_is_left_to_refresh(tmp_path):
+    # the last frame only has two of its detections when indexed
+    workspace, csv_file, lines = make_workspace(tmp_path, 2 + 32,
+                                                settled=False)
+
+    reader = WorkspaceReader(workspace, use_cache=False)
+    samples = reader.samples
+    assert len(samples) == 10 + 19
+    reader.watch()
+
+    with open(csv_file, 'a') as f:
+        f.writelines(lines[34:35])
+    assert len(reader.refresh()) == 1
+
+    refreshed = reader.refresh()
+    assert len(refreshed) == 1
+    assert refreshed.num_detections.tolist() == [3]
+    assert refreshed.value(0, 'timestamp') not in \
+        set(samples.column('timestamp'))